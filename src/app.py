@@ -1,18 +1,16 @@
-import json
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-from utils.ikyu_parse_utils import trim_availability_by_target_date_range
-from utils.ikyu_search_utils import get_lunch_price_from_availability, get_dinner_price_from_availability
-from utils.constants import *
-from utils.ikyu_search_utils import (
-    search_restaurants_in_tokyo_yield,
-)
-from utils.ratings_search_utils import fetch_ratings_and_links_async
-from utils.translation_utils import get_english_translation
+from utils.cache_utils import preload_mapping_indexes
+from utils.cancellation import get_cancellation_stats
+from utils.debug_capture import get_debug_capture_stats
+from utils.http_client import get_connection_reuse_stats
+from utils.index_search_utils import get_restaurant_index_stats
+from utils.tiered_cache import local_cache
+from utils.search_stream_utils import parse_search_stream_args, stream_restaurant_search
 
 app = Flask(__name__)
+# Parse the translation/code mapping tables once, before the first request
+preload_mapping_indexes()
 
 CORS(
     app,
@@ -26,161 +24,46 @@ def say_hello():
     # For testing
     return jsonify({"message": "Hello World!"})
 
-def parse_dates_str_from_request(request):
-    DATE_FORMAT = '%Y-%m-%d'
-    start_date_str = request.args.get('startDate')
-    end_date_str = request.args.get('endDate')
-
-    if start_date_str:
-        try:
-            start_date = datetime.strptime(start_date_str, DATE_FORMAT).date()
-        except ValueError:
-            return "Invalid startDate format. Expected YYYY-MM-DD.", 400
-    else:
-        start_date = datetime.today().date()
-
-    if end_date_str:
-        try:
-            end_date = datetime.strptime(end_date_str, DATE_FORMAT).date()
-        except ValueError:
-            return "Invalid endDate format. Expected YYYY-MM-DD.", 400
-    else:
-        end_date = start_date + relativedelta(months=1)
-
-    # Validate dates
-    if end_date < start_date:
-        return "endDate must be after startDate.", 400
-
-    return start_date.strftime(DATE_FORMAT), end_date.strftime(DATE_FORMAT)
-
-
-def convert_restaurant_info_for_web(restaurant_info, start_date, end_date):
-    # rewrite availability for web
-    new_availability = {}
-    if AVAILABILITY in restaurant_info.keys():
-        if RESERVATION_STATUS in restaurant_info[AVAILABILITY].keys():
-            new_availability["reservationStatus"] = restaurant_info[AVAILABILITY][
-                RESERVATION_STATUS
-            ]
-        if LUNCH in restaurant_info[AVAILABILITY].keys():
-            new_availability[LUNCH] = restaurant_info[AVAILABILITY][LUNCH]
-        if DINNER in restaurant_info[AVAILABILITY].keys():
-            new_availability[DINNER] = restaurant_info[AVAILABILITY][DINNER]
-        new_availability = trim_availability_by_target_date_range(
-            new_availability, start_date, end_date)
-
-    return {
-        "name": restaurant_info[RESTAURANT_NAME],
-        "coverImageUrl": restaurant_info[COVER_IMAGE_URL],
-        "type": get_english_translation(restaurant_info[FOOD_TYPE]),
-        "rating": restaurant_info[RATING],
-        "reservationLink": restaurant_info[RESERVATION_LINK],
-        "ikyuId": restaurant_info[IKYU_ID],
-        "availability": new_availability,
-        "hardToReserve": restaurant_info[AVAILABILITY][HARD_TO_RESERVE],
-        "lunchPrice": get_lunch_price_from_availability(restaurant_info[AVAILABILITY]),
-        "dinnerPrice": get_dinner_price_from_availability(restaurant_info[AVAILABILITY]),
-    }
-
-
-def stream_restaurant_for_food_types_and_locations(
-        food_types,
-        locations,
-        sort_option,
-        start_date: str,
-        end_date: str,
-        num_people
-):
-    collected_restaurants = []
-    restaurant_ids_and_names = []
-
-    # Generator that yields restaurants from Ikyu
-    all_restaurants = search_restaurants_in_tokyo_yield(
-        locations, food_types, sort_option, start_date, num_people
-    )
-    for restaurant in all_restaurants:
-        converted_restaurant = convert_restaurant_info_for_web(restaurant, start_date, end_date)
-        collected_restaurants.append(converted_restaurant)
-        restaurant_ids_and_names.append((converted_restaurant['ikyuId'], converted_restaurant['name']))
-
-        yield f"data: {json.dumps(converted_restaurant)}\n\n"
-
-        # If collecting at least 20 restaurants, start async fetching ratings/links from Tabelog & Google
-        if len(collected_restaurants) % 20 == 0: # collected_restaurants's size = 7
-            ratings_and_links = fetch_ratings_and_links_async(restaurant_ids_and_names)
-            updated_restaurants = update_restaurants_with_ratings_and_links(
-                collected_restaurants,
-                ratings_and_links
-            )
-            for updated_restaurant in updated_restaurants:
-                yield f"data: {json.dumps(updated_restaurant)}\n\n"
-            # Clear the lists for the next batch
-            collected_restaurants = []
-            restaurant_ids_and_names = []
-
-
-    # Handle any remaining collected restaurants after fetching restaurants from Ikyu is done
-    if collected_restaurants:
-        rem_ratings_and_links = fetch_ratings_and_links_async(restaurant_ids_and_names)
-        updated_restaurants = update_restaurants_with_ratings_and_links(
-            collected_restaurants,
-            rem_ratings_and_links
-        )
-        for updated_restaurant in updated_restaurants:
-            yield f"data: {json.dumps(updated_restaurant)}\n\n"
-
-    yield f"event: close\ndata: \n\n"
-
-
-def update_restaurants_with_ratings_and_links(restaurants, ratings_and_links):
-    """
-    Update the collected restaurants with the fetched ratings and links.
-
-    :param restaurants: A list of restaurants
-    :param ratings_and_links: A dict of restaurants with their Google and Tabelog ratings and links
-    (key: ikyu_id -> a dict of Google or Tabelog ratings and links)
-    :return: updated restaurant with ratings and links info
-    """
-    for restaurant in restaurants:
-        ikyu_id = restaurant['ikyuId']
-        if ikyu_id in ratings_and_links:
-            restaurant['tabelogRating'] = ratings_and_links[ikyu_id].get('tabelogRating')
-            restaurant['tabelogLink'] = ratings_and_links[ikyu_id].get('tabelogLink')
-            restaurant['googleRating'] = ratings_and_links[ikyu_id].get('googleRating')
-            restaurant['googleLink'] = ratings_and_links[ikyu_id].get('googleLink')
-        yield restaurant
+
+@app.route("/api/http_connection_stats", methods=["GET"])
+def http_connection_stats():
+    # For checking that upstream connections are kept alive and reused
+    return jsonify(get_connection_reuse_stats())
+
+
+@app.route("/api/local_cache_stats", methods=["GET"])
+def local_cache_stats():
+    # For checking the hit rate of the in-process cache in front of Redis
+    return jsonify(local_cache.stats())
+
+
+@app.route("/api/debug_capture_stats", methods=["GET"])
+def debug_capture_stats():
+    # For checking how many upstream pages were captured for debugging, or dropped
+    return jsonify(get_debug_capture_stats())
+
+
+@app.route("/api/cancellation_stats", methods=["GET"])
+def cancellation_stats():
+    # For checking how much upstream work was saved by cancelling searches nobody follows anymore
+    return jsonify(get_cancellation_stats())
+
+
+@app.route("/api/restaurant_index_stats", methods=["GET"])
+def restaurant_index_stats():
+    # For checking how much of the searches the local restaurant index covers
+    return jsonify(get_restaurant_index_stats())
 
 
 @app.route("/api/v1/restaurant_search_stream", methods=["GET"])
 def restaurant_search_stream_v1():
     print("🔍 Getting restaurant search stream...")
-    locations_and_food_types_string = request.args.get(
-        "locationsAndFoodTypes", None)
-    
-    print("🔍 Locations and food types: ", locations_and_food_types_string)
-
-    # Check if the required parameter is provided
-    if locations_and_food_types_string is None:
-        return jsonify({"error": "Missing required parameter: locationsAndFoodTypes"}), 400
-    
-    try:
-        locations_and_food_types = json.loads(locations_and_food_types_string)
-    except json.JSONDecodeError as e:
-        return jsonify({"error": f"Invalid JSON in locationsAndFoodTypes: {str(e)}"}), 400
-    
-    sort_option = request.args.get("sortOption", "top-picks")
-    start_date, end_date = parse_dates_str_from_request(request)
-    num_people = request.args.get("numPeople", 2)
+    search, error = parse_search_stream_args(request.args)
+    if error is not None:
+        return jsonify({"error": error}), 400
 
     return Response(
-        stream_restaurant_for_food_types_and_locations(
-            locations_and_food_types["foodTypes"],
-            locations_and_food_types["locations"],
-            sort_option,
-            start_date,
-            end_date,
-            num_people
-        ),
+        stream_restaurant_search(**search),
         content_type="text/event-stream",
     )
 
@@ -0,0 +1,97 @@
+"""
+ASGI entry point of the website backend, for production.
+
+Serves the same API as app.py, but each search stream runs on the event loop instead of
+holding a thread, so one worker holds thousands of open streams. See README.md to launch it.
+"""
+import asyncio
+import contextlib
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from utils.async_network import close_async_session, get_async_connection_reuse_stats
+from utils.cache_utils import preload_mapping_indexes
+from utils.cancellation import get_cancellation_stats
+from utils.debug_capture import get_debug_capture_stats
+from utils.index_search_utils import get_restaurant_index_stats
+from utils.search_stream_utils import parse_search_stream_args, stream_restaurant_search_async
+from utils.tiered_cache import local_cache
+
+# Parse the translation/code mapping tables once, before the first request
+preload_mapping_indexes()
+
+
+async def say_hello(request):
+    # For testing
+    return JSONResponse({"message": "Hello World!"})
+
+
+async def http_connection_stats(request):
+    # For checking that upstream connections are kept alive and reused
+    return JSONResponse(get_async_connection_reuse_stats())
+
+
+async def local_cache_stats(request):
+    # For checking the hit rate of the in-process cache in front of Redis
+    return JSONResponse(local_cache.stats())
+
+
+async def debug_capture_stats(request):
+    # For checking how many upstream pages were captured for debugging, or dropped
+    return JSONResponse(get_debug_capture_stats())
+
+
+async def cancellation_stats(request):
+    # For checking how much upstream work was saved by cancelling searches nobody follows anymore
+    return JSONResponse(get_cancellation_stats())
+
+
+async def restaurant_index_stats(request):
+    # For checking how much of the searches the local restaurant index covers; SQLite is blocking
+    return JSONResponse(await asyncio.to_thread(get_restaurant_index_stats))
+
+
+async def restaurant_search_stream_v1(request):
+    print("🔍 Getting restaurant search stream...")
+    search, error = parse_search_stream_args(request.query_params)
+    if error is not None:
+        return JSONResponse({"error": error}, status_code=400)
+
+    return StreamingResponse(
+        stream_restaurant_search_async(**search),
+        media_type="text/event-stream",
+    )
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    # The upstream aiohttp session belongs to the worker's event loop
+    await close_async_session()
+
+
+app = Starlette(
+    routes=[
+        Route("/api/say_hello", say_hello, methods=["GET"]),
+        Route("/api/http_connection_stats", http_connection_stats, methods=["GET"]),
+        Route("/api/local_cache_stats", local_cache_stats, methods=["GET"]),
+        Route("/api/debug_capture_stats", debug_capture_stats, methods=["GET"]),
+        Route("/api/cancellation_stats", cancellation_stats, methods=["GET"]),
+        Route("/api/restaurant_index_stats", restaurant_index_stats, methods=["GET"]),
+        Route("/api/v1/restaurant_search_stream", restaurant_search_stream_v1, methods=["GET"]),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["GET", "POST"]),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=6003)
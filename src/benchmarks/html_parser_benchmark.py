@@ -0,0 +1,79 @@
+"""
+Check that the HTML parser backends in utils.html_parsers extract the same data from
+saved pages, and compare their speed.
+
+By default the newest pages captured by utils.debug_capture are used, else the pages saved
+in tests/fixtures, which tests/test_html_parsers.py checks too; other saved pages (.html, or
+captured .html.gz) can be passed as "ikyu:<path>" or "tabelog:<path>".
+Needs selectolax installed.
+
+Run from the src directory:
+    python -m benchmarks.html_parser_benchmark [ikyu:<path> | tabelog:<path> ...]
+"""
+import os
+import sys
+import timeit
+
+from utils.debug_capture import get_latest_debug_capture_path, read_debug_capture
+from utils.file_utils import read_content_from_file
+from utils.html_parsers import PAGE_EXTRACTORS, BeautifulSoupHtmlParser, SelectolaxHtmlParser
+
+NUMBER_OF_CALLS = 20
+
+# Page type -> debug capture source
+DEFAULT_PAGE_SOURCES = {
+    "ikyu": "ikyu_search",
+    "tabelog": "tabelog_search",
+}
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(__file__), "..", "..", "tests", "fixtures")
+# Page type -> saved page
+FIXTURE_PAGES = {
+    "ikyu": os.path.join(FIXTURES_DIRECTORY, "ikyu_search_page.html"),
+    "tabelog": os.path.join(FIXTURES_DIRECTORY, "tabelog_search_page.html"),
+}
+
+
+def time_per_call_in_milliseconds(function):
+    return timeit.timeit(function, number=NUMBER_OF_CALLS) / NUMBER_OF_CALLS * 1e3
+
+
+def parse_pages_from_args(args):
+    pages = []
+    for arg in args:
+        page_type, path = arg.split(":", 1)
+        pages.append((page_type, path))
+    return pages
+
+
+def main():
+    pages = parse_pages_from_args(sys.argv[1:]) or [
+        (page_type, get_latest_debug_capture_path(source) or FIXTURE_PAGES[page_type])
+        for page_type, source in DEFAULT_PAGE_SOURCES.items()
+    ]
+    beautifulsoup_parser = BeautifulSoupHtmlParser()
+    selectolax_parser = SelectolaxHtmlParser()
+
+    for page_type, path in pages:
+        if path is None or not os.path.exists(path):
+            print(f"{page_type}: no saved page found, skipped. Capture one with DEBUG_CAPTURE_SAMPLE_RATE.")
+            continue
+        html = read_debug_capture(path) if path.endswith(".gz") else read_content_from_file(path)
+        extract = PAGE_EXTRACTORS[page_type]
+
+        # Both backends must agree before comparing their speed
+        beautifulsoup_result = extract(beautifulsoup_parser, html)
+        selectolax_result = extract(selectolax_parser, html)
+        assert beautifulsoup_result == selectolax_result, \
+            f"{path}: backends disagree\n{beautifulsoup_result}\n{selectolax_result}"
+
+        beautifulsoup_time = time_per_call_in_milliseconds(lambda: extract(beautifulsoup_parser, html))
+        selectolax_time = time_per_call_in_milliseconds(lambda: extract(selectolax_parser, html))
+        print(
+            f"{os.path.basename(path)} ({len(beautifulsoup_result)} {page_type} results): "
+            f"beautifulsoup {beautifulsoup_time:.1f}ms, "
+            f"selectolax {selectolax_time:.2f}ms ({beautifulsoup_time / selectolax_time:.0f}x faster)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measure how many concurrent search streams a running server holds.
+
+Opens the given number of concurrent connections to /api/v1/restaurant_search_stream of a
+server, all for the same search, and reports how many streams got their first event and
+completed, and how long that took. Run one search first so the streams replay it from the
+cache; that measures the server rather than the upstream sites.
+
+Compare the Flask dev server and the ASGI app:
+    python src/app.py
+    gunicorn --chdir src -k uvicorn.workers.UvicornWorker -w 1 -b 0.0.0.0:6003 asgi_app:app
+
+Then run from the src directory:
+    python -m benchmarks.sse_connection_capacity_benchmark [base url] [connections ...]
+"""
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+import aiohttp
+
+DEFAULT_BASE_URL = "http://localhost:6003"
+DEFAULT_CONNECTION_COUNTS = [10, 100, 1000]
+STREAM_TIMEOUT_SECONDS = 120
+SEARCH_PARAMS = {
+    "locationsAndFoodTypes": json.dumps({"locations": ["銀座"], "foodTypes": ["寿司"]}, ensure_ascii=False),
+    "sortOption": "top-picks",
+    "numPeople": "2",
+}
+
+
+async def read_stream(session, url):
+    """
+    :return: (seconds to the first event, seconds to the end of the stream)
+    """
+    started_at = time.monotonic()
+    first_event_seconds = None
+    async with session.get(url, params=SEARCH_PARAMS) as response:
+        response.raise_for_status()
+        async for line in response.content:
+            if first_event_seconds is None and line.strip():
+                first_event_seconds = time.monotonic() - started_at
+            if line.startswith(b"event: close"):
+                break
+    return first_event_seconds, time.monotonic() - started_at
+
+
+async def run_concurrent_streams(base_url, connection_count):
+    url = f"{base_url}/api/v1/restaurant_search_stream"
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=STREAM_TIMEOUT_SECONDS)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started_at = time.monotonic()
+        results = await asyncio.gather(
+            *(read_stream(session, url) for _ in range(connection_count)), return_exceptions=True
+        )
+        elapsed_seconds = time.monotonic() - started_at
+
+    completed = [result for result in results if not isinstance(result, BaseException)]
+    errors = len(results) - len(completed)
+    first_event_seconds = [first for first, _ in completed if first is not None]
+    line = f"{connection_count} connections: {len(completed)} completed, {errors} failed, {elapsed_seconds:.1f}s total"
+    if first_event_seconds:
+        line += (
+            f", first event median {statistics.median(first_event_seconds) * 1000:.0f}ms"
+            f" / max {max(first_event_seconds) * 1000:.0f}ms"
+        )
+    print(line)
+
+
+async def main():
+    base_url = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_BASE_URL
+    connection_counts = [int(count) for count in sys.argv[2:]] or DEFAULT_CONNECTION_COUNTS
+
+    # Warm up: run the search once so the streams below replay it
+    await run_concurrent_streams(base_url, 1)
+    for connection_count in connection_counts:
+        await run_concurrent_streams(base_url, connection_count)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
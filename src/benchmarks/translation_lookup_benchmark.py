@@ -0,0 +1,84 @@
+"""
+Compare translating names by re-reading the mapping file and scanning it on every call
+(how cache_utils used to work) with the process-wide indexes in cache_utils.
+
+Run from the src directory:
+    python -m benchmarks.translation_lookup_benchmark
+"""
+import timeit
+
+from utils.cache_utils import (
+    CATEGORY_CODE_MAPPING_FILE_NAME,
+    TOKYO_REGION_CODE_MAPPING_FILE_NAME,
+    preload_mapping_indexes,
+    translate_from_japanese_name,
+    translate_from_japanese_name_to_code,
+)
+from utils.file_utils import read_json_from_file_in_resources
+
+NUMBER_OF_CALLS = 2000
+
+
+def translate_from_japanese_name_by_scanning_file(japanese_name, mapping_file_path, output_language):
+    table = read_json_from_file_in_resources(mapping_file_path)
+    all_translated_names = []
+    for name in japanese_name.strip().split("・"):
+        for item in table:
+            if item["japanese"] == name:
+                all_translated_names.append(item[output_language])
+                break
+        else:
+            all_translated_names.append(name)
+    return "・".join(all_translated_names)
+
+
+def translate_from_japanese_name_to_code_by_scanning_file(japanese_name, mapping_file_path, output_language):
+    table = read_json_from_file_in_resources(mapping_file_path)
+    japanese_name = japanese_name.strip()
+    for item in table:
+        if item["japanese"] == japanese_name:
+            return item[output_language]
+    return japanese_name
+
+
+def time_per_call_in_microseconds(function):
+    return timeit.timeit(function, number=NUMBER_OF_CALLS) / NUMBER_OF_CALLS * 1e6
+
+
+def main():
+    preload_mapping_indexes()
+    categories = read_json_from_file_in_resources(CATEGORY_CODE_MAPPING_FILE_NAME)
+    regions = read_json_from_file_in_resources(TOKYO_REGION_CODE_MAPPING_FILE_NAME)
+    # A "・" separated name made of the last categories, the worst case for a linear scan
+    food_type = "・".join(item["japanese"] for item in categories[-3:])
+    region = regions[-1]["japanese"]
+
+    # Both implementations must agree before comparing their speed
+    assert translate_from_japanese_name(food_type, CATEGORY_CODE_MAPPING_FILE_NAME, "chinese") == \
+        translate_from_japanese_name_by_scanning_file(food_type, CATEGORY_CODE_MAPPING_FILE_NAME, "chinese")
+    assert translate_from_japanese_name_to_code(region, TOKYO_REGION_CODE_MAPPING_FILE_NAME, "code") == \
+        translate_from_japanese_name_to_code_by_scanning_file(region, TOKYO_REGION_CODE_MAPPING_FILE_NAME, "code")
+
+    cases = [
+        (
+            "type_japanese_to_chinese",
+            lambda: translate_from_japanese_name_by_scanning_file(food_type, CATEGORY_CODE_MAPPING_FILE_NAME, "chinese"),
+            lambda: translate_from_japanese_name(food_type, CATEGORY_CODE_MAPPING_FILE_NAME, "chinese"),
+        ),
+        (
+            "lookup_tokyo_subregion_code",
+            lambda: translate_from_japanese_name_to_code_by_scanning_file(region, TOKYO_REGION_CODE_MAPPING_FILE_NAME, "code"),
+            lambda: translate_from_japanese_name_to_code(region, TOKYO_REGION_CODE_MAPPING_FILE_NAME, "code"),
+        ),
+    ]
+    for name, scan_file, use_index in cases:
+        scan_file_time = time_per_call_in_microseconds(scan_file)
+        use_index_time = time_per_call_in_microseconds(use_index)
+        print(
+            f"{name}: read and scan file {scan_file_time:.1f}µs, "
+            f"index {use_index_time:.2f}µs ({scan_file_time / use_index_time:.0f}x faster)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,85 @@
 # How many pages of ikyu results to check. About 18 results per page.
 PAGES_TO_SEARCH = 5
+# How many search result pages to download at the same time, across all searches.
+SEARCH_PAGE_FETCH_WORKERS = 10
+# How long the parsed restaurant cards of a search result page stay in the Redis cache.
+SEARCH_PAGE_CACHE_TTL_SECONDS = 5 * 60
+# Same for a page without cards: past the last page, or a page that failed to load or parse.
+SEARCH_PAGE_EMPTY_CACHE_TTL_SECONDS = 30
+# How many restaurant calendars to download at the same time, across all searches.
+CALENDAR_FETCH_WORKERS = 20
+# How long a restaurant calendar stays in the Redis cache.
+CALENDAR_CACHE_TTL_SECONDS = 10 * 60
+# Restaurant info (name, food type, rating, cover image) cache on local disk.
+RESTAURANT_INFO_CACHE_ENABLED = True
+RESTAURANT_INFO_CACHE_TTL_SECONDS = 60 * 60
+RESTAURANT_INFO_CACHE_BATCH_SIZE = 50
+RESTAURANT_INFO_CACHE_FLUSH_INTERVAL_SECONDS = 5
+# How many restaurants to look up on Tabelog and on Google at the same time, across all searches.
+TABELOG_FETCH_WORKERS = 16
+GOOGLE_FETCH_WORKERS = 16
+# How long Tabelog/Google ratings stay in the Redis cache. Restaurants not found are
+# cached for a shorter time, so they don't hit the (paid) upstream on every search.
+RATINGS_CACHE_TTL_SECONDS = 24 * 60 * 60
+RATINGS_NOT_FOUND_CACHE_TTL_SECONDS = 6 * 60 * 60
+# In-process cache in front of Redis for ratings and calendars.
+LOCAL_CACHE_MAX_ENTRIES = 5000
+# The most a local entry may lag behind Redis after the Redis entry changes.
+LOCAL_CACHE_MAX_STALENESS_SECONDS = 60
 GOOGLE_PLACES_API_URL = "https://places.googleapis.com/v1/places:searchText"
+# Pooled HTTP client. Connections are kept alive and reused per upstream host.
+HTTP_POOL_SIZE = 20
+HTTP_CONNECT_TIMEOUT_SECONDS = 3.05
+HTTP_READ_TIMEOUT_SECONDS = 15
+# Retries only apply to GET requests, which are safe to repeat.
+HTTP_MAX_RETRIES = 2
+HTTP_RETRY_BACKOFF_SECONDS = 0.5
+HTTP_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Cross-process de-duplication of Tabelog/Google lookups with a Redis lock per restaurant.
+# Lookups are always de-duplicated across threads of one process.
+REDIS_SINGLE_FLIGHT_ENABLED = False
+REDIS_LOCK_TTL_SECONDS = 30
+# How long other processes wait for the lock holder's result before looking it up themselves
+REDIS_LOCK_WAIT_SECONDS = 20
+REDIS_LOCK_POLL_INTERVAL_SECONDS = 0.1
+# HTML parser for scraped pages: "selectolax" (fast, optional dependency), "beautifulsoup",
+# or "auto" to use selectolax when it's installed.
+HTML_PARSER_BACKEND = "auto"
+# Normalized (transliterated) restaurant names kept in memory for matching Tabelog results
+NAME_NORMALIZATION_CACHE_SIZE = 10000
+# Capture of raw upstream pages for debugging parsers. Off unless sampled (0 to 1),
+# or for pages that fail to parse with DEBUG_CAPTURE_PARSE_FAILURES.
+DEBUG_CAPTURE_SAMPLE_RATE = 0.0
+DEBUG_CAPTURE_PARSE_FAILURES = False
+DEBUG_CAPTURE_DIR_NAME = "debug_log"
+# Newest captures kept per source, older ones are deleted
+DEBUG_CAPTURE_MAX_FILES = 200
+# Captures waiting to be written; more are dropped instead of slowing requests down
+DEBUG_CAPTURE_QUEUE_SIZE = 100
+# Completed search streams are replayed to identical searches within this time.
+# Identical searches running at the same time always share one search.
+SEARCH_STREAM_REPLAY_ENABLED = True
+SEARCH_STREAM_CACHE_TTL_SECONDS = 5 * 60
+# Restaurant cards on a full Ikyu search result page, to estimate how many pages a limit needs
+IKYU_SEARCH_CARDS_PER_PAGE = 18
+# Cache warming job (warm_cache.py): the combinations it may warm, with the Japanese names of
+# tokyo_region_code_mapping.json and category_code_mapping.json, None for all of them.
+CACHE_WARMING_REGIONS = None
+CACHE_WARMING_FOOD_TYPES = None
+CACHE_WARMING_SORT_OPTIONS = ["top-picks", "popular"]
+CACHE_WARMING_NUM_PEOPLE = 2
+# Most upstream requests (Ikyu pages and calendars, Tabelog, Google) of one run
+CACHE_WARMING_REQUEST_BUDGET = 1000
+# Combinations filled more recently than this, by a search or the job, are not warmed again.
+# Their priority grows with age up to the ratings cache TTL, and with popularity.
+CACHE_WARMING_MIN_AGE_SECONDS = 60 * 60
+# Popularities are scaled by this after each run, so recent searches weigh the most
+SEARCH_POPULARITY_DECAY = 0.5
+# Local index of restaurants and their calendars, for searches with source=index.
+# A search is answered from the index if all its region × cuisine combinations were indexed.
+# Older combinations and calendars are still used, and refreshed in the background.
+RESTAURANT_INDEX_COVERAGE_STALE_SECONDS = 24 * 60 * 60
+RESTAURANT_INDEX_CALENDAR_STALE_SECONDS = 60 * 60
+# How many combinations or calendar batches to refresh at the same time
+RESTAURANT_INDEX_REFRESH_WORKERS = 2
+RESTAURANT_INDEX_CALENDAR_BATCH_SIZE = 50
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import weakref
+
+import aiohttp
+from config import *
+from utils.constants import *
+from utils.http_client import get_retry_backoff_seconds
+from utils.network import BROWSER_HEADERS, build_google_place_text_search_request
+
+# One aiohttp session per event loop. A session can only be used from the loop it was created on.
+_sessions_by_loop = weakref.WeakKeyDictionary()
+# Named semaphores per event loop, for the same reason
+_semaphores_by_loop = weakref.WeakKeyDictionary()
+
+# Connection counters of all async sessions, see get_async_connection_reuse_stats
+_async_connection_stats = {
+    "new_connections": 0,
+    "reused_connections": 0,
+}
+
+
+async def _on_connection_create_end(session, trace_config_ctx, params):
+    _async_connection_stats["new_connections"] += 1
+
+
+async def _on_connection_reuseconn(session, trace_config_ctx, params):
+    _async_connection_stats["reused_connections"] += 1
+
+
+def get_async_session():
+    loop = asyncio.get_running_loop()
+    session = _sessions_by_loop.get(loop)
+    if session is None or session.closed:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(_on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, limit_per_host=HTTP_POOL_SIZE),
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=HTTP_CONNECT_TIMEOUT_SECONDS,
+                sock_read=HTTP_READ_TIMEOUT_SECONDS,
+            ),
+            trace_configs=[trace_config],
+        )
+        _sessions_by_loop[loop] = session
+    return session
+
+
+def get_async_connection_reuse_stats():
+    return dict(_async_connection_stats)
+
+
+def get_event_loop_semaphore(name, value):
+    """
+    Get a semaphore shared by all coroutines of the running event loop.
+    :param name: identifies the resource being bounded, e.g. "calendar"
+    :param value: how many holders are allowed at the same time
+    """
+    semaphores = _semaphores_by_loop.setdefault(asyncio.get_running_loop(), {})
+    if name not in semaphores:
+        semaphores[name] = asyncio.Semaphore(value)
+    return semaphores[name]
+
+
+async def close_async_session():
+    session = _sessions_by_loop.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+async def http_get_content_async(url, headers=None):
+    """
+    Async equivalent of http_client.http_get, returning the response body.
+    :raise aiohttp.ClientResponseError: if the last response has an error status
+    """
+    session = get_async_session()
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        is_last_attempt = attempt == HTTP_MAX_RETRIES
+        try:
+            async with session.get(url, headers=headers) as response:
+                if is_last_attempt or response.status not in HTTP_RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return await response.read()
+                print(f"⚠️ GET {url} returned {response.status}. Retrying...")
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+            if is_last_attempt:
+                raise
+            print(f"⚠️ GET {url} failed: {error}. Retrying...")
+        await asyncio.sleep(get_retry_backoff_seconds(attempt))
+
+
+async def get_response_json_from_url_with_headers_async(url):
+    content = await http_get_content_async(url, headers=BROWSER_HEADERS)
+    return json.loads(content)
+
+
+async def get_response_html_from_url_with_headers_async(url):
+    content = await http_get_content_async(url, headers=BROWSER_HEADERS)
+    return content.decode(UTF_8_ENCODING)
+
+
+async def get_response_json_from_google_place_text_search_api_async(
+        text_query,
+        url=GOOGLE_PLACES_API_URL
+):
+    headers, data = build_google_place_text_search_request(text_query)
+    async with get_async_session().post(url, headers=headers, json=data) as response:
+        # An error body may not be JSON
+        response.raise_for_status()
+        return await response.json(content_type=None)
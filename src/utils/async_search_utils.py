@@ -0,0 +1,103 @@
+import asyncio
+
+from utils.cancellation import record_cancelled_work
+from utils.constants import *
+from utils.ikyu_search_utils import search_restaurants_in_tokyo_async_yield
+from utils.ratings_search_utils import get_ratings_and_links_for_restaurant_async
+
+_RESTAURANT_FOUND = "restaurant_found"
+_ENRICHMENT_DONE = "enrichment_done"
+_SEARCH_DONE = "search_done"
+
+
+async def search_restaurants_with_ratings_in_tokyo_async_yield(
+    sub_regions_japanese,
+    restaurant_types_japanese,
+    sort_option,
+    start_date: str,
+    num_people,
+    keep_page_order=True,
+    start_page=1,
+    start_card=0,
+    limit=None,
+    next_position=None,
+    restaurant_filter=None,
+):
+    """
+    Search Ikyu and enrich the results with Tabelog and Google ratings, all on one event loop.
+    See restaurants_with_ratings_async_yield, and restaurants_from_search_urls_yield for
+    start_page, start_card, limit and next_position.
+    """
+    restaurants = search_restaurants_in_tokyo_async_yield(
+        sub_regions_japanese,
+        restaurant_types_japanese,
+        sort_option,
+        start_date,
+        num_people,
+        keep_page_order,
+        start_page,
+        start_card,
+        limit,
+        next_position,
+    )
+    async for restaurant in restaurants_with_ratings_async_yield(restaurants, restaurant_filter):
+        yield restaurant
+
+
+async def restaurants_with_ratings_async_yield(restaurants, restaurant_filter=None):
+    """
+    Enrich restaurants with Tabelog and Google ratings, all on one event loop.
+    Each restaurant is yielded twice: first as soon as it comes, then again, with the
+    TABELOG_RATING/TABELOG_LINK/GOOGLE_RATING/GOOGLE_LINK fields added, once its ratings
+    lookup finishes. Enrichment of earlier restaurants runs while the next ones come.
+    :param restaurants: an async iterator of restaurants with their calendar, e.g. an Ikyu search
+    :param restaurant_filter: called with each restaurant; restaurants it returns False for are
+    dropped before enrichment
+    """
+    queue = asyncio.Queue()
+    enrichment_tasks = []
+
+    async def enrich(restaurant):
+        enriched_restaurant = None
+        try:
+            ratings_and_links = await get_ratings_and_links_for_restaurant_async(
+                restaurant[IKYU_ID], restaurant[RESTAURANT_NAME]
+            )
+            enriched_restaurant = {**restaurant, **ratings_and_links}
+        finally:
+            # Always report back, so the consumer knows this lookup is finished
+            queue.put_nowait((_ENRICHMENT_DONE, enriched_restaurant))
+
+    async def search():
+        try:
+            async for restaurant in restaurants:
+                if restaurant_filter is not None and not restaurant_filter(restaurant):
+                    continue
+                enrichment_tasks.append(asyncio.ensure_future(enrich(restaurant)))
+                queue.put_nowait((_RESTAURANT_FOUND, restaurant))
+        finally:
+            queue.put_nowait((_SEARCH_DONE, None))
+
+    search_task = asyncio.ensure_future(search())
+    try:
+        is_search_done = False
+        pending_enrichments = 0
+        while not is_search_done or pending_enrichments > 0:
+            item_type, restaurant = await queue.get()
+            if item_type == _SEARCH_DONE:
+                is_search_done = True
+                continue
+            if item_type == _RESTAURANT_FOUND:
+                pending_enrichments += 1
+            else:
+                pending_enrichments -= 1
+            if restaurant is not None:
+                yield restaurant
+        # Surface search errors to the caller
+        await search_task
+    finally:
+        search_task.cancel()
+        # Each enrichment looks up both Tabelog and Google
+        cancelled_enrichments = sum(1 for enrichment_task in enrichment_tasks if enrichment_task.cancel())
+        record_cancelled_work("tabelog_lookups", cancelled_enrichments)
+        record_cancelled_work("google_lookups", cancelled_enrichments)
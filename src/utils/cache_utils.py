@@ -1,18 +1,40 @@
-from datetime import datetime, timedelta
+from datetime import datetime
+import hashlib
+import json
 import os
+import threading
 
+from config import *
 from utils.constants import *
-from utils.file_utils import (
-    read_json_from_file,
-    read_json_from_file_in_resources,
-    write_json_to_file_full_path,
-)
+from utils.file_utils import read_json_from_file_in_resources
+from utils.ikyu_url_builders import build_canonical_ikyu_search_query
+from utils.restaurant_index import RestaurantIndex
+from utils.restaurant_info_store import RestaurantInfoStore
 
 CACHE_DIR = "cache_data"
 RESTAURANT_INFO_CACHE_FILE_NAME = "restaurant_info_cache.json"
+RESTAURANT_INFO_DB_FILE_NAME = "restaurant_info_cache.sqlite3"
+RESTAURANT_INDEX_DB_FILE_NAME = "restaurant_index.sqlite3"
 if not os.path.exists(CACHE_DIR):
     os.makedirs(CACHE_DIR)
 
+CATEGORY_CODE_MAPPING_FILE_NAME = "category_code_mapping.json"
+TOKYO_REGION_CODE_MAPPING_FILE_NAME = "tokyo_region_code_mapping.json"
+MAPPING_FILE_NAMES = [CATEGORY_CODE_MAPPING_FILE_NAME, TOKYO_REGION_CODE_MAPPING_FILE_NAME]
+# Mapping file name -> {japanese name -> table row}, see get_mapping_index
+_mapping_indexes = {}
+_mapping_indexes_lock = threading.Lock()
+
+restaurant_info_store = RestaurantInfoStore(
+    os.path.join(CACHE_DIR, RESTAURANT_INFO_DB_FILE_NAME),
+    ttl_seconds=RESTAURANT_INFO_CACHE_TTL_SECONDS,
+    batch_size=RESTAURANT_INFO_CACHE_BATCH_SIZE,
+    flush_interval_seconds=RESTAURANT_INFO_CACHE_FLUSH_INTERVAL_SECONDS,
+    # The whole-file JSON cache used before, imported on first use
+    legacy_json_path=os.path.join(CACHE_DIR, RESTAURANT_INFO_CACHE_FILE_NAME),
+)
+restaurant_index = RestaurantIndex(os.path.join(CACHE_DIR, RESTAURANT_INDEX_DB_FILE_NAME))
+
 
 def get_output_dir():
     root_dir = os.path.dirname(
@@ -25,53 +47,69 @@ def get_output_dir():
 
 
 def get_cached_restaurant_info_by_ikyu_id(ikyu_id):
-    cache_file_path = os.path.join(CACHE_DIR, RESTAURANT_INFO_CACHE_FILE_NAME)
-    if os.path.exists(cache_file_path):
-        restaurant_info_cache = read_json_from_file(cache_file_path)
-        if ikyu_id in restaurant_info_cache:
-            if LAST_UPDATE_TIME in restaurant_info_cache[ikyu_id]:
-                last_update_time = restaurant_info_cache[ikyu_id][LAST_UPDATE_TIME]
-                if (
-                    datetime.now()
-                    - datetime.strptime(last_update_time, "%Y-%m-%d %H:%M:%S")
-                    < timedelta(hours=1)
-                ):
-                    return restaurant_info_cache[ikyu_id]
-    return {}
+    return restaurant_info_store.get(ikyu_id)
+
+
+def get_cached_restaurant_infos_by_ikyu_ids(ikyu_ids):
+    return restaurant_info_store.get_many(ikyu_ids)
 
 
 def store_cached_restaurant_info_by_ikyu_id(ikyu_id, restaurant_info):
-    cache_file_path = os.path.join(CACHE_DIR, RESTAURANT_INFO_CACHE_FILE_NAME)
-    if os.path.exists(cache_file_path):
-        restaurant_info_cache = read_json_from_file(cache_file_path)
-    else:
-        restaurant_info_cache = {}
     restaurant_info[LAST_UPDATE_TIME] = datetime.now().strftime(
         "%Y-%m-%d %H:%M:%S"
     )
-    restaurant_info_cache[ikyu_id] = restaurant_info
-    write_json_to_file_full_path(cache_file_path, restaurant_info_cache)
+    restaurant_info_store.put(ikyu_id, restaurant_info)
+
+
+def get_mapping_index(mapping_file_path):
+    """
+    Get a mapping table from resources as a dict of japanese name -> table row.
+    The table is read from disk once per process, see reload_mapping_indexes.
+    """
+    index = _mapping_indexes.get(mapping_file_path)
+    if index is None:
+        with _mapping_indexes_lock:
+            index = _mapping_indexes.get(mapping_file_path)
+            if index is None:
+                index = {}
+                for item in read_json_from_file_in_resources(mapping_file_path):
+                    # Keep the first row for a name, like a linear scan of the table would
+                    index.setdefault(item["japanese"], item)
+                _mapping_indexes[mapping_file_path] = index
+    return index
+
+
+def preload_mapping_indexes():
+    for mapping_file_path in MAPPING_FILE_NAMES:
+        get_mapping_index(mapping_file_path)
+
+
+def reload_mapping_indexes():
+    """
+    Drop the loaded mapping tables, so changes to the files in resources are picked up.
+    """
+    with _mapping_indexes_lock:
+        _mapping_indexes.clear()
+    preload_mapping_indexes()
 
 
 def translate_from_japanese_name_to_code(japanese_name, mapping_file_path, output_language):
-    table = read_json_from_file_in_resources(mapping_file_path)
     japanese_name = japanese_name.strip()
-    for item in table:
-        if item["japanese"] == japanese_name:
-            return item[output_language]
+    item = get_mapping_index(mapping_file_path).get(japanese_name)
+    if item is not None:
+        return item[output_language]
     return japanese_name
 
 
 def translate_from_japanese_name(japanese_name, mapping_file_path, output_language):
-    table = read_json_from_file_in_resources(mapping_file_path)
+    index = get_mapping_index(mapping_file_path)
     japanese_name = japanese_name.strip()
     all_names = japanese_name.split("・")
     all_translated_names = []
     for name in all_names:
-        for item in table:
-            if item["japanese"] == name:
-                all_translated_names.append(item[output_language])
-                break
+        item = index.get(name)
+        if item is not None:
+            all_translated_names.append(item[output_language])
         else:
             all_translated_names.append(name)
     return "・".join(all_translated_names)
@@ -89,19 +127,19 @@ def convert_food_types_in_japanese_to_code(restaurant_types):
 
 def lookup_restaurant_type_code(restaurant_type):
     return translate_from_japanese_name(
-        restaurant_type, "category_code_mapping.json", "code"
+        restaurant_type, CATEGORY_CODE_MAPPING_FILE_NAME, "code"
     )
 
 
 def type_japanese_to_chinese(type_japanese):
     return translate_from_japanese_name(
-        type_japanese, "category_code_mapping.json", "chinese"
+        type_japanese, CATEGORY_CODE_MAPPING_FILE_NAME, "chinese"
     )
 
 
 def lookup_tokyo_subregion_code(subregion_name):
     return translate_from_japanese_name_to_code(
-        subregion_name, "tokyo_region_code_mapping.json", "code"
+        subregion_name, TOKYO_REGION_CODE_MAPPING_FILE_NAME, "code"
     )
 
 
@@ -111,3 +149,50 @@ def get_cache_key_for_tabelog(ikyu_id):
 
 def get_cache_key_for_google(ikyu_id):
     return f"google:restaurant:{ikyu_id}"
+
+
+def get_ratings_cache_ttl_seconds(ratings_data):
+    """
+    :param ratings_data: the Tabelog or Google data to cache, None if the restaurant was not found
+    """
+    if ratings_data is None:
+        return RATINGS_NOT_FOUND_CACHE_TTL_SECONDS
+    return RATINGS_CACHE_TTL_SECONDS
+
+
+def get_cache_key_for_ikyu_calendar(ikyu_id):
+    # v2: availability is stored as day ordinal and price arrays, see MealAvailability.to_json
+    return f"ikyu:calendar:v2:{ikyu_id}"
+
+
+def get_cache_key_for_ikyu_search_page(url):
+    return f"ikyu:search_page:{build_canonical_ikyu_search_query(url)}"
+
+
+def get_search_page_cache_ttl_seconds(restaurants):
+    """
+    :param restaurants: the restaurant cards of a search result page to cache
+    """
+    if not restaurants:
+        return SEARCH_PAGE_EMPTY_CACHE_TTL_SECONDS
+    return SEARCH_PAGE_CACHE_TTL_SECONDS
+
+
+def get_cache_key_for_search_stream(
+    food_types, locations, sort_option, start_date, end_date, num_people, start_page=1, start_card=0, limit=None,
+    filters_key=None, source=None,
+):
+    """
+    The same key for the same search, whatever the order of food types and locations.
+    Each slice of a search (start position and limit) has its own key.
+    :param filters_key: the RestaurantFilters.to_key of the search, if filtered
+    :param source: where the search is answered from, see index_search_utils.SEARCH_SOURCES
+    """
+    query = json.dumps(
+        [
+            sorted(food_types), sorted(locations), sort_option, start_date, end_date, str(num_people),
+            start_page, start_card, limit, filters_key, source,
+        ],
+        ensure_ascii=False,
+    )
+    return f"search_stream:{hashlib.sha1(query.encode(UTF_8_ENCODING)).hexdigest()}"
@@ -0,0 +1,65 @@
+"""
+Cooperative cancellation of upstream work nobody is waiting for anymore, e.g. after a
+client closed its search stream, and counters of the upstream work saved that way.
+"""
+import threading
+
+# Kind of work -> number of calls cancelled before they ran
+_cancelled_work = {
+    "searches": 0,
+    "page_fetches": 0,
+    "calendar_lookups": 0,
+    "tabelog_lookups": 0,
+    "google_lookups": 0,
+}
+_cancelled_work_lock = threading.Lock()
+
+
+class CancellationToken:
+    """
+    Set once by whoever no longer needs the work, checked by the code doing it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.is_cancelled = False
+
+    def cancel(self):
+        with self._lock:
+            if self.is_cancelled:
+                return
+            self.is_cancelled = True
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback):
+        """
+        Call callback on cancellation, right away if already cancelled.
+        """
+        with self._lock:
+            if not self.is_cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+def record_cancelled_work(kind, count=1):
+    if count:
+        with _cancelled_work_lock:
+            _cancelled_work[kind] += count
+
+
+def cancel_futures(futures, kind):
+    """
+    Cancel futures or asyncio tasks, counting the ones actually cancelled as saved work.
+    A future already running can't be cancelled; a task can be until it's done.
+    """
+    record_cancelled_work(kind, sum(1 for future in futures if future.cancel()))
+
+
+def get_cancellation_stats():
+    with _cancelled_work_lock:
+        return dict(_cancelled_work)
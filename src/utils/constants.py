@@ -16,6 +16,7 @@ DINNER = "dinner"
 TOKYO_LOCATION_CODE = "03001"
 HARD_TO_RESERVE = "Hard to Reserve"
 HARD_TO_RESERVE_THRESHOLD = 8
+LATEST_AVAILABLE_DATE = "Latest Available Date"
 TABELOG_RATING = "tabelogRating"
 TABELOG_LINK = "tabelogLink"
 GOOGLE_RATING = "googleRating"
@@ -0,0 +1,130 @@
+"""
+Capture raw upstream responses for debugging parsers, off the request path.
+
+A sampled share of responses, and with DEBUG_CAPTURE_PARSE_FAILURES all responses that
+could not be parsed, is put on a bounded queue. One background thread writes each to a
+gzipped file named after the capture time and a hash of the URL, and keeps only the newest
+DEBUG_CAPTURE_MAX_FILES files per source. Captures are dropped rather than blocking when the queue is full.
+"""
+import gzip
+import hashlib
+import os
+import queue
+import random
+import threading
+from collections import deque
+from datetime import datetime
+
+from config import *
+from utils.constants import UTF_8_ENCODING
+from utils.file_utils import proj_root_dir
+
+DEBUG_CAPTURE_FILE_SUFFIX = ".html.gz"
+
+_capture_queue = queue.Queue(maxsize=DEBUG_CAPTURE_QUEUE_SIZE)
+_writer_thread = None
+_writer_thread_lock = threading.Lock()
+# Paths of the files kept per source, oldest first. Only touched by the writer thread.
+_captured_paths_by_source = {}
+_stats = {"captured": 0, "dropped": 0, "write_errors": 0}
+
+
+def get_debug_capture_dir(source):
+    return os.path.join(proj_root_dir(), DEBUG_CAPTURE_DIR_NAME, source)
+
+
+def build_debug_capture_file_name(url, captured_at):
+    url_hash = hashlib.sha1(url.encode(UTF_8_ENCODING)).hexdigest()[:12]
+    # The timestamp comes first, so file names sort by capture time
+    return f"{captured_at.strftime('%Y%m%d-%H%M%S-%f')}-{url_hash}{DEBUG_CAPTURE_FILE_SUFFIX}"
+
+
+def capture_response(response, source, url, is_parse_failure=False):
+    """
+    Save a raw response in the background, if it's sampled.
+    :param response: the response text
+    :param source: where it's from, e.g. "ikyu_search"; each source has its own directory
+    :param url: the URL the response was downloaded from
+    :param is_parse_failure: whether the response could not be parsed, to capture it even if not
+    sampled with DEBUG_CAPTURE_PARSE_FAILURES
+    """
+    is_captured = (is_parse_failure and DEBUG_CAPTURE_PARSE_FAILURES) or (
+        DEBUG_CAPTURE_SAMPLE_RATE > 0 and random.random() < DEBUG_CAPTURE_SAMPLE_RATE
+    )
+    if not is_captured:
+        return
+    start_writer_thread()
+    try:
+        _capture_queue.put_nowait((datetime.now(), source, url, response))
+    except queue.Full:
+        _stats["dropped"] += 1
+
+
+def start_writer_thread():
+    global _writer_thread
+    if _writer_thread is not None:
+        return
+    with _writer_thread_lock:
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(target=write_captures_forever, daemon=True)
+            _writer_thread.start()
+
+
+def write_captures_forever():
+    while True:
+        captured_at, source, url, response = _capture_queue.get()
+        try:
+            write_capture(captured_at, source, url, response)
+            _stats["captured"] += 1
+        except OSError as error:
+            _stats["write_errors"] += 1
+            print("❌ Error in writing debug capture of: ", url, error)
+
+
+def write_capture(captured_at, source, url, response):
+    capture_dir = get_debug_capture_dir(source)
+    captured_paths = _captured_paths_by_source.get(source)
+    if captured_paths is None:
+        os.makedirs(capture_dir, exist_ok=True)
+        # Pick up the files of previous runs, so the ring stays bounded across restarts
+        captured_paths = deque(
+            os.path.join(capture_dir, file_name)
+            for file_name in sorted(os.listdir(capture_dir))
+            if file_name.endswith(DEBUG_CAPTURE_FILE_SUFFIX)
+        )
+        _captured_paths_by_source[source] = captured_paths
+
+    path = os.path.join(capture_dir, build_debug_capture_file_name(url, captured_at))
+    with gzip.open(path, "wt", encoding=UTF_8_ENCODING) as f:
+        # The URL is kept in the file, since the name only has its hash
+        f.write(f"<!-- {url} -->\n")
+        f.write(response)
+    captured_paths.append(path)
+
+    while len(captured_paths) > DEBUG_CAPTURE_MAX_FILES:
+        try:
+            os.remove(captured_paths.popleft())
+        except FileNotFoundError:
+            pass
+
+
+def get_latest_debug_capture_path(source):
+    """
+    :return: the path of the newest capture of source, or None if there is none
+    """
+    capture_dir = get_debug_capture_dir(source)
+    if not os.path.isdir(capture_dir):
+        return None
+    file_names = sorted(
+        file_name for file_name in os.listdir(capture_dir) if file_name.endswith(DEBUG_CAPTURE_FILE_SUFFIX)
+    )
+    return os.path.join(capture_dir, file_names[-1]) if file_names else None
+
+
+def read_debug_capture(path):
+    with gzip.open(path, "rt", encoding=UTF_8_ENCODING) as f:
+        return f.read()
+
+
+def get_debug_capture_stats():
+    return {**_stats, "queued": _capture_queue.qsize(), "sample_rate": DEBUG_CAPTURE_SAMPLE_RATE}
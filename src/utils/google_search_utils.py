@@ -1,19 +1,77 @@
-import json
 from utils.network import get_response_from_google_place_text_search_api
-from utils.redis_client import redis_client
-from .cache_utils import get_cache_key_for_google
+from utils.async_network import get_response_json_from_google_place_text_search_api_async
+from utils.tiered_cache import (
+    CACHE_MISS,
+    tiered_cache_get,
+    tiered_cache_get_async,
+    tiered_cache_set,
+    tiered_cache_set_async,
+)
+from utils.single_flight import SingleFlight, do_with_redis_lock, do_with_redis_lock_async
+from .cache_utils import get_cache_key_for_google, get_ratings_cache_ttl_seconds
+
+# Concurrent lookups of the same restaurant share one Places API call
+google_single_flight = SingleFlight()
+
 
 def get_google_data(ikyu_id, restaurant_search_name):
     cache_key = get_cache_key_for_google(ikyu_id)
-    cached_data = redis_client.get(cache_key)
-    if cached_data:
-        return json.loads(cached_data)
+    cached_data = tiered_cache_get(cache_key)
+    if cached_data is not CACHE_MISS:
+        return cached_data
+
+    return google_single_flight.do(
+        cache_key,
+        do_with_redis_lock,
+        cache_key,
+        fetch_google_data,
+        cache_key,
+        restaurant_search_name,
+    )
+
 
+def fetch_google_data(cache_key, restaurant_search_name):
     response_data = get_response_from_google_place_text_search_api(
         f"{restaurant_search_name} in Tokyo, Japan",
     )
-
+    # An error body may not be JSON, and is never a "not found"
+    response_data.raise_for_status()
     response = response_data.json()
+    google_data = parse_google_place_text_search_response(response, restaurant_search_name)
+    # "Not found" is cached too, for a shorter time. API errors are not a "not found".
+    if "error" not in response:
+        tiered_cache_set(cache_key, google_data, get_ratings_cache_ttl_seconds(google_data))
+    return google_data
+
+
+async def get_google_data_async(ikyu_id, restaurant_search_name):
+    cache_key = get_cache_key_for_google(ikyu_id)
+    cached_data = await tiered_cache_get_async(cache_key)
+    if cached_data is not CACHE_MISS:
+        return cached_data
+
+    return await google_single_flight.do_async(
+        cache_key,
+        do_with_redis_lock_async,
+        cache_key,
+        fetch_google_data_async,
+        cache_key,
+        restaurant_search_name,
+    )
+
+
+async def fetch_google_data_async(cache_key, restaurant_search_name):
+    response = await get_response_json_from_google_place_text_search_api_async(
+        f"{restaurant_search_name} in Tokyo, Japan",
+    )
+    google_data = parse_google_place_text_search_response(response, restaurant_search_name)
+    # "Not found" is cached too, for a shorter time. API errors are not a "not found".
+    if "error" not in response:
+        await tiered_cache_set_async(cache_key, google_data, get_ratings_cache_ttl_seconds(google_data))
+    return google_data
+
+
+def parse_google_place_text_search_response(response, restaurant_search_name):
     """
     Example response:
     {
@@ -31,7 +89,6 @@ def get_google_data(ikyu_id, restaurant_search_name):
     places = response.get("places")
     if places and "rating" in places[0]:
         rating, google_maps_uri = places[0]["rating"], places[0]["googleMapsUri"]
-        redis_client.set(cache_key, json.dumps((rating, google_maps_uri)), ex=86400)
         return rating, google_maps_uri
     else:
         print(f"❌ Restaurant not found in Google. "
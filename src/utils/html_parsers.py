@@ -0,0 +1,185 @@
+"""
+HTML parser backends for scraping Ikyu search result pages and Tabelog search pages.
+
+selectolax (lexbor, written in C) is used when it's installed; BeautifulSoup with
+"html.parser" is the fallback. Both backends extract exactly the same data, see
+benchmarks/html_parser_benchmark.py.
+"""
+from bs4 import BeautifulSoup
+
+from config import *
+from .constants import *
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# Selectors of the pages we scrape.
+# A class with spaces is matched as the exact class attribute, like BeautifulSoup's class_="a b".
+IKYU_SEARCH_CARD_SECTION_CLASS = "panda-jTWvec"
+IKYU_SEARCH_CARD_NAME_CLASS = "panda-dOmORn panda-hGHvhs panda-hdaWRu panda-ibbkAC"
+IKYU_SEARCH_CARD_COVER_IMAGE_CLASS = "panda-cAlrFB panda-dltTHI panda-cGFOJB panda-gnlqYH panda-jTWvec"
+IKYU_SEARCH_CARD_DESCRIPTION_CLASS = "panda-fPSBzf panda-bYPztT panda-qbege panda-cMGtQw panda-xYowz panda-fzpbKY"
+TABELOG_RESTAURANT_NAME_CLASS = "list-rst__rst-name-target cpy-rst-name"
+TABELOG_RESTAURANT_DATA_CLASS = "list-rst__rst-data"
+TABELOG_RATING_CLASS = "c-rating__val c-rating__val--strong list-rst__rating-val"
+
+
+def build_restaurant_info_from_ikyu_search_card(name, cover_image_url, description, rating):
+    # Food type is the second part of a description like "銀座／寿司"
+    food_type = "Unknown"
+    if description:
+        parts = description.split("／")
+        if len(parts) > 1:
+            food_type = parts[1].strip()
+
+    return {
+        RESTAURANT_NAME: name,
+        FOOD_TYPE: food_type,
+        RATING: rating.strip() if rating else None,
+        COVER_IMAGE_URL: cover_image_url,
+    }
+
+
+class BeautifulSoupHtmlParser:
+    """
+    Builds the whole document tree in Python. Slow, but has no dependency besides bs4.
+    """
+    name = "beautifulsoup"
+
+    def find_ikyu_search_cards(self, html):
+        """
+        :return: the restaurant card nodes of an Ikyu search result page
+        """
+        soup = BeautifulSoup(html, "html.parser")
+        return soup.find_all("section", class_=IKYU_SEARCH_CARD_SECTION_CLASS)
+
+    def get_ikyu_search_card_href(self, card):
+        # Link looks like href="/108103?visitorsCount=2"
+        return card.find("a", href=True)["href"]
+
+    def get_restaurant_info_from_ikyu_search_card(self, card):
+        name = card.find("a", class_=IKYU_SEARCH_CARD_NAME_CLASS).text.strip()
+
+        cover_image = card.find("span", class_=IKYU_SEARCH_CARD_COVER_IMAGE_CLASS).find("img")
+        cover_image_url = cover_image["src"] if cover_image and cover_image.has_attr("src") else None
+
+        description_element = card.find("div", class_=IKYU_SEARCH_CARD_DESCRIPTION_CLASS)
+        description = description_element.text if description_element else None
+
+        rating_element = card.find("div", itemprop="ratingValue")
+        rating = rating_element.text if rating_element else None
+
+        return build_restaurant_info_from_ikyu_search_card(name, cover_image_url, description, rating)
+
+    def find_tabelog_restaurants(self, html):
+        """
+        :return: a list of (name, link, rating) of the restaurants on a Tabelog search page, in page order
+        """
+        soup = BeautifulSoup(html, "html.parser")
+        restaurants = []
+        for name_tag in soup.find_all("a", class_=TABELOG_RESTAURANT_NAME_CLASS):
+            rating = None
+            parent_element = name_tag.find_parent("div", class_=TABELOG_RESTAURANT_DATA_CLASS)
+            if parent_element:
+                rating_tag = parent_element.find("span", class_=TABELOG_RATING_CLASS)
+                rating = rating_tag.text.strip() if rating_tag else None
+            restaurants.append((name_tag.text.strip(), name_tag.get("href"), rating))
+        return restaurants
+
+
+class SelectolaxHtmlParser:
+    """
+    Parses with lexbor in C, and only walks the card / name nodes with CSS selectors.
+    """
+    name = "selectolax"
+
+    def find_ikyu_search_cards(self, html):
+        tree = LexborHTMLParser(html)
+        return tree.css(f"section.{IKYU_SEARCH_CARD_SECTION_CLASS}")
+
+    def get_ikyu_search_card_href(self, card):
+        return card.css_first("a[href]").attributes["href"]
+
+    def get_restaurant_info_from_ikyu_search_card(self, card):
+        name = card.css_first(f'a[class="{IKYU_SEARCH_CARD_NAME_CLASS}"]').text().strip()
+
+        cover_image = card.css_first(f'span[class="{IKYU_SEARCH_CARD_COVER_IMAGE_CLASS}"]').css_first("img")
+        cover_image_url = cover_image.attributes.get("src") if cover_image else None
+
+        description_element = card.css_first(f'div[class="{IKYU_SEARCH_CARD_DESCRIPTION_CLASS}"]')
+        description = description_element.text() if description_element else None
+
+        rating_element = card.css_first('div[itemprop="ratingValue"]')
+        rating = rating_element.text() if rating_element else None
+
+        return build_restaurant_info_from_ikyu_search_card(name, cover_image_url, description, rating)
+
+    def find_tabelog_restaurants(self, html):
+        tree = LexborHTMLParser(html)
+        restaurants = []
+        for name_tag in tree.css(f'a[class="{TABELOG_RESTAURANT_NAME_CLASS}"]'):
+            rating = None
+            parent_element = find_parent_div_with_class(name_tag, TABELOG_RESTAURANT_DATA_CLASS)
+            if parent_element:
+                rating_tag = parent_element.css_first(f'span[class="{TABELOG_RATING_CLASS}"]')
+                rating = rating_tag.text().strip() if rating_tag else None
+            restaurants.append((name_tag.text().strip(), name_tag.attributes.get("href"), rating))
+        return restaurants
+
+
+def find_parent_div_with_class(node, class_name):
+    parent = node.parent
+    while parent is not None:
+        if parent.tag == "div" and class_name in (parent.attributes.get("class") or "").split():
+            return parent
+        parent = parent.parent
+    return None
+
+
+def extract_ikyu_search_page(parser, html):
+    """
+    :return: (href, restaurant info) of every card on an Ikyu search page, for comparing backends
+    """
+    cards = []
+    for card in parser.find_ikyu_search_cards(html):
+        try:
+            restaurant = parser.get_restaurant_info_from_ikyu_search_card(card)
+        except Exception as error:
+            # A card both backends fail on is still a match
+            restaurant = type(error).__name__
+        cards.append((parser.get_ikyu_search_card_href(card), restaurant))
+    return cards
+
+
+def extract_tabelog_search_page(parser, html):
+    return parser.find_tabelog_restaurants(html)
+
+
+# Page type -> everything a backend extracts from that page
+PAGE_EXTRACTORS = {
+    "ikyu": extract_ikyu_search_page,
+    "tabelog": extract_tabelog_search_page,
+}
+
+
+HTML_PARSERS = {
+    BeautifulSoupHtmlParser.name: BeautifulSoupHtmlParser,
+    SelectolaxHtmlParser.name: SelectolaxHtmlParser,
+}
+
+
+def get_html_parser(backend=HTML_PARSER_BACKEND):
+    """
+    :param backend: "selectolax", "beautifulsoup", or "auto" for selectolax if it's installed
+    """
+    if backend == "auto":
+        backend = SelectolaxHtmlParser.name if LexborHTMLParser else BeautifulSoupHtmlParser.name
+    if backend == SelectolaxHtmlParser.name and LexborHTMLParser is None:
+        raise ImportError("The selectolax HTML parser backend needs the selectolax package")
+    return HTML_PARSERS[backend]()
+
+
+# Shared by all scrapers; the backends keep no state between pages
+html_parser = get_html_parser()
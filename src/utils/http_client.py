@@ -0,0 +1,93 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from config import *
+
+# One session per upstream host, so each host gets its own keep-alive connection pool
+_sessions_by_host = {}
+_sessions_lock = threading.Lock()
+
+HTTP_TIMEOUT = (HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS)
+
+
+def get_session_for_url(url):
+    host = urlparse(url).netloc
+    with _sessions_lock:
+        session = _sessions_by_host.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions_by_host[host] = session
+    return session
+
+
+def get_retry_backoff_seconds(attempt):
+    """
+    Exponential backoff with full jitter, so retries from many workers don't line up.
+    :param attempt: 0 for the first retry, 1 for the second, ...
+    """
+    return random.uniform(0, HTTP_RETRY_BACKOFF_SECONDS * (2 ** attempt))
+
+
+def http_get(url, headers=None):
+    """
+    GET through the pooled session for the URL's host, retrying connection errors,
+    timeouts and HTTP_RETRY_STATUS_CODES up to HTTP_MAX_RETRIES times.
+    :raise requests.HTTPError: if the last response has an error status, so a throttling,
+    error or block page is never parsed as content
+    """
+    session = get_session_for_url(url)
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        is_last_attempt = attempt == HTTP_MAX_RETRIES
+        try:
+            response = session.get(url, headers=headers, timeout=HTTP_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as error:
+            if is_last_attempt:
+                raise
+            print(f"⚠️ GET {url} failed: {error}. Retrying...")
+        else:
+            if is_last_attempt or response.status_code not in HTTP_RETRY_STATUS_CODES:
+                response.raise_for_status()
+                return response
+            print(f"⚠️ GET {url} returned {response.status_code}. Retrying...")
+        time.sleep(get_retry_backoff_seconds(attempt))
+
+
+def http_post(url, headers=None, json=None):
+    """
+    POST through the pooled session for the URL's host. Not retried, since POST is not idempotent.
+    """
+    return get_session_for_url(url).post(url, headers=headers, json=json, timeout=HTTP_TIMEOUT)
+
+
+def get_connection_reuse_stats():
+    """
+    Count requests and newly opened connections per host of the pooled sessions.
+    Reused connections are requests that did not need a new connection (and a new TLS handshake).
+    :return: a dict of host -> {"requests", "new_connections", "reused_connections"}
+    """
+    with _sessions_lock:
+        sessions_by_host = dict(_sessions_by_host)
+
+    stats = {}
+    for host, session in sessions_by_host.items():
+        num_requests = 0
+        num_connections = 0
+        pool_manager = session.get_adapter(f"https://{host}").poolmanager
+        for pool_key in pool_manager.pools.keys():
+            pool = pool_manager.pools.get(pool_key)
+            if pool is not None:
+                num_requests += pool.num_requests
+                num_connections += pool.num_connections
+        stats[host] = {
+            "requests": num_requests,
+            "new_connections": num_connections,
+            "reused_connections": num_requests - num_connections,
+        }
+    return stats
@@ -1,38 +1,132 @@
 import datetime
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Stands in for a missing best price, since the price array only holds integers
+NO_PRICE = -1
+
+
+def date_string_to_ordinal(date_string):
+    return datetime.date.fromisoformat(date_string).toordinal()
+
+
+def ordinal_to_date_string(ordinal):
+    return datetime.date.fromordinal(ordinal).isoformat()
+
+
+class MealAvailability:
+    """
+    The available dates of one meal and their best prices, as two parallel arrays
+    sorted by date. Dates are day ordinals (datetime.date.toordinal), so range queries
+    are binary searches instead of parsing every "YYYY-MM-DD" key.
+    """
+
+    __slots__ = ("day_ordinals", "prices")
+
+    def __init__(self, day_ordinals=(), prices=()):
+        self.day_ordinals = array("l", day_ordinals)
+        self.prices = array("q", prices)
+
+    @classmethod
+    def from_items(cls, items):
+        """
+        :param items: (day ordinal, price or None) pairs, in any order. Prices are stored as
+        integers, so fractional yen prices are truncated.
+        """
+        items = sorted((ordinal, NO_PRICE if price is None else int(price)) for ordinal, price in items)
+        return cls((ordinal for ordinal, _ in items), (price for _, price in items))
+
+    @classmethod
+    def from_dict(cls, availability_json):
+        """
+        :param availability_json: {"YYYY-MM-DD": price}
+        """
+        return cls.from_items(
+            (date_string_to_ordinal(date), price) for date, price in availability_json.items()
+        )
+
+    def to_dict(self):
+        """
+        :return: {"YYYY-MM-DD": price}, ordered by date
+        """
+        return {
+            ordinal_to_date_string(ordinal): None if price == NO_PRICE else price
+            for ordinal, price in zip(self.day_ordinals, self.prices)
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["days"], data["prices"])
+
+    def to_json(self):
+        return {"days": self.day_ordinals.tolist(), "prices": self.prices.tolist()}
+
+    def __len__(self):
+        return len(self.day_ordinals)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, MealAvailability)
+            and self.day_ordinals == other.day_ordinals
+            and self.prices == other.prices
+        )
+
+    def get_index_range(self, begin_ordinal, end_ordinal):
+        return (
+            bisect_left(self.day_ordinals, begin_ordinal),
+            bisect_right(self.day_ordinals, end_ordinal),
+        )
+
+    def filter_range(self, begin_date_str, end_date_str):
+        """
+        :return: the availability between both dates, inclusive
+        """
+        begin, end = self.get_index_range(
+            date_string_to_ordinal(begin_date_str), date_string_to_ordinal(end_date_str)
+        )
+        return MealAvailability(self.day_ordinals[begin:end], self.prices[begin:end])
+
+    def latest_date(self):
+        """
+        :return: the latest available "YYYY-MM-DD", or None if no date is available
+        """
+        return ordinal_to_date_string(self.day_ordinals[-1]) if self.day_ordinals else None
+
+    def has_available_dates_after(self, date_string):
+        return bool(self.day_ordinals) and self.day_ordinals[-1] > date_string_to_ordinal(date_string)
+
+    def count_available_in_next_days(self, number_of_days, today=None):
+        """
+        :return: the number of available dates from today to today + number_of_days - 1
+        """
+        today_ordinal = (today or datetime.date.today()).toordinal()
+        begin, end = self.get_index_range(today_ordinal, today_ordinal + number_of_days - 1)
+        return end - begin
+
+    def first_price(self):
+        """
+        :return: the best price of the earliest available date, or None if no date is available
+        """
+        if not self.prices or self.prices[0] == NO_PRICE:
+            return None
+        return self.prices[0]
+
+    def min_price(self, begin_date_str=None, end_date_str=None):
+        """
+        :return: the lowest best price, between both dates if given, or None if no date is available
+        """
+        begin, end = 0, len(self.prices)
+        if begin_date_str and end_date_str:
+            begin, end = self.get_index_range(
+                date_string_to_ordinal(begin_date_str), date_string_to_ordinal(end_date_str)
+            )
+        prices = [price for price in self.prices[begin:end] if price != NO_PRICE]
+        return min(prices) if prices else None
 
 
 def has_available_dates_after(availability_json, date_string):
-    date_objects = [
-        datetime.datetime.strptime(date, "%Y-%m-%d")
-        for date in availability_json.keys()
-    ]
-    if len(date_objects) == 0:
-        return False
-    latest_date = max(date_objects)
-    check_date = datetime.datetime.strptime(date_string, "%Y-%m-%d")
-    return latest_date > check_date
+    return MealAvailability.from_dict(availability_json).has_available_dates_after(date_string)
 
 
 def filter_availability(availability_json, begin_date_str, end_date_str):
-    # Convert string dates to datetime objects for comparison
-    date_objects = {
-        datetime.datetime.strptime(date, "%Y-%m-%d"): value
-        for date, value in availability_json.items()
-    }
-
-    # Convert begin_date_str and end_date_str to datetime objects
-    begin_date = datetime.datetime.strptime(begin_date_str, "%Y-%m-%d")
-    end_date = datetime.datetime.strptime(end_date_str, "%Y-%m-%d")
-
-    # Filter the dates that fall between the begin and end date
-    filtered_data = {
-        date: value
-        for date, value in date_objects.items()
-        if begin_date <= date <= end_date
-    }
-
-    # Update the JSON string with filtered data
-    response = {
-        date.strftime("%Y-%m-%d"): value for date, value in filtered_data.items()
-    }
-    return response
+    return MealAvailability.from_dict(availability_json).filter_range(begin_date_str, end_date_str).to_dict()
@@ -1,8 +1,18 @@
-from datetime import datetime, timedelta
-
+from datetime import date, timedelta
+
+from config import CALENDAR_CACHE_TTL_SECONDS
+from utils.cache_utils import get_cache_key_for_ikyu_calendar
+from utils.tiered_cache import (
+    CACHE_MISS,
+    tiered_cache_get,
+    tiered_cache_get_async,
+    tiered_cache_set,
+    tiered_cache_set_async,
+)
 from utils.network import get_response_json_from_url_with_headers
+from utils.async_network import get_response_json_from_url_with_headers_async
 from utils.constants import *
-from utils.ikyu_availability_utils import filter_availability, has_available_dates_after
+from utils.ikyu_availability_utils import MealAvailability
 
 
 def clean_string(input_string):
@@ -10,109 +20,172 @@ def clean_string(input_string):
     return cleaned_string
 
 
+def build_ikyu_calendar_url(ikyu_id):
+    return f"https://restaurant.ikyu.com/api/v1/restaurants/{ikyu_id}/calendar"
+
+
 def get_availability_json_for_ikyu_id(ikuy_id):
-    url = f"https://restaurant.ikyu.com/api/v1/restaurants/{ikuy_id}/calendar"
+    url = build_ikyu_calendar_url(ikuy_id)
 
     data = get_response_json_from_url_with_headers(url)
+    return parse_availability_json(data)
+
+
+async def get_availability_json_for_ikyu_id_async(ikyu_id):
+    url = build_ikyu_calendar_url(ikyu_id)
 
+    data = await get_response_json_from_url_with_headers_async(url)
+    return parse_availability_json(data)
+
+
+def parse_availability_json(data):
+    """
+    :return: {meal: MealAvailability} of the meals with at least one available date, ordered by meal
+    """
     meal_types = ["breakfast", "lunch", "dinner", "teatime"]
     availability = {}
     for meal in meal_types:
-        for month in data[meal]:
-            for day in month["days"]:
-                if day["has_inventory"]:
-                    day_num = day["day"]
-                    mon_num = day["month"]
-                    year_num = day["year"]
-                    date_string = f"{year_num:04d}-{mon_num:02d}-{day_num:02d}"
-                    if meal not in availability:
-                        availability[meal] = {}
-                    availability[meal][date_string] = day["best_price"]
-
-    # sort the dictionary by date
+        items = [
+            (date(day["year"], day["month"], day["day"]).toordinal(), day["best_price"])
+            for month in data[meal]
+            for day in month["days"]
+            if day["has_inventory"]
+        ]
+        if items:
+            availability[meal] = MealAvailability.from_items(items)
+
+    # sort the dictionary by meal
     availability = dict(sorted(availability.items()))
     return availability
 
 
-def get_hard_to_reserve_value(availability):
-    # """
-    # {
-    #     "2024-03-17": 3800,
-    #     "2024-03-18": 3800,
-    #     "2024-03-20": 3800,
-    #     ...
-    # }
-    # """
-    # Only available dates are in the dictionary
-    # If there is less than 5 days in next 30 days that are available, return True
-    # Get all the dates in the next 30 days
-    available_reservation_dates = list(availability.keys())
+def get_hard_to_reserve_value(meal_availability):
+    """
+    :param meal_availability: the MealAvailability of one meal
+    :return: True if less than HARD_TO_RESERVE_THRESHOLD days of the next 30 days are
+    available, while the restaurant already takes reservations beyond them
+    """
+    today = date.today()
     # Make sure reservation dates have availability after 30 days from today
-    has_reservation_after_30_days = has_available_dates_after(
-        availability, str(datetime.now().date() + timedelta(days=30)))
+    has_reservation_after_30_days = meal_availability.has_available_dates_after(
+        str(today + timedelta(days=30)))
     if not has_reservation_after_30_days:
         return False
-    next_30_days = [str(datetime.now().date() + timedelta(days=i))
-                    for i in range(0, 30)]
-    available_next_30_days = [
-        date for date in next_30_days if date in available_reservation_dates]
 
-    if len(available_next_30_days) < HARD_TO_RESERVE_THRESHOLD:
-        hard_to_reserve = True
-    else:
-        hard_to_reserve = False
-
-    return hard_to_reserve
+    return meal_availability.count_available_in_next_days(30, today) < HARD_TO_RESERVE_THRESHOLD
 
 
 def trim_availability_by_target_date_range(availability, start_date: str, end_date: str):
-    if DINNER not in availability:
-        filtered_dinner_json = {}
-    else:
-        filtered_dinner_json = filter_availability(
-            availability[DINNER],
-            start_date,
-            end_date,
-        )
+    """
+    Convert the lunch and dinner availability to the {"YYYY-MM-DD": price} format of the
+    web API, keeping only dates from start_date to end_date.
+    :param availability: {meal: MealAvailability}
+    """
+    return {
+        meal: availability[meal].filter_range(start_date, end_date).to_dict() if meal in availability else {}
+        for meal in [DINNER, LUNCH]
+    }
 
-    if LUNCH not in availability:
-        filtered_lunch_json = {}
-    else:
-        filtered_lunch_json = filter_availability(
-            availability[LUNCH],
-            start_date,
-            end_date,
+
+def get_availability_ikyu(ikyu_id, start_date: str):
+    return build_availability_ikyu(get_calendar_summary(ikyu_id), start_date)
+
+
+def get_calendar_summary(ikyu_id):
+    """
+    :return: the calendar summary of a restaurant, from the cache or Ikyu, see build_calendar_summary
+    """
+    calendar_summary = get_cached_calendar_summary(ikyu_id)
+    if calendar_summary is None:
+        raw_availability = get_availability_json_for_ikyu_id(ikyu_id)
+        calendar_summary = build_calendar_summary(raw_availability)
+        store_cached_calendar_summary(ikyu_id, calendar_summary)
+    return calendar_summary
+
+
+async def get_availability_ikyu_async(ikyu_id, start_date: str):
+    calendar_summary = await tiered_cache_get_async(get_cache_key_for_ikyu_calendar(ikyu_id))
+    if calendar_summary is CACHE_MISS:
+        raw_availability = await get_availability_json_for_ikyu_id_async(ikyu_id)
+        calendar_summary = build_calendar_summary(raw_availability)
+        await tiered_cache_set_async(
+            get_cache_key_for_ikyu_calendar(ikyu_id), calendar_summary, CALENDAR_CACHE_TTL_SECONDS
         )
+    return build_availability_ikyu(calendar_summary, start_date)
 
-    availability = {
-        DINNER: filtered_dinner_json,
-        LUNCH: filtered_lunch_json
-    }
-    return availability
 
+def get_cached_calendar_summary(ikyu_id):
+    calendar_summary = tiered_cache_get(get_cache_key_for_ikyu_calendar(ikyu_id))
+    if calendar_summary is CACHE_MISS:
+        return None
+    return calendar_summary
 
-def get_availability_ikyu(ikyu_id, start_date: str):
-    raw_availability = get_availability_json_for_ikyu_id(ikyu_id)
 
-    # Check if reservation is open
-    is_reservation_open = False
-    if DINNER in raw_availability.keys() and raw_availability[DINNER].keys():
-        is_reservation_open = has_available_dates_after(
-            raw_availability[DINNER], start_date
-        )
-    if not is_reservation_open:
-        is_reservation_open = has_available_dates_after(
-            raw_availability[LUNCH], start_date
-        )
+def store_cached_calendar_summary(ikyu_id, calendar_summary):
+    tiered_cache_set(
+        get_cache_key_for_ikyu_calendar(ikyu_id),
+        calendar_summary,
+        CALENDAR_CACHE_TTL_SECONDS,
+    )
+
 
-    availability = raw_availability
+def build_calendar_summary(raw_availability):
+    """
+    Precompute everything derived from a calendar that does not depend on the search,
+    so a cached calendar can be used without processing it again.
+    The summary is JSON serializable; MealAvailability is stored with to_json.
+    :param raw_availability: the parsed calendar, see parse_availability_json
+    """
     hard_to_reserve_lunch = (LUNCH in raw_availability) and get_hard_to_reserve_value(
         raw_availability[LUNCH])
     hard_to_reserve_dinner = (DINNER in raw_availability) and get_hard_to_reserve_value(
         raw_availability[DINNER])
-    availability[HARD_TO_RESERVE] = hard_to_reserve_lunch or hard_to_reserve_dinner
+
+    latest_available_dates = {
+        meal: raw_availability[meal].latest_date()
+        for meal in [LUNCH, DINNER]
+        if meal in raw_availability and raw_availability[meal]
+    }
+
+    return {
+        AVAILABILITY: {meal: meal_availability.to_json() for meal, meal_availability in raw_availability.items()},
+        HARD_TO_RESERVE: hard_to_reserve_lunch or hard_to_reserve_dinner,
+        LATEST_AVAILABLE_DATE: latest_available_dates,
+        LUNCH_PRICE: get_lunch_price_from_availability(raw_availability),
+        DINNER_PRICE: get_dinner_price_from_availability(raw_availability),
+    }
+
+
+def build_availability_ikyu(calendar_summary, start_date: str):
+    # Check if reservation is open
+    is_reservation_open = any(
+        latest_date > start_date
+        for latest_date in calendar_summary[LATEST_AVAILABLE_DATE].values()
+    )
+
+    availability = {
+        meal: MealAvailability.from_json(meal_availability)
+        for meal, meal_availability in calendar_summary[AVAILABILITY].items()
+    }
+    availability[HARD_TO_RESERVE] = calendar_summary[HARD_TO_RESERVE]
+    availability[LUNCH_PRICE] = calendar_summary[LUNCH_PRICE]
+    availability[DINNER_PRICE] = calendar_summary[DINNER_PRICE]
     availability[
         RESERVATION_STATUS
     ] = f"Likely open for reservation after {start_date}: {is_reservation_open}"
 
     return availability
+
+
+def get_dinner_price_from_availability(availability):
+    if DINNER in availability.keys():
+        return availability[DINNER].first_price()
+    else:
+        return "Not available"
+
+
+def get_lunch_price_from_availability(availability):
+    if LUNCH in availability.keys():
+        return availability[LUNCH].first_price()
+    else:
+        return "Not available"
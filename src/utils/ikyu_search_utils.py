@@ -1,12 +1,28 @@
+import asyncio
+import concurrent.futures
+import json
 import traceback
 
-from bs4 import BeautifulSoup
 from config import *
 from utils.network import get_response_html_from_url_with_headers
-from utils.ikyu_parse_utils import get_availability_ikyu
-from .file_utils import write_response_to_debug_log_file
+from utils.async_network import get_event_loop_semaphore, get_response_html_from_url_with_headers_async
+from utils.ikyu_parse_utils import (
+    get_availability_ikyu,
+    get_availability_ikyu_async,
+    get_dinner_price_from_availability,
+    get_lunch_price_from_availability,
+)
+from utils.redis_client import redis_client
+from utils.single_flight import SingleFlight
+from .cancellation import cancel_futures
+from .html_parsers import html_parser
+from .debug_capture import capture_response
 
 from .cache_utils import (
+    get_cache_key_for_ikyu_search_page,
+    get_search_page_cache_ttl_seconds,
+    get_cached_restaurant_infos_by_ikyu_ids,
+    store_cached_restaurant_info_by_ikyu_id,
     convert_food_types_in_japanese_to_code,
     convert_tokyo_sub_regions_in_japanese_to_location_code,
 )
@@ -20,7 +36,54 @@ from utils.ikyu_url_builders import (
 
 
 def search_restaurants_in_tokyo_yield(
-    sub_regions_japanese, restaurant_types_japanese, sort_option, start_date: str, num_people
+    sub_regions_japanese,
+    restaurant_types_japanese,
+    sort_option,
+    start_date: str,
+    num_people,
+    keep_page_order=True,
+    start_page=1,
+    start_card=0,
+    limit=None,
+    next_position=None,
+):
+    """
+    Search PAGES_TO_SEARCH result pages from start_page, see restaurants_from_search_urls_yield.
+    """
+    all_urls = build_search_urls_for_tokyo(
+        sub_regions_japanese, restaurant_types_japanese, sort_option, num_people, start_page
+    )
+    yield from restaurants_from_search_urls_yield(
+        all_urls, start_date, keep_page_order, start_page, start_card, limit, next_position
+    )
+
+
+async def search_restaurants_in_tokyo_async_yield(
+    sub_regions_japanese,
+    restaurant_types_japanese,
+    sort_option,
+    start_date: str,
+    num_people,
+    keep_page_order=True,
+    start_page=1,
+    start_card=0,
+    limit=None,
+    next_position=None,
+):
+    """
+    Async equivalent of search_restaurants_in_tokyo_yield.
+    """
+    all_urls = build_search_urls_for_tokyo(
+        sub_regions_japanese, restaurant_types_japanese, sort_option, num_people, start_page
+    )
+    async for restaurant in restaurants_from_search_urls_async_yield(
+        all_urls, start_date, keep_page_order, start_page, start_card, limit, next_position
+    ):
+        yield restaurant
+
+
+def build_search_urls_for_tokyo(
+    sub_regions_japanese, restaurant_types_japanese, sort_option, num_people, start_page=1
 ):
     restaurant_codes = convert_food_types_in_japanese_to_code(restaurant_types_japanese)
     subregion_codes = convert_tokyo_sub_regions_in_japanese_to_location_code(
@@ -28,27 +91,117 @@ def search_restaurants_in_tokyo_yield(
     )
     sort_code = SORT_OPTIONS[sort_option]
     search_root_url = build_ikyu_query_url_for_tokyo(restaurant_codes, subregion_codes, sort_code, num_people)
-    all_urls = build_ikyu_query_urls_from_known_url(
-        search_root_url, pages_to_search=PAGES_TO_SEARCH
+    return build_ikyu_query_urls_from_known_url(
+        search_root_url, pages_to_search=PAGES_TO_SEARCH, start_page=start_page
     )
-    yield from restaurants_from_search_urls_yield(all_urls, start_date)
 
 
-def restaurants_from_search_urls_yield(urls, start_date: str):
-    for url in urls:
-        yield from restaurants_from_search_url_yield(url, start_date)
+# Shared by all searches so the number of in-flight page downloads stays bounded
+search_page_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=SEARCH_PAGE_FETCH_WORKERS
+)
+# Shared by all searches so the number of in-flight calendar API calls stays bounded
+calendar_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=CALENDAR_FETCH_WORKERS
+)
 
-def get_dinner_price_from_availability(availability):
-    if DINNER in availability.keys():
-        return list(availability[DINNER].values())[0]
-    else:
-        return "Not available"
 
-def get_lunch_price_from_availability(availability):
-    if LUNCH in availability.keys():
-        return list(availability[LUNCH].values())[0]
-    else:
-        return "Not available"
+# Identical page fetches in flight at the same time share one upstream request
+search_page_single_flight = SingleFlight()
+
+
+def prefetch_search_pages(urls):
+    """
+    Start downloading and parsing all search result pages in parallel.
+    :param urls: the search result page URLs, in page order
+    :return: a list of futures resolving to the page's restaurant cards, in the same order as urls
+    """
+    return [
+        search_page_executor.submit(get_search_page_cards, url)
+        for url in urls
+    ]
+
+
+def restaurants_from_search_urls_yield(
+    urls,
+    start_date: str,
+    keep_page_order=True,
+    start_page=1,
+    start_card=0,
+    limit=None,
+    next_position=None,
+):
+    """
+    Yield restaurants from the search result pages, in page order.
+    Pages are downloaded in parallel up front; with a limit, only the pages expected to be
+    needed, and further pages one at a time if that was not enough. Restaurants already seen
+    on an earlier page are skipped, and we stop at the first page without results.
+    Within a page, keep_page_order=False yields restaurants as their calendars arrive.
+    :param urls: the search result page URLs, in page order, the first being page start_page
+    :param start_card: the index of the first card to yield on the first page
+    :param limit: the most cards to yield (or skip, if their calendar fails), None for all
+    :param next_position: a dict, updated in place with the "page" and "card" to resume from,
+    see get_next_search_position. Emptied if the search has no more results.
+    """
+    if next_position is None:
+        next_position = {}
+    page_futures = prefetch_search_pages(urls[:get_pages_to_prefetch(len(urls), start_card, limit)])
+    seen_ikyu_ids = set()
+    remaining_cards = limit
+    try:
+        for page_index, url in enumerate(urls):
+            if page_index == len(page_futures):
+                page_futures.extend(prefetch_search_pages([url]))
+            restaurants = page_futures[page_index].result()
+            if len(restaurants) == 0:
+                next_position.clear()
+                break
+            first_card, end_card = get_page_card_range(
+                len(restaurants), start_card if page_index == 0 else 0, remaining_cards
+            )
+            page_restaurants = remove_seen_restaurants(restaurants[first_card:end_card], seen_ikyu_ids)
+            yield from restaurants_with_availability_yield(page_restaurants, start_date, keep_page_order)
+            next_position.update(get_next_search_position(start_page + page_index, end_card, len(restaurants)))
+            if remaining_cards is not None:
+                remaining_cards -= end_card - first_card
+                if remaining_cards <= 0:
+                    break
+    finally:
+        # Pages after an empty page (or after the caller stopped) are not needed
+        cancel_futures(page_futures, "page_fetches")
+
+
+def get_pages_to_prefetch(number_of_pages, start_card, limit):
+    """
+    :return: how many pages to download up front: all pages without a limit, otherwise
+    the pages expected to hold cards start_card to start_card + limit of the first page
+    """
+    if limit is None:
+        return number_of_pages
+    # Ceiling division
+    expected_pages = -(-(start_card + limit) // IKYU_SEARCH_CARDS_PER_PAGE)
+    return min(number_of_pages, expected_pages)
+
+
+def get_page_card_range(number_of_cards, first_card, remaining_cards):
+    """
+    :return: (first, end) indexes of the cards of a page to yield
+    """
+    first_card = min(first_card, number_of_cards)
+    if remaining_cards is None:
+        return first_card, number_of_cards
+    return first_card, min(number_of_cards, first_card + remaining_cards)
+
+
+def get_next_search_position(page, end_card, number_of_cards):
+    """
+    :param page: the page number of the last cards yielded
+    :param end_card: the index after the last card yielded on that page
+    :return: {"page", "card"} of the first card not yielded yet
+    """
+    if end_card >= number_of_cards:
+        return {"page": page + 1, "card": 0}
+    return {"page": page, "card": end_card}
 
 
 def restaurants_from_search_url_yield(url, start_date: str):
@@ -57,99 +210,265 @@ def restaurants_from_search_url_yield(url, start_date: str):
     :param url: the URL to send GET request
     :return: the parsed/beautified Restaurant info
     """
+    restaurants = get_search_page_cards(url)
+    yield from restaurants_with_availability_yield(restaurants, start_date)
+
+
+def get_search_page_cards(url):
+    """
+    Get the restaurant cards of a search result page, without availability.
+    Parsed cards are cached in Redis under a canonical key of the query, and concurrent
+    requests for the same page share one upstream request.
+    :return: a list of restaurant info dicts owned by the caller, empty if the page has no results
+    """
+    cache_key = get_cache_key_for_ikyu_search_page(url)
+    restaurants = search_page_single_flight.do(cache_key, load_search_page_cards, url, cache_key)
+    return [dict(restaurant) for restaurant in restaurants]
+
+
+def load_search_page_cards(url, cache_key):
+    cached_data = redis_client.get(cache_key)
+    if cached_data is not None:
+        return json.loads(cached_data)
+
     # Send a GET request to the URL
     response = get_response_html_from_url_with_headers(url)
-    # Write response content to debug log file
-    write_response_to_debug_log_file(response, "debug_log", "ikyu_search_link_raw_content.html")
+    restaurants = parse_search_page_cards(response, url)
+    redis_client.set(cache_key, json.dumps(restaurants), ex=get_search_page_cache_ttl_seconds(restaurants))
+    return restaurants
+
+
+async def get_search_page_cards_async(url):
+    """
+    Async equivalent of get_search_page_cards.
+    """
+    cache_key = get_cache_key_for_ikyu_search_page(url)
+    restaurants = await search_page_single_flight.do_async(
+        cache_key, load_search_page_cards_async, url, cache_key
+    )
+    return [dict(restaurant) for restaurant in restaurants]
+
 
-    # Parse the HTML content of the page with BeautifulSoup
-    soup = BeautifulSoup(response, "html.parser")
+async def load_search_page_cards_async(url, cache_key):
+    # The Redis client is blocking, keep it off the event loop
+    cached_data = await asyncio.to_thread(redis_client.get, cache_key)
+    if cached_data is not None:
+        return json.loads(cached_data)
 
-    # Find all "section" elements with class "restaurantCard_jpBMy"
-    sections = soup.find_all("section", class_="panda-jTWvec")
+    response = await get_response_html_from_url_with_headers_async(url)
+    # Parsing is CPU bound and the restaurant info cache is on disk, keep both off the event loop
+    restaurants = await asyncio.to_thread(parse_search_page_cards, response, url)
+    await asyncio.to_thread(
+        redis_client.set, cache_key, json.dumps(restaurants), ex=get_search_page_cache_ttl_seconds(restaurants)
+    )
+    return restaurants
+
+
+def parse_search_page_cards(response, url):
+    sections = parse_search_result_sections(response, url)
+    return restaurant_cards_from_search_sections(sections)
+
+
+def remove_seen_restaurants(restaurants, seen_ikyu_ids):
+    """
+    :param seen_ikyu_ids: the ikyu ids of restaurants already yielded; updated in place
+    """
+    new_restaurants = []
+    for restaurant in restaurants:
+        if restaurant[IKYU_ID] not in seen_ikyu_ids:
+            seen_ikyu_ids.add(restaurant[IKYU_ID])
+            new_restaurants.append(restaurant)
+    return new_restaurants
+
+
+def parse_search_result_sections(response, url):
+    """
+    Find the restaurant card sections in a search result page.
+    :param response: the HTML of the search result page
+    :param url: the URL the page was downloaded from, for logging
+    :return: a list of restaurant card nodes, empty if the page has no results
+    """
+    sections = html_parser.find_ikyu_search_cards(response)
+    # Pages without cards may be pages the parser no longer understands
+    capture_response(response, "ikyu_search", url, is_parse_failure=len(sections) == 0)
     if len(sections) == 0:
         print("No sections found in link: ", url)
-        return
     else:
         print("Found ", len(sections), " sections in link: ", url)
-        
+    return sections
+
+
+def restaurants_with_availability_yield(restaurants, start_date: str, keep_page_order=True):
+    """
+    Yield each restaurant of a search result page with its availability.
+    The calendars of all restaurants on the page are fetched in parallel on the shared
+    calendar executor, and each restaurant is yielded once its calendar arrives.
+    :param restaurants: the restaurant cards of one page
+    :param start_date: the first date the user wants to book
+    :param keep_page_order: yield in card order if True, otherwise in the order calendars arrive
+    """
+    calendar_futures = {
+        calendar_executor.submit(get_availability_ikyu, restaurant[IKYU_ID], start_date): restaurant
+        for restaurant in restaurants
+    }
+    if keep_page_order:
+        completed_futures = list(calendar_futures)
+    else:
+        completed_futures = concurrent.futures.as_completed(calendar_futures)
+
+    try:
+        for calendar_future in completed_futures:
+            restaurant = calendar_futures[calendar_future]
+            try:
+                add_availability_to_restaurant(restaurant, calendar_future.result())
+            except Exception as error:
+                print_restaurant_error(restaurant[RESERVATION_LINK], error)
+                continue
+            yield restaurant
+    finally:
+        # Calendars not fetched yet are not needed if the caller stopped early
+        cancel_futures(calendar_futures, "calendar_lookups")
+
+
+async def restaurants_from_search_urls_async_yield(
+    urls,
+    start_date: str,
+    keep_page_order=True,
+    start_page=1,
+    start_card=0,
+    limit=None,
+    next_position=None,
+):
+    """
+    Async equivalent of restaurants_from_search_urls_yield.
+    """
+    if next_position is None:
+        next_position = {}
+    page_tasks = [
+        asyncio.ensure_future(get_search_page_cards_async(url))
+        for url in urls[:get_pages_to_prefetch(len(urls), start_card, limit)]
+    ]
+    seen_ikyu_ids = set()
+    remaining_cards = limit
+    try:
+        for page_index, url in enumerate(urls):
+            if page_index == len(page_tasks):
+                page_tasks.append(asyncio.ensure_future(get_search_page_cards_async(url)))
+            restaurants = await page_tasks[page_index]
+            if len(restaurants) == 0:
+                next_position.clear()
+                break
+            first_card, end_card = get_page_card_range(
+                len(restaurants), start_card if page_index == 0 else 0, remaining_cards
+            )
+            page_restaurants = remove_seen_restaurants(restaurants[first_card:end_card], seen_ikyu_ids)
+            async for restaurant in restaurants_with_availability_async_yield(
+                page_restaurants, start_date, keep_page_order
+            ):
+                yield restaurant
+            next_position.update(get_next_search_position(start_page + page_index, end_card, len(restaurants)))
+            if remaining_cards is not None:
+                remaining_cards -= end_card - first_card
+                if remaining_cards <= 0:
+                    break
+    finally:
+        cancel_futures(page_tasks, "page_fetches")
+
+
+async def restaurants_with_availability_async_yield(restaurants, start_date: str, keep_page_order=True):
+    """
+    Fetch the calendars of a page's restaurants concurrently, bounded by
+    CALENDAR_FETCH_WORKERS per event loop, and yield each restaurant with its availability.
+    """
+    calendar_tasks = [
+        asyncio.ensure_future(add_availability_to_restaurant_async(restaurant, start_date))
+        for restaurant in restaurants
+    ]
+    if keep_page_order:
+        completed_tasks = calendar_tasks
+    else:
+        completed_tasks = asyncio.as_completed(calendar_tasks)
+
+    try:
+        for calendar_task in completed_tasks:
+            restaurant = await calendar_task
+            if restaurant is not None:
+                yield restaurant
+    finally:
+        cancel_futures(calendar_tasks, "calendar_lookups")
+
+
+async def add_availability_to_restaurant_async(restaurant, start_date: str):
+    try:
+        async with get_event_loop_semaphore("calendar", CALENDAR_FETCH_WORKERS):
+            availability = await get_availability_ikyu_async(restaurant[IKYU_ID], start_date)
+        add_availability_to_restaurant(restaurant, availability)
+        return restaurant
+    except Exception as error:
+        print_restaurant_error(restaurant[RESERVATION_LINK], error)
+        return None
+
+
+def add_availability_to_restaurant(restaurant, availability):
+    restaurant[AVAILABILITY] = availability
+    restaurant[DINNER_PRICE] = availability[DINNER_PRICE]
+    restaurant[LUNCH_PRICE] = availability[LUNCH_PRICE]
+
+
+def restaurant_cards_from_search_sections(sections):
+    """
+    Parse the restaurant cards of a search result page, without availability.
+    :param sections: the restaurant card nodes of one page
+    :return: a list of restaurant info dicts, in card order
+    """
     # Base URL for concatenation
     base_url = "https://restaurant.ikyu.com"
-    # Find all restaurants per url
+    restaurants = []
 
-    for i in range(len(sections)):
+    # Link looks like href="/108103?visitorsCount=2"
+    links = []
+    for section in sections:
         # Find the first href link in the section
-        link = sections[i].find("a", href=True)
-        # Link looks like href="/108103?visitorsCount=2"
-        ikyu_id = link["href"].split("?")[0][1:]
-        # restaurant = get_cached_restaurant_info_by_ikyu_id(ikyu_id)
-        restaurant = {}
-        # if restaurant:
-        #     # Make sure we have everything we need. Otherwise, we'll have to scrape it.
-        #     has_all_info = (
-        #         RESTAURANT_NAME in restaurant.keys()
-        #         and FOOD_TYPE in restaurant.keys()
-        #         and RATING in restaurant.keys()
-        #         and COVER_IMAGE_URL in restaurant.keys()
-        #     )
-        #     if has_all_info:
-        #         yield restaurant
-        #         continue
+        href = html_parser.get_ikyu_search_card_href(section)
+        ikyu_id = href.split("?")[0][1:]
+        links.append((section, ikyu_id, href))
+
+    cached_restaurants = {}
+    if RESTAURANT_INFO_CACHE_ENABLED:
+        cached_restaurants = get_cached_restaurant_infos_by_ikyu_ids(
+            [ikyu_id for _, ikyu_id, _ in links]
+        )
+
+    for section, ikyu_id, href in links:
+        restaurant = cached_restaurants.get(ikyu_id)
+        # Make sure we have everything we need. Otherwise, we'll have to scrape it.
+        has_all_info = restaurant and (
+            RESTAURANT_NAME in restaurant.keys()
+            and FOOD_TYPE in restaurant.keys()
+            and RATING in restaurant.keys()
+            and COVER_IMAGE_URL in restaurant.keys()
+        )
         try:
-            restaurant = get_restaurant_info_from_ikyu_search_card_soup(
-                sections[i]
-            )
+            if not has_all_info:
+                restaurant = html_parser.get_restaurant_info_from_ikyu_search_card(section)
+                if RESTAURANT_INFO_CACHE_ENABLED:
+                    store_cached_restaurant_info_by_ikyu_id(ikyu_id, dict(restaurant))
             restaurant[IKYU_ID] = ikyu_id
-            restaurant[RESERVATION_LINK] = base_url + link["href"]
-            restaurant[AVAILABILITY] = get_availability_ikyu(ikyu_id, start_date)
-            restaurant[DINNER_PRICE] = get_dinner_price_from_availability(restaurant[AVAILABILITY])
-            restaurant[LUNCH_PRICE] = get_lunch_price_from_availability(restaurant[AVAILABILITY])
-            if restaurant is None:
-                continue
-            # store_cached_restaurant_info_by_ikyu_id(ikyu_id, restaurant)
-
-            yield restaurant
+            # The link depends on the number of people, so it's never taken from the cache
+            restaurant[RESERVATION_LINK] = base_url + href
+            restaurants.append(restaurant)
         except Exception as error:
-            print(
-                "❌ Error in getting restaurant info from link: ",
-                base_url + link["href"],
-            )
-            print("Error: ", error)
-            print("Stack trace:")
-            print(traceback.format_exc())
+            print_restaurant_error(base_url + href, error)
 
+    return restaurants
 
-def get_restaurant_info_from_ikyu_search_card_soup(soup):
-    name = soup.find("a", class_="panda-dOmORn panda-hGHvhs panda-hdaWRu panda-ibbkAC").text.strip()
 
-    # Try to find cover image
-    cover_image_url = soup.find("span", class_="panda-cAlrFB panda-dltTHI panda-cGFOJB panda-gnlqYH panda-jTWvec").find("img")
-    if cover_image_url and cover_image_url.has_attr("src"):
-        cover_image_url = cover_image_url["src"]
-    else:
-        cover_image_url = None
-    
-    # Try to find food type in description
-    description_element = soup.find("div", class_="panda-fPSBzf panda-bYPztT panda-qbege panda-cMGtQw panda-xYowz panda-fzpbKY")
-    if description_element and description_element.text:
-        description = description_element.text
-        parts = description.split("／")
-        if len(parts) > 1:
-            food_type = parts[1].strip()
-        else:
-            food_type = "Unknown"
-    else:
-        food_type = "Unknown"
-
-    # Try to find rating of the restaurant
-    rating = None
-    rating_element = soup.find("div", itemprop="ratingValue")
-    if rating_element and rating_element.text:
-        rating = rating_element.text.strip()
-
-    return {
-        RESTAURANT_NAME: name,
-        FOOD_TYPE: food_type,
-        RATING: rating,
-        COVER_IMAGE_URL: cover_image_url,
-    }
+def print_restaurant_error(reservation_link, error):
+    print(
+        "❌ Error in getting restaurant info from link: ",
+        reservation_link,
+    )
+    print("Error: ", error)
+    print("Stack trace:")
+    print(traceback.format_exc())
+
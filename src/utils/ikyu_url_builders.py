@@ -32,12 +32,13 @@ def build_ikyu_query_url(
     print("🔍 Sub region codes: ", sub_region_codes)
     print("🔍 Sort code: ", sort_code)
     print("🔍 Number of people: ", num_people)
-    codes_param = ",".join(restaurant_type_codes)
+    # Sorted, so the same set of codes always gives the same URL
+    codes_param = ",".join(sorted(restaurant_type_codes))
     params = {
         "pups": num_people,
         "rtpc": codes_param,
         "rac1": location_code,
-        "rac2": ",".join(sub_region_codes),
+        "rac2": ",".join(sorted(sub_region_codes)),
         "pndt": 1,
         "ptaround": 0,
         "xsrt": sort_code,
@@ -50,13 +51,16 @@ def build_ikyu_query_url(
     return full_url
 
 
-def build_ikyu_query_urls_from_known_url(known_url, pages_to_search=PAGES_TO_SEARCH):
+def build_ikyu_query_urls_from_known_url(known_url, pages_to_search=PAGES_TO_SEARCH, start_page=1):
+    """
+    :return: the URLs of pages_to_search result pages, starting with page start_page (1 based)
+    """
     # Parse the URL and its parameters
     url_parts = urlparse(known_url)
     query_params = parse_qs(url_parts.query)
 
     urls = []
-    for xpge_value in range(1, pages_to_search + 1):
+    for xpge_value in range(start_page, start_page + pages_to_search):
         # Update the 'xpge' parameter
         query_params["xpge"] = xpge_value
 
@@ -68,3 +72,22 @@ def build_ikyu_query_urls_from_known_url(known_url, pages_to_search=PAGES_TO_SEA
         urls.append(new_url)
 
     return urls
+
+
+def build_canonical_ikyu_search_query(url):
+    """
+    Build a query string that is the same for all URLs of the same search page:
+    parameters are sorted by name, and comma separated codes are sorted within a parameter.
+    e.g. "...&rtpc=10001,10002&..." and "...&rtpc=10002,10001&..." give the same result.
+    """
+    query_params = parse_qs(urlparse(url).query, keep_blank_values=True)
+    canonical_params = []
+    for name in sorted(query_params.keys()):
+        values = sorted(
+            code
+            for value in query_params[name]
+            for code in value.split(",")
+            if code
+        )
+        canonical_params.append((name, ",".join(values)))
+    return urlencode(canonical_params)
@@ -0,0 +1,199 @@
+"""
+Searches answered from the local restaurant index (cache_utils.restaurant_index) instead of Ikyu.
+
+A search is answered from the index if each of its region × cuisine combinations was indexed
+for its sort option and number of people. Stale combinations and calendars are still used,
+and refreshed in the background; combinations not indexed yet are indexed in the background
+while the search falls back to Ikyu.
+"""
+import concurrent.futures
+import itertools
+import threading
+import time
+from datetime import date
+
+from config import *
+from utils.cache_utils import (
+    convert_food_types_in_japanese_to_code,
+    convert_tokyo_sub_regions_in_japanese_to_location_code,
+    restaurant_index,
+)
+from utils.constants import *
+from utils.ikyu_availability_utils import date_string_to_ordinal
+from utils.ikyu_parse_utils import build_availability_ikyu, get_calendar_summary
+from utils.ikyu_search_utils import add_availability_to_restaurant, search_restaurants_in_tokyo_yield
+
+LIVE_SEARCH_SOURCE = "live"
+INDEX_SEARCH_SOURCE = "index"
+SEARCH_SOURCES = (LIVE_SEARCH_SOURCE, INDEX_SEARCH_SOURCE)
+
+# Refreshes run in the background, one at a time per key
+index_refresh_executor = concurrent.futures.ThreadPoolExecutor(max_workers=RESTAURANT_INDEX_REFRESH_WORKERS)
+_scheduled_refresh_keys = set()
+_scheduled_refresh_keys_lock = threading.Lock()
+
+
+def find_indexed_restaurants(
+        locations,
+        food_types,
+        sort_option,
+        start_date: str,
+        end_date: str,
+        num_people,
+        start_page,
+        start_card,
+        limit,
+        restaurant_filters,
+):
+    """
+    Find the restaurants of a search in the index, in result order, with their availability
+    like search_restaurants_in_tokyo_yield. Restaurants without an available date between the
+    dates are left out by the index if restaurant_filters.has_availability, and then limit and
+    the start position count the other restaurants only.
+    The start position is a position in these results, not on Ikyu, so only a search from the
+    first position falls back to Ikyu; the next results of a search answered from the index
+    are the following indexed ones, until the last.
+    :return: (restaurants, number of restaurants left out, next position like next_position of
+    restaurants_from_search_urls_yield, with its "source"), or None if the search must be done
+    on Ikyu
+    """
+    offset = (start_page - 1) * IKYU_SEARCH_CARDS_PER_PAGE + start_card
+    region_codes = convert_tokyo_sub_regions_in_japanese_to_location_code(locations)
+    cuisine_codes = convert_food_types_in_japanese_to_code(food_types)
+    if not region_codes or not cuisine_codes:
+        return None
+    coverages = restaurant_index.get_coverages(region_codes, cuisine_codes, sort_option, num_people)
+
+    is_covered = True
+    for (region, region_code), (food_type, cuisine_code) in itertools.product(
+        zip(locations, region_codes), zip(food_types, cuisine_codes)
+    ):
+        coverage = coverages.get((region_code, cuisine_code))
+        if coverage is None:
+            is_covered = False
+        if coverage is None or time.time() - coverage[0] > RESTAURANT_INDEX_COVERAGE_STALE_SECONDS:
+            schedule_coverage_refresh(region, food_type, sort_option, num_people)
+    if not is_covered:
+        if offset > 0:
+            print("❌ Search not in the index anymore, ending its results: ", locations, food_types, sort_option)
+            return [], 0, {}
+        print("🗂️ Search not indexed yet, searching on Ikyu: ", locations, food_types, sort_option)
+        return None
+
+    available_between = None
+    if restaurant_filters.has_availability:
+        available_between = (date_string_to_ordinal(start_date), date_string_to_ordinal(end_date))
+    rows = restaurant_index.find_restaurants(region_codes, cuisine_codes, sort_option, num_people, available_between)
+    skipped_count = 0
+    if available_between is not None:
+        skipped_count = restaurant_index.count_restaurants(region_codes, cuisine_codes, sort_option, num_people) - len(rows)
+
+    # The index holds the first PAGES_TO_SEARCH pages of each search, Ikyu has the rest
+    has_more = any(has_more for _, has_more in coverages.values())
+    end = len(rows) if limit is None else offset + limit
+    if has_more and offset == 0 and (not rows or end > len(rows)):
+        return None
+    end = min(end, len(rows))
+    next_position = {} if end >= len(rows) else get_index_search_position(end)
+
+    rows = rows[offset:end]
+    stale_ikyu_ids = [
+        ikyu_id
+        for ikyu_id, _, _, calendar_updated_at in rows
+        if time.time() - calendar_updated_at > RESTAURANT_INDEX_CALENDAR_STALE_SECONDS
+    ]
+    if stale_ikyu_ids:
+        schedule_calendars_refresh(stale_ikyu_ids)
+
+    restaurants = []
+    for _, restaurant_info, calendar_summary, _ in rows:
+        restaurant = dict(restaurant_info)
+        add_availability_to_restaurant(restaurant, build_availability_ikyu(calendar_summary, start_date))
+        restaurants.append(restaurant)
+    return restaurants, skipped_count, next_position
+
+
+def get_index_search_position(index):
+    """
+    :return: the {"source", "page", "card"} of the index-th restaurant of an indexed search, as
+    if the results had full pages
+    """
+    return {
+        "source": INDEX_SEARCH_SOURCE,
+        "page": index // IKYU_SEARCH_CARDS_PER_PAGE + 1,
+        "card": index % IKYU_SEARCH_CARDS_PER_PAGE,
+    }
+
+
+def refresh_index_coverage(region, food_type, sort_option, num_people):
+    """
+    Search one region × cuisine on Ikyu and replace its results in the index.
+    The search fills the calendar cache, so the calendar summaries are read from it.
+    """
+    next_position = {}
+    indexed_restaurants = []
+    for restaurant in search_restaurants_in_tokyo_yield(
+        [region], [food_type], sort_option, date.today().isoformat(), num_people, next_position=next_position
+    ):
+        restaurant_info = {
+            key: value
+            for key, value in restaurant.items()
+            if key not in (AVAILABILITY, LUNCH_PRICE, DINNER_PRICE)
+        }
+        indexed_restaurants.append(
+            (restaurant[IKYU_ID], restaurant_info, get_calendar_summary(restaurant[IKYU_ID]))
+        )
+    region_code, = convert_tokyo_sub_regions_in_japanese_to_location_code([region])
+    cuisine_code, = convert_food_types_in_japanese_to_code([food_type])
+    restaurant_index.replace_coverage(
+        region_code, cuisine_code, sort_option, num_people, indexed_restaurants, has_more=bool(next_position)
+    )
+    print(f"🗂️ Indexed {len(indexed_restaurants)} restaurants of {region} × {food_type} ({sort_option})")
+
+
+def refresh_index_calendars(ikyu_ids):
+    calendar_summaries = []
+    for ikyu_id in ikyu_ids:
+        try:
+            calendar_summaries.append((ikyu_id, get_calendar_summary(ikyu_id)))
+        except Exception as error:
+            print("❌ Error in refreshing indexed calendar: ", ikyu_id, error)
+    restaurant_index.update_calendar_summaries(calendar_summaries)
+
+
+def schedule_coverage_refresh(region, food_type, sort_option, num_people):
+    refresh_key = ("coverage", region, food_type, sort_option, str(num_people))
+    with _scheduled_refresh_keys_lock:
+        if refresh_key in _scheduled_refresh_keys:
+            return
+        _scheduled_refresh_keys.add(refresh_key)
+    index_refresh_executor.submit(
+        run_index_refresh, [refresh_key], refresh_index_coverage, region, food_type, sort_option, num_people
+    )
+
+
+def schedule_calendars_refresh(ikyu_ids):
+    with _scheduled_refresh_keys_lock:
+        ikyu_ids = [ikyu_id for ikyu_id in ikyu_ids if ("calendar", ikyu_id) not in _scheduled_refresh_keys]
+        _scheduled_refresh_keys.update(("calendar", ikyu_id) for ikyu_id in ikyu_ids)
+    for i in range(0, len(ikyu_ids), RESTAURANT_INDEX_CALENDAR_BATCH_SIZE):
+        batch = ikyu_ids[i:i + RESTAURANT_INDEX_CALENDAR_BATCH_SIZE]
+        index_refresh_executor.submit(
+            run_index_refresh, [("calendar", ikyu_id) for ikyu_id in batch], refresh_index_calendars, batch
+        )
+
+
+def run_index_refresh(refresh_keys, refresh, *args):
+    try:
+        refresh(*args)
+    except Exception as error:
+        print("❌ Error in refreshing restaurant index: ", refresh_keys[0], error)
+    finally:
+        with _scheduled_refresh_keys_lock:
+            _scheduled_refresh_keys.difference_update(refresh_keys)
+
+
+def get_restaurant_index_stats():
+    with _scheduled_refresh_keys_lock:
+        scheduled_refreshes = len(_scheduled_refresh_keys)
+    return {**restaurant_index.stats(), "scheduled_refreshes": scheduled_refreshes}
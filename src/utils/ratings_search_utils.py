@@ -1,37 +1,177 @@
+import asyncio
 import concurrent.futures
 
-from utils.tabelog_search_utils import get_tabelog_data
-from utils.google_search_utils import get_google_data
+from utils.tabelog_search_utils import get_tabelog_data, get_tabelog_data_async
+from utils.google_search_utils import get_google_data, get_google_data_async
+from config import GOOGLE_FETCH_WORKERS, TABELOG_FETCH_WORKERS
+from utils.async_network import get_event_loop_semaphore
 from utils.constants import TABELOG_RATING, TABELOG_LINK, GOOGLE_RATING, GOOGLE_LINK
+from utils.tiered_cache import tiered_cache_get_many
+from .cache_utils import get_cache_key_for_google, get_cache_key_for_tabelog
+from .cancellation import cancel_futures
 
+# Marks a source whose data was not found in the cache, as opposed to a cached "not found" (None)
+_NOT_CACHED = object()
 
-def fetch_ratings_and_links_async(restaurant_ids_and_names):
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = {
-            executor.submit(get_ratings_and_links_for_restaurant, ikyu_id, name): (ikyu_id, name)
-                for ikyu_id, name in restaurant_ids_and_names
-        }
-
-        combined_ratings_and_links = {}
-        for future in futures:
-            ikyu_id, restaurant_name = futures[future] # unpack the keys of dict that we passed to the async func
+
+# Shared by all searches, so streams don't create and tear down their own threads.
+# One executor per source, so each source has its own concurrency limit.
+tabelog_executor = concurrent.futures.ThreadPoolExecutor(max_workers=TABELOG_FETCH_WORKERS)
+google_executor = concurrent.futures.ThreadPoolExecutor(max_workers=GOOGLE_FETCH_WORKERS)
+
+
+def submit_ratings_and_links_for_restaurants(restaurant_ids_and_names):
+    """
+    Start looking up the ratings and links of a batch of restaurants.
+    The Redis cache of all of them is read in one round trip first,
+    and only the cache misses are looked up on Tabelog/Google.
+    :param restaurant_ids_and_names: a list of (ikyu_id, restaurant name)
+    :return: a dict of ikyu_id -> future, see submit_ratings_and_links_for_restaurant
+    """
+    ikyu_ids = [ikyu_id for ikyu_id, _ in restaurant_ids_and_names]
+    cached_tabelog_data, cached_google_data = get_cached_ratings_data(ikyu_ids)
+    return {
+        ikyu_id: submit_ratings_and_links_for_restaurant(
+            ikyu_id,
+            restaurant_name,
+            cached_tabelog_data.get(ikyu_id, _NOT_CACHED),
+            cached_google_data.get(ikyu_id, _NOT_CACHED),
+        )
+        for ikyu_id, restaurant_name in restaurant_ids_and_names
+    }
+
+
+def get_cached_ratings_data(ikyu_ids):
+    """
+    Read the cached Tabelog and Google data of restaurants, with a single MGET for
+    the ones not in the local cache.
+    :return: two dicts of ikyu_id -> cached data (None for a cached "not found"), Tabelog then Google.
+    Restaurants that are not cached are left out.
+    """
+    if not ikyu_ids:
+        return {}, {}
+    tabelog_cache_keys = {ikyu_id: get_cache_key_for_tabelog(ikyu_id) for ikyu_id in ikyu_ids}
+    google_cache_keys = {ikyu_id: get_cache_key_for_google(ikyu_id) for ikyu_id in ikyu_ids}
+    cached_values = tiered_cache_get_many(
+        list(tabelog_cache_keys.values()) + list(google_cache_keys.values())
+    )
+    cached_tabelog_data = {
+        ikyu_id: cached_values[cache_key]
+        for ikyu_id, cache_key in tabelog_cache_keys.items()
+        if cache_key in cached_values
+    }
+    cached_google_data = {
+        ikyu_id: cached_values[cache_key]
+        for ikyu_id, cache_key in google_cache_keys.items()
+        if cache_key in cached_values
+    }
+    return cached_tabelog_data, cached_google_data
+
+
+def submit_ratings_and_links_for_restaurant(
+    ikyu_id, restaurant_name, cached_tabelog_data=_NOT_CACHED, cached_google_data=_NOT_CACHED
+):
+    """
+    Start looking up the Tabelog and Google ratings and links of one restaurant.
+    Both sources are looked up at the same time.
+    :param cached_tabelog_data: the Tabelog data if already read from the cache
+    :param cached_google_data: the Google data if already read from the cache
+    :return: a future resolving to the ratings and links; it never fails, lookup errors give None values.
+    Cancelling it cancels the lookups that haven't started yet.
+    """
+    source_futures = [
+        submit_source_data_lookup(
+            tabelog_executor, get_tabelog_data, "Tabelog", ikyu_id, restaurant_name, cached_tabelog_data
+        ),
+        submit_source_data_lookup(
+            google_executor, get_google_data, "Google", ikyu_id, restaurant_name, cached_google_data
+        ),
+    ]
+    ratings_future = concurrent.futures.Future()
+
+    def on_source_done(_):
+        if all(source_future.done() for source_future in source_futures):
+            tabelog_future, google_future = source_futures
+            if tabelog_future.cancelled() or google_future.cancelled():
+                ratings_future.cancel()
+                return
             try:
-                # Emit the response from the async future
-                combined_ratings_and_links[ikyu_id] = future.result()
-            except Exception as e:
-                print(f"Error fetching ratings for {ikyu_id} - {restaurant_name}: {e}")
-                combined_ratings_and_links[ikyu_id] = {
-                    TABELOG_RATING: None,
-                    TABELOG_LINK: None,
-                    GOOGLE_RATING: None,
-                    GOOGLE_LINK: None
-                }
+                ratings_future.set_result(
+                    build_ratings_and_links(tabelog_future.result(), google_future.result())
+                )
+            except concurrent.futures.InvalidStateError:
+                # Both sources finished at the same time, or the caller cancelled
+                pass
+
+    def on_ratings_done(_):
+        if ratings_future.cancelled():
+            tabelog_future, google_future = source_futures
+            cancel_futures([tabelog_future], "tabelog_lookups")
+            cancel_futures([google_future], "google_lookups")
+
+    ratings_future.add_done_callback(on_ratings_done)
+    for source_future in source_futures:
+        source_future.add_done_callback(on_source_done)
+    return ratings_future
+
+
+def submit_source_data_lookup(executor, get_source_data, source_name, ikyu_id, restaurant_name, cached_data):
+    if cached_data is not _NOT_CACHED:
+        future = concurrent.futures.Future()
+        future.set_result(cached_data)
+        return future
+    return executor.submit(
+        get_source_data_or_none, get_source_data, source_name, ikyu_id, restaurant_name
+    )
+
+
+def get_source_data_or_none(get_source_data, source_name, ikyu_id, restaurant_name):
+    try:
+        return get_source_data(ikyu_id, restaurant_name)
+    except Exception as e:
+        print(f"Error fetching {source_name} rating for {ikyu_id} - {restaurant_name}: {e}")
+        return None
+
+
+def fetch_ratings_and_links_async(restaurant_ids_and_names):
+    futures = submit_ratings_and_links_for_restaurants(restaurant_ids_and_names)
+
+    combined_ratings_and_links = {}
+    for ikyu_id, future in futures.items():
+        combined_ratings_and_links[ikyu_id] = future.result()
     return combined_ratings_and_links
 
 
 def get_ratings_and_links_for_restaurant(ikyu_id, restaurant_name):
+    return submit_ratings_and_links_for_restaurant(ikyu_id, restaurant_name).result()
+
+
+async def get_ratings_and_links_for_restaurant_async(ikyu_id, restaurant_name):
+    """
+    Look up Tabelog and Google for one restaurant at the same time.
+    A failure of one source leaves only that source's fields empty.
+    """
+    tabelog_data, google_data = await asyncio.gather(
+        get_source_data_bounded_async(get_tabelog_data_async, "tabelog", TABELOG_FETCH_WORKERS, ikyu_id, restaurant_name),
+        get_source_data_bounded_async(get_google_data_async, "google", GOOGLE_FETCH_WORKERS, ikyu_id, restaurant_name),
+        return_exceptions=True,
+    )
+    if isinstance(tabelog_data, Exception):
+        print(f"Error fetching Tabelog rating for {ikyu_id} - {restaurant_name}: {tabelog_data}")
+        tabelog_data = None
+    if isinstance(google_data, Exception):
+        print(f"Error fetching Google rating for {ikyu_id} - {restaurant_name}: {google_data}")
+        google_data = None
+    return build_ratings_and_links(tabelog_data, google_data)
+
+
+async def get_source_data_bounded_async(get_source_data_async, source_name, max_concurrency, ikyu_id, restaurant_name):
+    async with get_event_loop_semaphore(source_name, max_concurrency):
+        return await get_source_data_async(ikyu_id, restaurant_name)
+
+
+def build_ratings_and_links(tabelog_data, google_data):
     result = {}
-    tabelog_data = get_tabelog_data(ikyu_id, restaurant_name)
     if tabelog_data:
         rating, link = tabelog_data
         result[TABELOG_RATING] = rating
@@ -40,7 +180,6 @@ def get_ratings_and_links_for_restaurant(ikyu_id, restaurant_name):
         result[TABELOG_RATING] = None
         result[TABELOG_LINK] = None
 
-    google_data = get_google_data(ikyu_id, restaurant_name)
     if google_data:
         google_rating, google_link = google_data
         result[GOOGLE_RATING] = google_rating
@@ -0,0 +1,130 @@
+"""
+Filters of the restaurant search stream on what the Ikyu calendar tells: availability in
+the searched dates, meal, price and hard to reserve. They run right after the calendar is
+fetched, so a restaurant filtered out never costs a Tabelog or Google lookup.
+"""
+from utils.constants import *
+
+MEAL_TYPES = (LUNCH, DINNER)
+
+
+class RestaurantFilters:
+    """
+    The filters of one search, all optional; without meal filters (has_availability, meal_type
+    or a max price) a restaurant matches whatever its calendar, even fully booked. Otherwise
+    a restaurant matches if one of its meals matches; the meals considered are meal_type if
+    given, else the meals with a max price if any, else both. A meal matches if the
+    restaurant has it, with an available date between the searched dates if has_availability,
+    and a best price in these dates of at most its max price if any.
+    """
+
+    __slots__ = ("has_availability", "meal_type", "max_prices", "hard_to_reserve")
+
+    def __init__(self, has_availability=False, meal_type=None, max_lunch_price=None, max_dinner_price=None,
+                 hard_to_reserve=None):
+        self.has_availability = has_availability
+        self.meal_type = meal_type
+        self.max_prices = {
+            meal: max_price
+            for meal, max_price in [(LUNCH, max_lunch_price), (DINNER, max_dinner_price)]
+            if max_price is not None
+        }
+        # True or False to keep only restaurants hard to reserve or not, None for both
+        self.hard_to_reserve = hard_to_reserve
+
+    def to_key(self):
+        """
+        :return: a JSON serializable value, the same for the same filters
+        """
+        return [
+            self.has_availability,
+            self.meal_type,
+            self.max_prices.get(LUNCH),
+            self.max_prices.get(DINNER),
+            self.hard_to_reserve,
+        ]
+
+    def has_meal_filters(self):
+        return self.has_availability or self.meal_type is not None or bool(self.max_prices)
+
+    def get_meals_to_match(self):
+        if self.meal_type is not None:
+            return [self.meal_type]
+        return list(self.max_prices) or list(MEAL_TYPES)
+
+    def matches(self, restaurant, start_date: str, end_date: str):
+        """
+        :param restaurant: a restaurant with its AVAILABILITY, see add_availability_to_restaurant
+        """
+        availability = restaurant[AVAILABILITY]
+        if self.hard_to_reserve is not None and availability[HARD_TO_RESERVE] != self.hard_to_reserve:
+            return False
+        if not self.has_meal_filters():
+            return True
+        return any(
+            self.meal_matches(meal, availability.get(meal), start_date, end_date)
+            for meal in self.get_meals_to_match()
+        )
+
+    def meal_matches(self, meal, meal_availability, start_date: str, end_date: str):
+        """
+        :param meal_availability: the MealAvailability of meal, or None if the restaurant has none
+        """
+        if not meal_availability:
+            return False
+        if self.has_availability and not meal_availability.filter_range(start_date, end_date):
+            return False
+        if meal in self.max_prices:
+            min_price = meal_availability.min_price(start_date, end_date)
+            return min_price is not None and min_price <= self.max_prices[meal]
+        return True
+
+
+def parse_restaurant_filters_from_args(args):
+    """
+    :param args: the query parameters of the request: hasAvailability, mealType,
+    maxLunchPrice, maxDinnerPrice and hardToReserve
+    :return: the RestaurantFilters
+    :raise ValueError: with a message for the client if a filter is invalid
+    """
+    meal_type = args.get('mealType') or None
+    if meal_type is not None and meal_type not in MEAL_TYPES:
+        raise ValueError(f"Invalid mealType. Expected one of: {', '.join(MEAL_TYPES)}.")
+
+    return RestaurantFilters(
+        has_availability=parse_bool_arg(args, 'hasAvailability') or False,
+        meal_type=meal_type,
+        max_lunch_price=parse_price_arg(args, 'maxLunchPrice'),
+        max_dinner_price=parse_price_arg(args, 'maxDinnerPrice'),
+        hard_to_reserve=parse_bool_arg(args, 'hardToReserve'),
+    )
+
+
+def parse_bool_arg(args, name):
+    """
+    :return: True or False, or None if the parameter is missing
+    """
+    value = args.get(name)
+    if not value:
+        return None
+    if value.lower() in ("true", "1"):
+        return True
+    if value.lower() in ("false", "0"):
+        return False
+    raise ValueError(f"Invalid {name}. Expected true or false.")
+
+
+def parse_price_arg(args, name):
+    """
+    :return: the price in yen, or None if the parameter is missing
+    """
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        price = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}. Expected a price in yen.")
+    if price < 0:
+        raise ValueError(f"Invalid {name}. Expected a price in yen.")
+    return price
@@ -0,0 +1,244 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils.constants import *
+from utils.ikyu_availability_utils import MealAvailability
+
+
+class RestaurantIndex:
+    """
+    Local index of the restaurants found by Ikyu searches, with their latest calendar summary,
+    backed by SQLite in WAL mode.
+    A coverage is one region × cuisine × sort option × number of people search that was indexed,
+    with the rank of each restaurant in its results. Restaurants are looked up by sub-region
+    and cuisine code through the placements table, and by available date through the
+    available dates table, so queries don't scan the whole index.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._is_initialized = False
+
+    def _get_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        with self._lock:
+            if not self._is_initialized:
+                self._is_initialized = True
+                self._create_tables(connection)
+        return connection
+
+    @staticmethod
+    def _create_tables(connection):
+        with connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS restaurants (
+                    ikyu_id TEXT PRIMARY KEY,
+                    info TEXT NOT NULL,
+                    calendar_summary TEXT NOT NULL,
+                    calendar_updated_at REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS coverages (
+                    region_code TEXT NOT NULL,
+                    cuisine_code TEXT NOT NULL,
+                    sort_option TEXT NOT NULL,
+                    num_people TEXT NOT NULL,
+                    refreshed_at REAL NOT NULL,
+                    has_more INTEGER NOT NULL,
+                    PRIMARY KEY (region_code, cuisine_code, sort_option, num_people)
+                )
+                """
+            )
+            # The primary key doubles as the sub-region index
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS placements (
+                    region_code TEXT NOT NULL,
+                    cuisine_code TEXT NOT NULL,
+                    sort_option TEXT NOT NULL,
+                    num_people TEXT NOT NULL,
+                    rank INTEGER NOT NULL,
+                    ikyu_id TEXT NOT NULL,
+                    PRIMARY KEY (region_code, cuisine_code, sort_option, num_people, rank)
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS placements_cuisine_code "
+                "ON placements (cuisine_code, sort_option, num_people)"
+            )
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS available_dates (
+                    ikyu_id TEXT NOT NULL,
+                    meal TEXT NOT NULL,
+                    day_ordinal INTEGER NOT NULL,
+                    PRIMARY KEY (ikyu_id, meal, day_ordinal)
+                ) WITHOUT ROWID
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS available_dates_day_ordinal "
+                "ON available_dates (day_ordinal, ikyu_id)"
+            )
+
+    @staticmethod
+    def _write_calendar_summaries(connection, calendar_summaries, now):
+        """
+        :param calendar_summaries: a list of (ikyu_id, calendar summary), see build_calendar_summary
+        """
+        connection.executemany(
+            "UPDATE restaurants SET calendar_summary = ?, calendar_updated_at = ? WHERE ikyu_id = ?",
+            [
+                (json.dumps(calendar_summary, ensure_ascii=False), now, ikyu_id)
+                for ikyu_id, calendar_summary in calendar_summaries
+            ],
+        )
+        connection.executemany(
+            "DELETE FROM available_dates WHERE ikyu_id = ?",
+            [(ikyu_id,) for ikyu_id, _ in calendar_summaries],
+        )
+        connection.executemany(
+            "INSERT INTO available_dates (ikyu_id, meal, day_ordinal) VALUES (?, ?, ?)",
+            [
+                (ikyu_id, meal, day_ordinal)
+                for ikyu_id, calendar_summary in calendar_summaries
+                for meal, meal_availability in calendar_summary[AVAILABILITY].items()
+                for day_ordinal in MealAvailability.from_json(meal_availability).day_ordinals
+            ],
+        )
+
+    def replace_coverage(self, region_code, cuisine_code, sort_option, num_people, restaurants, has_more):
+        """
+        Replace the indexed results of a search, in one transaction.
+        :param restaurants: a list of (ikyu_id, restaurant info, calendar summary), in result order
+        :param has_more: whether the search has more results than the ones indexed
+        """
+        now = time.time()
+        coverage_key = (region_code, cuisine_code, sort_option, str(num_people))
+        connection = self._get_connection()
+        with connection:
+            connection.executemany(
+                "INSERT INTO restaurants (ikyu_id, info, calendar_summary, calendar_updated_at) "
+                "VALUES (?, ?, '', 0) ON CONFLICT (ikyu_id) DO UPDATE SET info = excluded.info",
+                [
+                    (ikyu_id, json.dumps(restaurant_info, ensure_ascii=False))
+                    for ikyu_id, restaurant_info, _ in restaurants
+                ],
+            )
+            self._write_calendar_summaries(
+                connection, [(ikyu_id, calendar_summary) for ikyu_id, _, calendar_summary in restaurants], now
+            )
+            connection.execute(
+                "DELETE FROM placements "
+                "WHERE region_code = ? AND cuisine_code = ? AND sort_option = ? AND num_people = ?",
+                coverage_key,
+            )
+            connection.executemany(
+                "INSERT INTO placements (region_code, cuisine_code, sort_option, num_people, rank, ikyu_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(*coverage_key, rank, ikyu_id) for rank, (ikyu_id, _, _) in enumerate(restaurants)],
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO coverages "
+                "(region_code, cuisine_code, sort_option, num_people, refreshed_at, has_more) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (*coverage_key, now, int(has_more)),
+            )
+
+    def update_calendar_summaries(self, calendar_summaries):
+        """
+        :param calendar_summaries: a list of (ikyu_id, calendar summary) of indexed restaurants
+        """
+        connection = self._get_connection()
+        with connection:
+            self._write_calendar_summaries(connection, calendar_summaries, time.time())
+
+    def get_coverages(self, region_codes, cuisine_codes, sort_option, num_people):
+        """
+        :return: a dict of (region_code, cuisine_code) -> (refreshed_at, has_more), for the
+        indexed combinations of the codes only
+        """
+        condition, parameters = self._get_search_condition(region_codes, cuisine_codes, sort_option, num_people)
+        rows = self._get_connection().execute(
+            f"SELECT region_code, cuisine_code, refreshed_at, has_more FROM coverages WHERE {condition}",
+            parameters,
+        )
+        return {
+            (region_code, cuisine_code): (refreshed_at, bool(has_more))
+            for region_code, cuisine_code, refreshed_at, has_more in rows
+        }
+
+    def count_restaurants(self, region_codes, cuisine_codes, sort_option, num_people):
+        condition, parameters = self._get_search_condition(region_codes, cuisine_codes, sort_option, num_people)
+        restaurant_count, = self._get_connection().execute(
+            f"SELECT COUNT(DISTINCT ikyu_id) FROM placements WHERE {condition}",
+            parameters,
+        ).fetchone()
+        return restaurant_count
+
+    def find_restaurants(self, region_codes, cuisine_codes, sort_option, num_people, available_between=None):
+        """
+        :param available_between: (first, last) day ordinals to keep only the restaurants with an
+        available date between them, or None for all
+        :return: a list of (ikyu_id, restaurant info, calendar summary, calendar updated at),
+        best ranked first across the combinations of the codes
+        """
+        condition, parameters = self._get_search_condition(region_codes, cuisine_codes, sort_option, num_people)
+        if available_between is not None:
+            condition += (
+                " AND placements.ikyu_id IN "
+                "(SELECT ikyu_id FROM available_dates WHERE day_ordinal BETWEEN ? AND ?)"
+            )
+            parameters = (*parameters, *available_between)
+        rows = self._get_connection().execute(
+            f"SELECT restaurants.ikyu_id, info, calendar_summary, calendar_updated_at, MIN(rank) AS best_rank "
+            f"FROM placements JOIN restaurants ON restaurants.ikyu_id = placements.ikyu_id "
+            f"WHERE {condition} "
+            f"GROUP BY restaurants.ikyu_id ORDER BY best_rank, restaurants.ikyu_id",
+            parameters,
+        )
+        return [
+            (ikyu_id, json.loads(info), json.loads(calendar_summary), calendar_updated_at)
+            for ikyu_id, info, calendar_summary, calendar_updated_at, _ in rows
+        ]
+
+    @staticmethod
+    def _get_search_condition(region_codes, cuisine_codes, sort_option, num_people):
+        """
+        :return: (the WHERE condition on coverages or placements of all combinations of the codes,
+        its parameters)
+        """
+        condition = (
+            f"region_code IN ({','.join('?' * len(region_codes))}) "
+            f"AND cuisine_code IN ({','.join('?' * len(cuisine_codes))}) "
+            f"AND sort_option = ? AND num_people = ?"
+        )
+        return condition, (*region_codes, *cuisine_codes, sort_option, str(num_people))
+
+    def stats(self):
+        connection = self._get_connection()
+        restaurant_count, = connection.execute("SELECT COUNT(*) FROM restaurants").fetchone()
+        coverage_count, oldest_refresh = connection.execute(
+            "SELECT COUNT(*), MIN(refreshed_at) FROM coverages"
+        ).fetchone()
+        return {
+            "restaurants": restaurant_count,
+            "coverages": coverage_count,
+            "oldest_coverage_age_seconds": None if oldest_refresh is None else time.time() - oldest_refresh,
+        }
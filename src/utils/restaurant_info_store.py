@@ -0,0 +1,192 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from utils.constants import *
+from utils.file_utils import read_json_from_file
+
+# SQLite's default limit of host parameters in one statement
+_MAX_SQL_PARAMETERS = 999
+
+
+class RestaurantInfoStore:
+    """
+    Restaurant info cache keyed by ikyu id, backed by SQLite in WAL mode.
+    Lookups use the primary key index, so they don't get slower as the cache grows.
+    Writes are buffered and flushed in one transaction per batch, once batch_size are pending
+    or flush_interval_seconds after the first one. They stay readable until committed.
+    """
+
+    def __init__(
+        self,
+        db_path,
+        ttl_seconds,
+        batch_size=50,
+        flush_interval_seconds=5,
+        legacy_json_path=None,
+    ):
+        """
+        :param db_path: the SQLite database file
+        :param ttl_seconds: default time to live of an entry
+        :param batch_size: flush buffered writes once this many are pending
+        :param flush_interval_seconds: flush buffered writes at most this long after they're made
+        :param legacy_json_path: the whole-file JSON cache to import on first use, if it exists
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.legacy_json_path = legacy_json_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending_writes = {}
+        # Writes taken from _pending_writes by the running flush, until its transaction commits
+        self._flushing_writes = {}
+        # One flush at a time, so there is only one batch of flushing writes
+        self._flush_lock = threading.Lock()
+        self._flush_timer = None
+        self._is_initialized = False
+        atexit.register(self.flush)
+
+    def _get_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        with self._lock:
+            if not self._is_initialized:
+                self._is_initialized = True
+                self._create_tables(connection)
+                self._migrate_from_legacy_json(connection)
+        return connection
+
+    @staticmethod
+    def _create_tables(connection):
+        with connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS restaurant_info (
+                    ikyu_id TEXT PRIMARY KEY,
+                    info TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS restaurant_info_expires_at "
+                "ON restaurant_info (expires_at)"
+            )
+
+    def _migrate_from_legacy_json(self, connection):
+        """
+        Import the old restaurant_info_cache.json once, keeping each entry's remaining TTL,
+        then rename the file so it's not imported again.
+        """
+        if not self.legacy_json_path or not os.path.exists(self.legacy_json_path):
+            return
+        legacy_cache = read_json_from_file(self.legacy_json_path)
+        rows = []
+        for ikyu_id, restaurant_info in legacy_cache.items():
+            if LAST_UPDATE_TIME not in restaurant_info:
+                continue
+            last_update_time = datetime.strptime(
+                restaurant_info[LAST_UPDATE_TIME], "%Y-%m-%d %H:%M:%S"
+            ).timestamp()
+            rows.append(
+                (ikyu_id, json.dumps(restaurant_info, ensure_ascii=False), last_update_time + self.ttl_seconds)
+            )
+        with connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO restaurant_info (ikyu_id, info, expires_at) VALUES (?, ?, ?)",
+                rows,
+            )
+        os.replace(self.legacy_json_path, self.legacy_json_path + ".migrated")
+        print(f"Migrated {len(rows)} restaurants from {self.legacy_json_path} to {self.db_path}")
+
+    def get(self, ikyu_id):
+        return self.get_many([ikyu_id]).get(ikyu_id, {})
+
+    def get_many(self, ikyu_ids):
+        """
+        :param ikyu_ids: the ikyu ids to look up
+        :return: a dict of ikyu_id -> restaurant info, only for ids with an unexpired entry
+        """
+        ikyu_ids = list(ikyu_ids)
+        now = time.time()
+        results = {}
+        with self._lock:
+            for ikyu_id in ikyu_ids:
+                pending_write = self._pending_writes.get(ikyu_id) or self._flushing_writes.get(ikyu_id)
+                if pending_write and pending_write[1] > now:
+                    results[ikyu_id] = json.loads(pending_write[0])
+        remaining_ikyu_ids = [ikyu_id for ikyu_id in ikyu_ids if ikyu_id not in results]
+
+        connection = self._get_connection()
+        chunk_size = _MAX_SQL_PARAMETERS - 1
+        for i in range(0, len(remaining_ikyu_ids), chunk_size):
+            chunk = remaining_ikyu_ids[i:i + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            rows = connection.execute(
+                f"SELECT ikyu_id, info FROM restaurant_info "
+                f"WHERE ikyu_id IN ({placeholders}) AND expires_at > ?",
+                (*chunk, now),
+            )
+            for ikyu_id, info in rows:
+                results[ikyu_id] = json.loads(info)
+        return results
+
+    def put(self, ikyu_id, restaurant_info, ttl_seconds=None):
+        """
+        Buffer a write. It's visible to get/get_many right away, and written to disk
+        with the next batch.
+        """
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._pending_writes[ikyu_id] = (
+                json.dumps(restaurant_info, ensure_ascii=False),
+                time.time() + ttl_seconds,
+            )
+            should_flush = len(self._pending_writes) >= self.batch_size
+            if not should_flush and self._flush_timer is None:
+                # Flush a quiet process's writes too, not only on the next put
+                self._flush_timer = threading.Timer(self.flush_interval_seconds, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                self._flushing_writes = self._pending_writes
+                self._pending_writes = {}
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+            if not self._flushing_writes:
+                return
+            try:
+                connection = self._get_connection()
+                with connection:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO restaurant_info (ikyu_id, info, expires_at) VALUES (?, ?, ?)",
+                        [
+                            (ikyu_id, info, expires_at)
+                            for ikyu_id, (info, expires_at) in self._flushing_writes.items()
+                        ],
+                    )
+            finally:
+                with self._lock:
+                    self._flushing_writes = {}
+
+    def delete_expired(self):
+        connection = self._get_connection()
+        with connection:
+            connection.execute("DELETE FROM restaurant_info WHERE expires_at <= ?", (time.time(),))
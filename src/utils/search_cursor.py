@@ -0,0 +1,43 @@
+"""
+Opaque cursors of the restaurant search stream: the search position to resume from.
+Clients get one in the "cursor" event of a stream and pass it back as the cursor parameter.
+A position is an Ikyu search position, or a position in the results of the restaurant index
+for source=index; the cursor says which, since one is no position in the other.
+"""
+import base64
+import binascii
+import json
+
+from utils.constants import UTF_8_ENCODING
+from utils.index_search_utils import LIVE_SEARCH_SOURCE, SEARCH_SOURCES
+
+FIRST_SEARCH_POSITION = {"page": 1, "card": 0}
+
+
+def encode_search_cursor(position):
+    """
+    :param position: {"page", "card"}, see ikyu_search_utils.get_next_search_position, with the
+    "source" of the results it's a position in if not LIVE_SEARCH_SOURCE
+    :return: a URL safe string
+    """
+    data = json.dumps(
+        [position.get("source", LIVE_SEARCH_SOURCE), position["page"], position["card"]], separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(data.encode(UTF_8_ENCODING)).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor):
+    """
+    :return: the {"source", "page", "card"} position encoded in cursor
+    :raise ValueError: if cursor was not made by encode_search_cursor
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        # Cursors made before they had a source are Ikyu positions
+        source, page, card = [LIVE_SEARCH_SOURCE, *data] if len(data) == 2 else data
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+    if source not in SEARCH_SOURCES or type(page) is not int or type(card) is not int or page < 1 or card < 0:
+        raise ValueError("Invalid cursor.")
+    return {"source": source, "page": page, "card": card}
@@ -0,0 +1,77 @@
+"""
+How often each region × cuisine × sort option is searched, and when its caches were last
+filled, so the cache warming job (warm_cache.py) refreshes the searches that matter first.
+
+Both are Redis sorted sets whose members are the JSON of [region, cuisine, sort option],
+with the Japanese names of tokyo_region_code_mapping.json and category_code_mapping.json.
+"""
+import json
+import time
+
+from config import *
+from utils.redis_client import redis_client
+
+SEARCH_POPULARITY_KEY = "search_popularity:v1"
+SEARCH_LAST_FILLED_KEY = "search_last_filled:v1"
+
+
+def get_search_combination_member(region, food_type, sort_option):
+    return json.dumps([region, food_type, sort_option], ensure_ascii=False)
+
+
+def record_search(locations, food_types, sort_option):
+    """
+    Count a search in the popularity of each of its region × cuisine combinations.
+    Never raises, a search must not fail because of it.
+    """
+    members = [
+        get_search_combination_member(region, food_type, sort_option)
+        for region in locations
+        for food_type in food_types
+    ]
+    if not members:
+        return
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        for member in members:
+            pipeline.zincrby(SEARCH_POPULARITY_KEY, 1, member)
+        pipeline.execute()
+    except Exception as error:
+        print("❌ Error in recording search popularity: ", error)
+
+
+def mark_search_filled(region, food_type, sort_option):
+    """
+    Mark the caches of a combination as just filled, once a search of it completed.
+    Never raises, like record_search.
+    """
+    try:
+        redis_client.zadd(
+            SEARCH_LAST_FILLED_KEY, {get_search_combination_member(region, food_type, sort_option): time.time()}
+        )
+    except Exception as error:
+        print("❌ Error in marking search filled: ", error)
+
+
+def get_search_popularity_and_last_filled(combinations):
+    """
+    :param combinations: a list of (region, food type, sort option)
+    :return: a list of (popularity, last filled timestamp or None), in the order of combinations
+    """
+    members = [get_search_combination_member(*combination) for combination in combinations]
+    if not members:
+        return []
+    # One round trip for all of them
+    pipeline = redis_client.pipeline(transaction=False)
+    for member in members:
+        pipeline.zscore(SEARCH_POPULARITY_KEY, member)
+        pipeline.zscore(SEARCH_LAST_FILLED_KEY, member)
+    scores = pipeline.execute()
+    return [(popularity or 0, last_filled_time) for popularity, last_filled_time in zip(scores[::2], scores[1::2])]
+
+
+def decay_search_popularity():
+    """
+    Scale all popularities by SEARCH_POPULARITY_DECAY, so recent searches weigh the most.
+    """
+    redis_client.zunionstore(SEARCH_POPULARITY_KEY, {SEARCH_POPULARITY_KEY: SEARCH_POPULARITY_DECAY})
@@ -0,0 +1,263 @@
+"""
+Share the events of one restaurant search between all requests for the same query.
+
+The events of a search run once, on a background thread, and are recorded in order.
+Every request for the query reads the recorded events from the start, then follows new
+ones until the search ends, so a request arriving mid-search catches up and attaches to it.
+A completed search is kept in the cache for SEARCH_STREAM_CACHE_TTL_SECONDS, and requests
+within that window replay it without searching again.
+A search is cancelled as soon as the last request following it goes away, e.g. because
+the client closed the stream, and it's not recorded then.
+The async hub does the same for searches running on the event loop of an ASGI worker.
+Both record under the same keys, so one replays what the other recorded.
+"""
+import asyncio
+import threading
+
+from config import *
+from utils.cancellation import CancellationToken, record_cancelled_work
+from utils.tiered_cache import (
+    CACHE_MISS,
+    tiered_cache_get,
+    tiered_cache_get_async,
+    tiered_cache_set,
+    tiered_cache_set_async,
+)
+
+
+class LiveSearchStream:
+    """
+    The events of one running search, readable by any number of subscribers.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.is_done = False
+        self.subscriber_count = 0
+        # Set once the last subscriber leaves before the search is done
+        self.cancellation_token = CancellationToken()
+        self._condition = threading.Condition()
+
+    def publish(self, event):
+        with self._condition:
+            self.events.append(event)
+            self._condition.notify_all()
+
+    def finish(self):
+        with self._condition:
+            self.is_done = True
+            self._condition.notify_all()
+
+    def subscribe(self):
+        """
+        Yield every event published so far, then each new one, until the stream is finished.
+        """
+        with self._condition:
+            self.subscriber_count += 1
+        try:
+            index = 0
+            while True:
+                with self._condition:
+                    while index >= len(self.events) and not self.is_done:
+                        self._condition.wait()
+                    new_events = self.events[index:]
+                    is_done = self.is_done
+                yield from new_events
+                index += len(new_events)
+                if is_done and index >= len(self.events):
+                    return
+        finally:
+            with self._condition:
+                self.subscriber_count -= 1
+                is_abandoned = self.subscriber_count == 0 and not self.is_done
+            if is_abandoned:
+                self.cancellation_token.cancel()
+
+
+class SearchStreamHub:
+    """
+    Runs each search once per query key at a time, see the module docstring.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._live_streams = {}
+
+    def subscribe(self, cache_key, create_events):
+        """
+        :param cache_key: the canonical key of the query
+        :param create_events: called with a CancellationToken to start the search if it's neither
+        running nor cached; returns an iterator of JSON serializable events, which raises if the
+        search is incomplete, and stops early once the token is cancelled
+        :return: an iterator of the events of the query; close it when leaving early
+        """
+        live_stream = self.get_live_stream(cache_key)
+        if live_stream is None and SEARCH_STREAM_REPLAY_ENABLED:
+            recorded_events = tiered_cache_get(cache_key)
+            if recorded_events is not CACHE_MISS:
+                yield from recorded_events
+                return
+
+        if live_stream is None:
+            with self._lock:
+                # Another request may have started the same search meanwhile
+                live_stream = self.get_live_stream(cache_key)
+                if live_stream is None:
+                    live_stream = LiveSearchStream()
+                    self._live_streams[cache_key] = live_stream
+                    threading.Thread(
+                        target=self.run_search, args=(cache_key, live_stream, create_events), daemon=True
+                    ).start()
+        yield from live_stream.subscribe()
+
+    def get_live_stream(self, cache_key):
+        """
+        :return: the running search of cache_key, or None. A cancelled search may still be
+        winding down; it's never joined, since it won't finish.
+        """
+        live_stream = self._live_streams.get(cache_key)
+        if live_stream is None or live_stream.cancellation_token.is_cancelled:
+            return None
+        return live_stream
+
+    def run_search(self, cache_key, live_stream, create_events):
+        is_complete = False
+        events = create_events(live_stream.cancellation_token)
+        try:
+            for event in events:
+                live_stream.publish(event)
+            is_complete = not live_stream.cancellation_token.is_cancelled
+        except Exception as error:
+            print("❌ Error in search stream, not recorded for replay: ", cache_key, error)
+        finally:
+            events.close()
+            if live_stream.cancellation_token.is_cancelled:
+                print("🛑 Search stream cancelled, no client left: ", cache_key)
+                record_cancelled_work("searches")
+            elif is_complete and SEARCH_STREAM_REPLAY_ENABLED:
+                try:
+                    tiered_cache_set(cache_key, live_stream.events, SEARCH_STREAM_CACHE_TTL_SECONDS)
+                except Exception as error:
+                    print("❌ Error in recording search stream: ", cache_key, error)
+            # Drop the live stream only once it's recorded, so no request in between searches again
+            with self._lock:
+                if self._live_streams.get(cache_key) is live_stream:
+                    del self._live_streams[cache_key]
+            live_stream.finish()
+
+
+class AsyncLiveSearchStream:
+    """
+    Async equivalent of LiveSearchStream, for subscribers on one event loop.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.is_done = False
+        self.subscriber_count = 0
+        self.search_task = None
+        self.is_cancelled = False
+        # Replaced after each change, so a subscriber waits for the next change only
+        self._changed = asyncio.Event()
+
+    def publish(self, event):
+        self.events.append(event)
+        self.notify_changed()
+
+    def finish(self):
+        self.is_done = True
+        self.notify_changed()
+
+    def notify_changed(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self):
+        self.subscriber_count += 1
+        try:
+            index = 0
+            while True:
+                while index < len(self.events):
+                    yield self.events[index]
+                    index += 1
+                if self.is_done:
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscriber_count -= 1
+            if self.subscriber_count == 0 and not self.is_done:
+                # Nobody is left to read the rest of the search
+                self.is_cancelled = True
+                self.search_task.cancel()
+
+
+class AsyncSearchStreamHub:
+    """
+    Async equivalent of SearchStreamHub. Searches are shared per event loop, i.e. per ASGI worker.
+    """
+
+    def __init__(self):
+        self._live_streams = {}
+        # Keep running searches referenced, the event loop only keeps weak references to tasks
+        self._search_tasks = set()
+
+    async def subscribe(self, cache_key, create_events):
+        """
+        :param create_events: returns an async iterator of events, see SearchStreamHub.subscribe.
+        The search is cancelled as an asyncio task, so it takes no token.
+        """
+        live_stream = self.get_live_stream(cache_key)
+        if live_stream is None and SEARCH_STREAM_REPLAY_ENABLED:
+            recorded_events = await tiered_cache_get_async(cache_key)
+            if recorded_events is not CACHE_MISS:
+                for event in recorded_events:
+                    yield event
+                return
+
+        # Another request may have started the same search while we read the cache
+        live_stream = self.get_live_stream(cache_key)
+        if live_stream is None:
+            live_stream = AsyncLiveSearchStream()
+            self._live_streams[cache_key] = live_stream
+            live_stream.search_task = asyncio.ensure_future(self.run_search(cache_key, live_stream, create_events))
+            self._search_tasks.add(live_stream.search_task)
+            live_stream.search_task.add_done_callback(self._search_tasks.discard)
+
+        events = live_stream.subscribe()
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+
+    def get_live_stream(self, cache_key):
+        live_stream = self._live_streams.get(cache_key)
+        if live_stream is None or live_stream.is_cancelled:
+            return None
+        return live_stream
+
+    async def run_search(self, cache_key, live_stream, create_events):
+        is_complete = False
+        try:
+            async for event in create_events():
+                live_stream.publish(event)
+            is_complete = True
+        except asyncio.CancelledError:
+            print("🛑 Search stream cancelled, no client left: ", cache_key)
+            record_cancelled_work("searches")
+            raise
+        except Exception as error:
+            print("❌ Error in search stream, not recorded for replay: ", cache_key, error)
+        finally:
+            if is_complete and SEARCH_STREAM_REPLAY_ENABLED:
+                try:
+                    await tiered_cache_set_async(cache_key, live_stream.events, SEARCH_STREAM_CACHE_TTL_SECONDS)
+                except Exception as error:
+                    print("❌ Error in recording search stream: ", cache_key, error)
+            if self._live_streams.get(cache_key) is live_stream:
+                del self._live_streams[cache_key]
+            live_stream.finish()
+
+
+search_stream_hub = SearchStreamHub()
+async_search_stream_hub = AsyncSearchStreamHub()
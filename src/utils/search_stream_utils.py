@@ -0,0 +1,585 @@
+"""
+The restaurant search stream, shared by the Flask app (app.py) and the ASGI app (asgi_app.py):
+parsing the request, producing the search events, and formatting them as server-sent events.
+"""
+import asyncio
+import json
+import queue
+import threading
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+
+from utils.async_search_utils import restaurants_with_ratings_async_yield
+from utils.cache_utils import get_cache_key_for_search_stream
+from utils.constants import *
+from utils.ikyu_parse_utils import trim_availability_by_target_date_range
+from utils.ikyu_search_utils import search_restaurants_in_tokyo_async_yield, search_restaurants_in_tokyo_yield
+from utils.index_search_utils import INDEX_SEARCH_SOURCE, LIVE_SEARCH_SOURCE, SEARCH_SOURCES, find_indexed_restaurants
+from utils.ratings_search_utils import submit_ratings_and_links_for_restaurants
+from utils.restaurant_filters import parse_restaurant_filters_from_args
+from utils.search_cursor import FIRST_SEARCH_POSITION, decode_search_cursor, encode_search_cursor
+from utils.search_popularity import mark_search_filled, record_search
+from utils.search_stream_hub import async_search_stream_hub, search_stream_hub
+from utils.sse_utils import (
+    CURSOR_EVENT,
+    RATINGS_EVENT,
+    RESTAURANT_EVENT,
+    SUMMARY_EVENT,
+    format_close_event,
+    format_cursor_event,
+    format_protocol_event,
+    format_ratings_event,
+    format_restaurant_event,
+    format_summary_event,
+    parse_sse_protocol_version,
+)
+from utils.translation_utils import get_english_translation
+
+# Internal events of search_restaurant_events
+RESTAURANT_FOUND_EVENT = "restaurant_found"
+RATINGS_FOUND_EVENT = "ratings_found"
+SEARCH_DONE_EVENT = "search_done"
+SEARCH_CANCELLED_EVENT = "search_cancelled"
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def parse_dates_str_from_args(args):
+    """
+    :param args: the query parameters of the request
+    :return: the startDate and endDate as "YYYY-MM-DD", defaulting to today and a month later
+    :raise ValueError: with a message for the client if a date is invalid
+    """
+    start_date_str = args.get('startDate')
+    end_date_str = args.get('endDate')
+
+    if start_date_str:
+        try:
+            start_date = datetime.strptime(start_date_str, DATE_FORMAT).date()
+        except ValueError:
+            raise ValueError("Invalid startDate format. Expected YYYY-MM-DD.")
+    else:
+        start_date = datetime.today().date()
+
+    if end_date_str:
+        try:
+            end_date = datetime.strptime(end_date_str, DATE_FORMAT).date()
+        except ValueError:
+            raise ValueError("Invalid endDate format. Expected YYYY-MM-DD.")
+    else:
+        end_date = start_date + relativedelta(months=1)
+
+    # Validate dates
+    if end_date < start_date:
+        raise ValueError("endDate must be after startDate.")
+
+    return start_date.strftime(DATE_FORMAT), end_date.strftime(DATE_FORMAT)
+
+
+def parse_limit_from_args(args):
+    """
+    :return: the limit, the most restaurants to search, or None for no limit
+    :raise ValueError: with a message for the client if the limit is invalid
+    """
+    limit_str = args.get('limit')
+    if not limit_str:
+        return None
+    try:
+        limit = int(limit_str)
+    except ValueError:
+        raise ValueError("Invalid limit. Expected a positive integer.")
+    if limit < 1:
+        raise ValueError("Invalid limit. Expected a positive integer.")
+    return limit
+
+
+def parse_search_stream_args(args):
+    """
+    Parse the query parameters of /api/v1/restaurant_search_stream.
+    :param args: the query parameters, a Flask request.args or a Starlette request.query_params
+    :return: (search, None) with search a dict of the arguments of stream_restaurant_search,
+    or (None, error message for the client)
+    """
+    locations_and_food_types_string = args.get("locationsAndFoodTypes", None)
+    print("🔍 Locations and food types: ", locations_and_food_types_string)
+
+    # Check if the required parameter is provided
+    if locations_and_food_types_string is None:
+        return None, "Missing required parameter: locationsAndFoodTypes"
+
+    try:
+        locations_and_food_types = json.loads(locations_and_food_types_string)
+        food_types = locations_and_food_types["foodTypes"]
+        locations = locations_and_food_types["locations"]
+    except json.JSONDecodeError as e:
+        return None, f"Invalid JSON in locationsAndFoodTypes: {str(e)}"
+    except (KeyError, TypeError):
+        return None, "locationsAndFoodTypes must have foodTypes and locations"
+
+    try:
+        start_date, end_date = parse_dates_str_from_args(args)
+    except ValueError as e:
+        return None, str(e)
+
+    try:
+        limit = parse_limit_from_args(args)
+        cursor = args.get("cursor")
+        position = decode_search_cursor(cursor) if cursor else FIRST_SEARCH_POSITION
+        restaurant_filters = parse_restaurant_filters_from_args(args)
+    except ValueError as e:
+        return None, str(e)
+
+    # source=index answers from the local restaurant index when it covers the search
+    source = args.get("source") or LIVE_SEARCH_SOURCE
+    if source not in SEARCH_SOURCES:
+        return None, f"Invalid source. Expected one of: {', '.join(SEARCH_SOURCES)}."
+    if cursor:
+        if position["source"] == INDEX_SEARCH_SOURCE and source != INDEX_SEARCH_SOURCE:
+            return None, f"Invalid cursor for source={source}."
+        # With source=index, an Ikyu cursor continues a search the index fell back to Ikyu for
+        source = position["source"]
+
+    # Older clients ask for sseVersion=1, which sends full restaurant objects only
+    sse_protocol_version = parse_sse_protocol_version(args.get("sseVersion"))
+    if sse_protocol_version is None:
+        return None, "Unsupported sseVersion"
+
+    return {
+        "food_types": food_types,
+        "locations": locations,
+        "sort_option": args.get("sortOption", "top-picks"),
+        "start_date": start_date,
+        "end_date": end_date,
+        "num_people": args.get("numPeople", 2),
+        "start_page": position["page"],
+        "start_card": position["card"],
+        "limit": limit,
+        "restaurant_filters": restaurant_filters,
+        "source": source,
+        "sse_protocol_version": sse_protocol_version,
+    }, None
+
+
+def convert_restaurant_info_for_web(restaurant_info, start_date, end_date):
+    # rewrite availability for web, the only place it's converted back to dicts
+    new_availability = {}
+    if AVAILABILITY in restaurant_info.keys():
+        new_availability = trim_availability_by_target_date_range(
+            restaurant_info[AVAILABILITY], start_date, end_date)
+
+    return {
+        "name": restaurant_info[RESTAURANT_NAME],
+        "coverImageUrl": restaurant_info[COVER_IMAGE_URL],
+        "type": get_english_translation(restaurant_info[FOOD_TYPE]),
+        "rating": restaurant_info[RATING],
+        "reservationLink": restaurant_info[RESERVATION_LINK],
+        "ikyuId": restaurant_info[IKYU_ID],
+        "availability": new_availability,
+        "hardToReserve": restaurant_info[AVAILABILITY][HARD_TO_RESERVE],
+        "lunchPrice": restaurant_info[LUNCH_PRICE],
+        "dinnerPrice": restaurant_info[DINNER_PRICE],
+    }
+
+
+def get_ratings_and_links_fields(ratings_and_links):
+    """
+    :return: the fields a restaurant converted for web gets from its ratings and links
+    """
+    return {
+        'tabelogRating': ratings_and_links.get('tabelogRating'),
+        'tabelogLink': ratings_and_links.get('tabelogLink'),
+        'googleRating': ratings_and_links.get('googleRating'),
+        'googleLink': ratings_and_links.get('googleLink'),
+    }
+
+
+def stream_restaurant_search(
+        food_types,
+        locations,
+        sort_option,
+        start_date: str,
+        end_date: str,
+        num_people,
+        start_page,
+        start_card,
+        limit,
+        restaurant_filters,
+        source,
+        sse_protocol_version,
+):
+    """
+    Stream the events of a search, see search_restaurant_events.
+    Identical searches share one search while it runs, and replay it for a while after.
+    Only up to limit restaurants are searched, from the start_card-th card of result page start_page.
+    Restaurants not matching restaurant_filters (see utils/restaurant_filters.py) are skipped.
+    With source=INDEX_SEARCH_SOURCE, the search is answered from the restaurant index if it covers it.
+    See utils/sse_utils.py for the event format of each sse_protocol_version.
+    """
+    if is_first_search_slice(start_page, start_card):
+        record_search(locations, food_types, sort_option)
+    cache_key = get_cache_key_for_search_stream(
+        food_types, locations, sort_option, start_date, end_date, num_people, start_page, start_card, limit,
+        restaurant_filters.to_key(), source,
+    )
+    events = search_stream_hub.subscribe(
+        cache_key,
+        lambda cancellation_token: search_restaurant_events(
+            food_types, locations, sort_option, start_date, end_date, num_people,
+            start_page, start_card, limit, restaurant_filters, source, cancellation_token,
+        ),
+    )
+
+    try:
+        yield format_protocol_event(sse_protocol_version)
+        restaurants_by_ikyu_id = {}
+        for event in events:
+            yield format_search_event(event, sse_protocol_version, restaurants_by_ikyu_id)
+        yield format_close_event()
+    finally:
+        # The server closes this generator when the client disconnects. Leave the search,
+        # which cancels it if no other client is following it.
+        events.close()
+
+
+async def stream_restaurant_search_async(
+        food_types,
+        locations,
+        sort_option,
+        start_date: str,
+        end_date: str,
+        num_people,
+        start_page,
+        start_card,
+        limit,
+        restaurant_filters,
+        source,
+        sse_protocol_version,
+):
+    """
+    Async equivalent of stream_restaurant_search, running the search on the event loop.
+    """
+    if is_first_search_slice(start_page, start_card):
+        # The Redis client is blocking, keep it off the event loop
+        await asyncio.to_thread(record_search, locations, food_types, sort_option)
+    cache_key = get_cache_key_for_search_stream(
+        food_types, locations, sort_option, start_date, end_date, num_people, start_page, start_card, limit,
+        restaurant_filters.to_key(), source,
+    )
+    events = async_search_stream_hub.subscribe(
+        cache_key,
+        lambda: search_restaurant_events_async(
+            food_types, locations, sort_option, start_date, end_date, num_people,
+            start_page, start_card, limit, restaurant_filters, source,
+        ),
+    )
+
+    try:
+        yield format_protocol_event(sse_protocol_version)
+        restaurants_by_ikyu_id = {}
+        async for event in events:
+            yield format_search_event(event, sse_protocol_version, restaurants_by_ikyu_id)
+        yield format_close_event()
+    finally:
+        # Closed (or cancelled) when the client disconnects, see stream_restaurant_search
+        await events.aclose()
+
+
+def is_first_search_slice(start_page, start_card):
+    """
+    :return: whether a stream starts a search, as opposed to getting more results with a cursor
+    """
+    return (start_page, start_card) == (FIRST_SEARCH_POSITION["page"], FIRST_SEARCH_POSITION["card"])
+
+
+def is_cache_filling_search(locations, food_types, start_page, start_card, limit, source):
+    """
+    :return: whether a search fills the caches of all the results of one region × cuisine, so
+    it's marked as filled for the cache warming job once complete, see utils/search_popularity.py.
+    A search with a limit fills only the first ones.
+    """
+    return (
+        source == LIVE_SEARCH_SOURCE
+        and len(locations) == 1
+        and len(food_types) == 1
+        and is_first_search_slice(start_page, start_card)
+        and limit is None
+    )
+
+
+def format_search_event(event, sse_protocol_version, restaurants_by_ikyu_id):
+    """
+    :param event: an event of search_restaurant_events
+    :param restaurants_by_ikyu_id: the restaurants streamed so far, updated in place. Events are
+    shared with other requests, so restaurants in events are never updated in place.
+    """
+    event_type, payload = event
+    if event_type == CURSOR_EVENT:
+        return format_cursor_event(payload['cursor'])
+    if event_type == SUMMARY_EVENT:
+        return format_summary_event(payload)
+    if event_type == RESTAURANT_EVENT:
+        restaurants_by_ikyu_id[payload['ikyuId']] = payload
+        return format_restaurant_event(payload, sse_protocol_version)
+
+    restaurant = {**restaurants_by_ikyu_id[payload['ikyuId']], **payload}
+    restaurants_by_ikyu_id[payload['ikyuId']] = restaurant
+    ratings_fields = {key: value for key, value in payload.items() if key != 'ikyuId'}
+    return format_ratings_event(restaurant, ratings_fields, sse_protocol_version)
+
+
+def search_restaurant_events(
+        food_types,
+        locations,
+        sort_option,
+        start_date: str,
+        end_date: str,
+        num_people,
+        start_page,
+        start_card,
+        limit,
+        restaurant_filters,
+        source,
+        cancellation_token,
+):
+    """
+    Yield a (RESTAURANT_EVENT, restaurant) as soon as Ikyu search finds a restaurant, and a
+    (RATINGS_EVENT, {ikyuId, rating/link fields}) as soon as its Tabelog & Google lookup finishes.
+    Ratings lookups run in the background while the Ikyu search continues.
+    Restaurants not matching restaurant_filters are skipped before their ratings lookup.
+    Restaurants come from the restaurant index or Ikyu, see search_restaurants_yield.
+    A complete search is marked as filled for the cache warming job, see is_cache_filling_search.
+    Ends once both the search and all ratings lookups are done, with a (SUMMARY_EVENT, {skippedCount})
+    and a (CURSOR_EVENT, {cursor}) of the results after these, or by raising if the search failed.
+    Once cancellation_token is cancelled (or the generator is closed), ends right away: pending
+    ratings lookups are cancelled, and the search stops fetching pages and calendars.
+    """
+    # Both the Ikyu search thread and the ratings lookups report here
+    events = queue.Queue()
+    cancellation_token.add_callback(lambda: events.put((SEARCH_CANCELLED_EVENT, None)))
+
+    def report_ratings(ikyu_id, future):
+        if not future.cancelled():
+            events.put((RATINGS_FOUND_EVENT, (ikyu_id, future.result())))
+
+    # Where the search stopped, set by the search thread before it reports SEARCH_DONE_EVENT
+    next_position = {}
+    search_stats = {'skippedCount': 0}
+    restaurant_filter = build_restaurant_filter(restaurant_filters, start_date, end_date, search_stats)
+
+    def search_ikyu():
+        search_error = None
+        # Generator that yields restaurants from the index or Ikyu
+        all_restaurants = search_restaurants_yield(
+            source, locations, food_types, sort_option, start_date, end_date, num_people,
+            start_page, start_card, limit, restaurant_filters, next_position, search_stats,
+        )
+        try:
+            for restaurant in all_restaurants:
+                if cancellation_token.is_cancelled:
+                    break
+                if restaurant_filter(restaurant):
+                    events.put((RESTAURANT_FOUND_EVENT, restaurant))
+        except Exception as error:
+            print("❌ Error in searching restaurants on Ikyu: ", error)
+            search_error = error
+        finally:
+            # Cancels the pages and calendars not fetched yet
+            all_restaurants.close()
+            events.put((SEARCH_DONE_EVENT, search_error))
+
+    threading.Thread(target=search_ikyu, daemon=True).start()
+
+    search_error = None
+    is_search_done = False
+    # ikyu_id -> future of a ratings lookup not reported yet
+    pending_ratings_futures = {}
+    try:
+        while not is_search_done or pending_ratings_futures:
+            # Handle everything that's ready at once, so ratings of restaurants found
+            # together are read from the cache together
+            batch_events = [events.get()]
+            while not events.empty():
+                batch_events.append(events.get_nowait())
+
+            found_restaurants = []
+            for event_type, payload in batch_events:
+                if event_type == SEARCH_CANCELLED_EVENT:
+                    return
+                if event_type == RESTAURANT_FOUND_EVENT:
+                    converted_restaurant = convert_restaurant_info_for_web(payload, start_date, end_date)
+                    found_restaurants.append(converted_restaurant)
+                    yield RESTAURANT_EVENT, converted_restaurant
+                elif event_type == RATINGS_FOUND_EVENT:
+                    ikyu_id, ratings_and_links = payload
+                    del pending_ratings_futures[ikyu_id]
+                    yield RATINGS_EVENT, {'ikyuId': ikyu_id, **get_ratings_and_links_fields(ratings_and_links)}
+                elif event_type == SEARCH_DONE_EVENT:
+                    is_search_done = True
+                    search_error = payload
+
+            # Start fetching ratings/links from Tabelog & Google right away
+            ratings_futures = submit_ratings_and_links_for_restaurants(
+                [(restaurant['ikyuId'], restaurant['name']) for restaurant in found_restaurants]
+            )
+            for ikyu_id, ratings_future in ratings_futures.items():
+                pending_ratings_futures[ikyu_id] = ratings_future
+                ratings_future.add_done_callback(
+                    lambda future, ikyu_id=ikyu_id: report_ratings(ikyu_id, future)
+                )
+    finally:
+        if not is_search_done or pending_ratings_futures:
+            # Stopping early, stop the search thread too
+            cancellation_token.cancel()
+            # Lookups not started yet are cancelled, see submit_ratings_and_links_for_restaurant
+            for ratings_future in pending_ratings_futures.values():
+                ratings_future.cancel()
+
+    # Everything found was streamed, but the search is incomplete
+    if search_error is not None:
+        raise search_error
+    if is_cache_filling_search(locations, food_types, start_page, start_card, limit, source):
+        mark_search_filled(locations[0], food_types[0], sort_option)
+    yield SUMMARY_EVENT, dict(search_stats)
+    yield CURSOR_EVENT, {'cursor': encode_next_search_cursor(next_position)}
+
+
+async def search_restaurant_events_async(
+        food_types,
+        locations,
+        sort_option,
+        start_date: str,
+        end_date: str,
+        num_people,
+        start_page,
+        start_card,
+        limit,
+        restaurant_filters,
+        source,
+):
+    """
+    Async equivalent of search_restaurant_events, on the async search and enrichment pipeline.
+    Raises at the end if the search failed.
+    """
+    streamed_ikyu_ids = set()
+    next_position = {}
+    search_stats = {'skippedCount': 0}
+    restaurant_filter = build_restaurant_filter(restaurant_filters, start_date, end_date, search_stats)
+    all_restaurants = search_restaurants_async_yield(
+        source, locations, food_types, sort_option, start_date, end_date, num_people,
+        start_page, start_card, limit, restaurant_filters, next_position, search_stats,
+    )
+    async for restaurant in restaurants_with_ratings_async_yield(all_restaurants, restaurant_filter):
+        # Each restaurant comes first without, then with its ratings and links
+        ikyu_id = restaurant[IKYU_ID]
+        if ikyu_id not in streamed_ikyu_ids:
+            streamed_ikyu_ids.add(ikyu_id)
+            yield RESTAURANT_EVENT, convert_restaurant_info_for_web(restaurant, start_date, end_date)
+        else:
+            yield RATINGS_EVENT, {'ikyuId': ikyu_id, **get_ratings_and_links_fields(restaurant)}
+    if is_cache_filling_search(locations, food_types, start_page, start_card, limit, source):
+        # The Redis client is blocking, keep it off the event loop
+        await asyncio.to_thread(mark_search_filled, locations[0], food_types[0], sort_option)
+    yield SUMMARY_EVENT, dict(search_stats)
+    yield CURSOR_EVENT, {'cursor': encode_next_search_cursor(next_position)}
+
+
+def encode_next_search_cursor(next_position):
+    """
+    :param next_position: where the search stopped, empty if it reached the last result
+    :return: the cursor of the next results, or None if there are none
+    """
+    if not next_position:
+        return None
+    return encode_search_cursor(next_position)
+
+
+def build_restaurant_filter(restaurant_filters, start_date: str, end_date: str, search_stats):
+    """
+    :param search_stats: {"skippedCount"}, counts the restaurants skipped, updated in place
+    :return: a function of a restaurant with its calendar, returning whether to keep it
+    """
+    def restaurant_filter(restaurant):
+        if restaurant_filters.matches(restaurant, start_date, end_date):
+            return True
+        search_stats['skippedCount'] += 1
+        return False
+
+    return restaurant_filter
+
+
+def search_restaurants_yield(
+        source,
+        locations,
+        food_types,
+        sort_option,
+        start_date: str,
+        end_date: str,
+        num_people,
+        start_page,
+        start_card,
+        limit,
+        restaurant_filters,
+        next_position,
+        search_stats,
+):
+    """
+    Yield the restaurants of a search with their availability, from the restaurant index with
+    source=INDEX_SEARCH_SOURCE if it covers the search, else from Ikyu.
+    :param next_position: updated in place, see restaurants_from_search_urls_yield
+    :param search_stats: {"skippedCount"}, updated in place with the restaurants the index left out
+    """
+    if source == INDEX_SEARCH_SOURCE:
+        indexed_search = find_indexed_restaurants(
+            locations, food_types, sort_option, start_date, end_date, num_people,
+            start_page, start_card, limit, restaurant_filters,
+        )
+        if indexed_search is not None:
+            restaurants, skipped_count, indexed_next_position = indexed_search
+            search_stats['skippedCount'] += skipped_count
+            next_position.update(indexed_next_position)
+            yield from restaurants
+            return
+    yield from search_restaurants_in_tokyo_yield(
+        locations, food_types, sort_option, start_date, num_people,
+        start_page=start_page, start_card=start_card, limit=limit, next_position=next_position,
+    )
+
+
+async def search_restaurants_async_yield(
+        source,
+        locations,
+        food_types,
+        sort_option,
+        start_date: str,
+        end_date: str,
+        num_people,
+        start_page,
+        start_card,
+        limit,
+        restaurant_filters,
+        next_position,
+        search_stats,
+):
+    """
+    Async equivalent of search_restaurants_yield.
+    """
+    if source == INDEX_SEARCH_SOURCE:
+        # SQLite is blocking, keep it off the event loop
+        indexed_search = await asyncio.to_thread(
+            find_indexed_restaurants,
+            locations, food_types, sort_option, start_date, end_date, num_people,
+            start_page, start_card, limit, restaurant_filters,
+        )
+        if indexed_search is not None:
+            restaurants, skipped_count, indexed_next_position = indexed_search
+            search_stats['skippedCount'] += skipped_count
+            next_position.update(indexed_next_position)
+            for restaurant in restaurants:
+                yield restaurant
+            return
+    async for restaurant in search_restaurants_in_tokyo_async_yield(
+        locations, food_types, sort_option, start_date, num_people,
+        start_page=start_page, start_card=start_card, limit=limit, next_position=next_position,
+    ):
+        yield restaurant
@@ -0,0 +1,168 @@
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+import uuid
+import weakref
+
+from config import *
+from utils.redis_client import redis_client
+
+# Delete the lock only if we still own it, so an expired lock taken over by another process is kept
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+# Result of a call whose leader was cancelled, so its waiters retry it
+_LEADER_CANCELLED = object()
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one call.
+    The first caller for a key runs the function; callers arriving while it's in flight
+    wait for it and get the same result (or exception). Nothing is cached after the call ends.
+    An async caller being cancelled never cancels the call for the others.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        # Async calls are coalesced per event loop, since asyncio futures are bound to one loop
+        self._async_calls_by_loop = weakref.WeakKeyDictionary()
+
+    def do(self, key, function, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = concurrent.futures.Future()
+                self._calls[key] = future
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def do_async(self, key, coroutine_function, *args, **kwargs):
+        """
+        Async equivalent of do. Only calls made on the same event loop are coalesced,
+        so a search driven on its own private loop never shares a call with other searches.
+        Blocking callers go through do instead.
+        """
+        loop = asyncio.get_running_loop()
+        calls = self._async_calls_by_loop.setdefault(loop, {})
+        future = calls.get(key)
+        while future is not None:
+            # Don't let one waiter being cancelled cancel the shared call
+            result = await asyncio.shield(future)
+            if result is not _LEADER_CANCELLED:
+                return result
+            # The leader was cancelled, the first waiter back runs the call instead
+            future = calls.get(key)
+
+        future = loop.create_future()
+        calls[key] = future
+        try:
+            result = await coroutine_function(*args, **kwargs)
+        except BaseException as error:
+            if isinstance(error, asyncio.CancelledError):
+                # Only the leader's caller went away, the waiters still want the result
+                future.set_result(_LEADER_CANCELLED)
+            else:
+                future.set_exception(error)
+                # Waiters get the exception; don't warn if there were none
+                future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del calls[key]
+
+
+def get_lock_key_for_cache_key(cache_key):
+    return f"lock:{cache_key}"
+
+
+def do_with_redis_lock(cache_key, function, *args, **kwargs):
+    """
+    Cross-process single flight for a value cached in Redis under cache_key.
+    The process holding lock:<cache_key> calls function, which must store its result
+    under cache_key. Other processes wait for the cached value instead, and only call
+    function themselves if the lock is released or times out without a value.
+    Does nothing more than calling function if REDIS_SINGLE_FLIGHT_ENABLED is off.
+    :return: the result of function, or the JSON decoded cached value
+    """
+    if not REDIS_SINGLE_FLIGHT_ENABLED:
+        return function(*args, **kwargs)
+
+    lock_key = get_lock_key_for_cache_key(cache_key)
+    token = uuid.uuid4().hex
+    if not redis_client.set(lock_key, token, nx=True, ex=REDIS_LOCK_TTL_SECONDS):
+        deadline = time.monotonic() + REDIS_LOCK_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(REDIS_LOCK_POLL_INTERVAL_SECONDS)
+            cached_data = redis_client.get(cache_key)
+            if cached_data is not None:
+                return json.loads(cached_data)
+            if not redis_client.exists(lock_key):
+                break
+        return function(*args, **kwargs)
+
+    try:
+        # Another process may have filled the cache just before we took the lock
+        cached_data = redis_client.get(cache_key)
+        if cached_data is not None:
+            return json.loads(cached_data)
+        return function(*args, **kwargs)
+    finally:
+        redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+
+
+async def do_with_redis_lock_async(cache_key, coroutine_function, *args, **kwargs):
+    """
+    Async equivalent of do_with_redis_lock.
+    """
+    if not REDIS_SINGLE_FLIGHT_ENABLED:
+        return await coroutine_function(*args, **kwargs)
+
+    lock_key = get_lock_key_for_cache_key(cache_key)
+    token = uuid.uuid4().hex
+    # The Redis client is blocking, keep it off the event loop
+    is_lock_acquired = await asyncio.to_thread(
+        redis_client.set, lock_key, token, nx=True, ex=REDIS_LOCK_TTL_SECONDS
+    )
+    if not is_lock_acquired:
+        deadline = time.monotonic() + REDIS_LOCK_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(REDIS_LOCK_POLL_INTERVAL_SECONDS)
+            cached_data = await asyncio.to_thread(redis_client.get, cache_key)
+            if cached_data is not None:
+                return json.loads(cached_data)
+            if not await asyncio.to_thread(redis_client.exists, lock_key):
+                break
+        return await coroutine_function(*args, **kwargs)
+
+    try:
+        # Another process may have filled the cache just before we took the lock
+        cached_data = await asyncio.to_thread(redis_client.get, cache_key)
+        if cached_data is not None:
+            return json.loads(cached_data)
+        return await coroutine_function(*args, **kwargs)
+    finally:
+        await asyncio.to_thread(redis_client.eval, _RELEASE_LOCK_SCRIPT, 1, lock_key, token)
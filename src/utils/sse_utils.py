@@ -0,0 +1,104 @@
+"""
+Server-sent events of the restaurant search stream.
+
+Protocol versions, picked with the sseVersion query parameter:
+- 1 (legacy): every message is an unnamed event with a full restaurant object. A restaurant
+  is sent again in full once its ratings and links are found.
+- 2 (default): starts with a "protocol" event. A "restaurant" event carries the full restaurant
+  once; a "ratings" event carries only its ikyuId and the rating/link fields to merge into it.
+Both send a "summary" event with the number of restaurants skipped by the filters, then a
+"cursor" event before the "close" event, with the cursor to pass back to get the
+next results, or null if there are none.
+Both end with a "close" event.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LEGACY_SSE_PROTOCOL_VERSION = 1
+DELTA_SSE_PROTOCOL_VERSION = 2
+SSE_PROTOCOL_VERSIONS = (LEGACY_SSE_PROTOCOL_VERSION, DELTA_SSE_PROTOCOL_VERSION)
+DEFAULT_SSE_PROTOCOL_VERSION = DELTA_SSE_PROTOCOL_VERSION
+
+PROTOCOL_EVENT = "protocol"
+RESTAURANT_EVENT = "restaurant"
+RATINGS_EVENT = "ratings"
+SUMMARY_EVENT = "summary"
+CURSOR_EVENT = "cursor"
+CLOSE_EVENT = "close"
+
+
+def dumps_json(data):
+    """
+    Serialize to a JSON string with orjson if it's installed, which is several times faster.
+    """
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data)
+
+
+def parse_sse_protocol_version(value):
+    """
+    :param value: the sseVersion query parameter, or None
+    :return: the protocol version, or None if value is not a supported version
+    """
+    if value is None:
+        return DEFAULT_SSE_PROTOCOL_VERSION
+    try:
+        version = int(value)
+    except ValueError:
+        return None
+    return version if version in SSE_PROTOCOL_VERSIONS else None
+
+
+def format_sse_event(data, event=None):
+    if event is None:
+        return f"data: {dumps_json(data)}\n\n"
+    return f"event: {event}\ndata: {dumps_json(data)}\n\n"
+
+
+def format_protocol_event(protocol_version):
+    """
+    :return: the first event of a stream, empty for the legacy protocol which has none
+    """
+    if protocol_version == LEGACY_SSE_PROTOCOL_VERSION:
+        return ""
+    return format_sse_event({"version": protocol_version}, PROTOCOL_EVENT)
+
+
+def format_restaurant_event(restaurant, protocol_version):
+    if protocol_version == LEGACY_SSE_PROTOCOL_VERSION:
+        return format_sse_event(restaurant)
+    return format_sse_event(restaurant, RESTAURANT_EVENT)
+
+
+def format_ratings_event(restaurant, ratings_fields, protocol_version):
+    """
+    :param restaurant: the restaurant converted for web, already updated with ratings_fields
+    :param ratings_fields: the rating and link fields found for it
+    """
+    if protocol_version == LEGACY_SSE_PROTOCOL_VERSION:
+        return format_sse_event(restaurant)
+    return format_sse_event({"ikyuId": restaurant["ikyuId"], **ratings_fields}, RATINGS_EVENT)
+
+
+def format_summary_event(summary):
+    """
+    :param summary: {"skippedCount"}, a named event in both protocols like the cursor event
+    """
+    return format_sse_event(summary, SUMMARY_EVENT)
+
+
+def format_cursor_event(cursor):
+    """
+    :param cursor: the cursor of the next results, or None. A named event in both protocols,
+    so legacy clients listening to unnamed events only ignore it.
+    """
+    return format_sse_event({"cursor": cursor}, CURSOR_EVENT)
+
+
+def format_close_event():
+    return f"event: {CLOSE_EVENT}\ndata: \n\n"
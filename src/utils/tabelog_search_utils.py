@@ -1,16 +1,26 @@
+import asyncio
+import functools
 import re
 
-import json
 import unidecode
 import urllib.parse
-from bs4 import BeautifulSoup
 from pykakasi import kakasi
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 from urllib.parse import urlencode
+from config import *
 from utils.network import get_response_html_from_url_with_headers
-from .cache_utils import get_cache_key_for_tabelog
-from .file_utils import write_response_to_debug_log_file
-from utils.redis_client import redis_client
+from utils.async_network import get_response_html_from_url_with_headers_async
+from .cache_utils import get_cache_key_for_tabelog, get_ratings_cache_ttl_seconds
+from .debug_capture import capture_response
+from .html_parsers import html_parser
+from utils.tiered_cache import (
+    CACHE_MISS,
+    tiered_cache_get,
+    tiered_cache_get_async,
+    tiered_cache_set,
+    tiered_cache_set_async,
+)
+from utils.single_flight import SingleFlight, do_with_redis_lock, do_with_redis_lock_async
 
 
 # Initialize Kakasi for transliteration
@@ -21,21 +31,72 @@ kakasi_instance.setMode("J", "a")  # Kanji to ASCII
 converter = kakasi_instance.getConverter()
 
 
+# Concurrent lookups of the same restaurant share one Tabelog search
+tabelog_single_flight = SingleFlight()
+
+
 def get_tabelog_data(ikyu_id, restaurant_search_name):
     cache_key = get_cache_key_for_tabelog(ikyu_id)
-    cached_data = redis_client.get(cache_key)
+    cached_data = tiered_cache_get(cache_key)
+
+    if cached_data is not CACHE_MISS:
+        return cached_data
+    else:
+        return tabelog_single_flight.do(
+            cache_key,
+            do_with_redis_lock,
+            cache_key,
+            fetch_tabelog_data,
+            cache_key,
+            restaurant_search_name,
+        )
+
+
+def fetch_tabelog_data(cache_key, restaurant_search_name):
+    tabelog_url = build_tabelog_query_url_for_restaurant(restaurant_search_name)
+    response, is_result_list = request_and_parse_tabelog_result(
+        tabelog_url,
+        urllib.parse.unquote(restaurant_search_name)
+    )
+    # "Not found" is cached too, for a shorter time, but only from a real result list
+    if response is not None or is_result_list:
+        tiered_cache_set(cache_key, response, get_ratings_cache_ttl_seconds(response))
+
+    return response
+
+
+async def get_tabelog_data_async(ikyu_id, restaurant_search_name):
+    cache_key = get_cache_key_for_tabelog(ikyu_id)
+    cached_data = await tiered_cache_get_async(cache_key)
 
-    if cached_data:
-        return json.loads(cached_data)
+    if cached_data is not CACHE_MISS:
+        return cached_data
     else:
-        tabelog_url = build_tabelog_query_url_for_restaurant(restaurant_search_name)
-        response = request_and_parse_tabelog_result(
-            tabelog_url,
-            urllib.parse.unquote(restaurant_search_name)
+        return await tabelog_single_flight.do_async(
+            cache_key,
+            do_with_redis_lock_async,
+            cache_key,
+            fetch_tabelog_data_async,
+            cache_key,
+            restaurant_search_name,
         )
-        redis_client.set(cache_key, json.dumps(response), ex=86400)
 
-        return response
+
+async def fetch_tabelog_data_async(cache_key, restaurant_search_name):
+    tabelog_url = build_tabelog_query_url_for_restaurant(restaurant_search_name)
+    html = await get_response_html_from_url_with_headers_async(tabelog_url)
+    # Parsing is CPU bound, keep it off the event loop
+    response, is_result_list = await asyncio.to_thread(
+        parse_tabelog_result,
+        html,
+        tabelog_url,
+        urllib.parse.unquote(restaurant_search_name)
+    )
+    # "Not found" is cached too, for a shorter time, but only from a real result list
+    if response is not None or is_result_list:
+        await tiered_cache_set_async(cache_key, response, get_ratings_cache_ttl_seconds(response))
+
+    return response
 
 
 def build_tabelog_query_url_for_restaurant(restaurant_name):
@@ -53,30 +114,76 @@ def build_tabelog_query_url_for_restaurant(restaurant_name):
 
 def request_and_parse_tabelog_result(url, restaurant_search_name):
     response = get_response_html_from_url_with_headers(url)
+    return parse_tabelog_result(response, url, restaurant_search_name)
 
-    write_response_to_debug_log_file(response, "debug_log", "tabelog_search_link_raw_content.html")
-
-    # Parse the HTML content of the page with BeautifulSoup
-    soup = BeautifulSoup(response, "html.parser")
-
-    # Find all <a> tags with class "list-rst__rst-name-target cpy-rst-name"
-    restaurant_name_tags = soup.find_all("a", class_="list-rst__rst-name-target cpy-rst-name")
-    for restaurant_name_tag in restaurant_name_tags:
-        restaurant_name = restaurant_name_tag.text.strip()
-        restaurant_link = restaurant_name_tag.get('href')
 
-        # Find the target restaurant by comparing restaurant title strings
-        if are_restaurant_names_matching(restaurant_name, restaurant_search_name):
-            parent_element = restaurant_name_tag.find_parent("div", class_="list-rst__rst-data")
-            rating_tag = parent_element.find("span", class_="c-rating__val c-rating__val--strong list-rst__rating-val")
-            rating = rating_tag.text.strip() if rating_tag else None
-
-            return rating, restaurant_link
+def parse_tabelog_result(response, url, restaurant_search_name):
+    """
+    :return: ((rating, link) of the restaurant or None if not found, whether the page was a
+    list of results). A page without results may be a block page rather than a real
+    "not found", so it's not worth caching.
+    """
+    restaurants = html_parser.find_tabelog_restaurants(response)
+    # Find the target restaurant by comparing restaurant title strings
+    index = find_best_matching_restaurant_name_index(
+        restaurant_search_name, [restaurant_name for restaurant_name, _, _ in restaurants]
+    )
+    # Pages without a match may be pages the parser no longer understands
+    capture_response(response, "tabelog_search", url, is_parse_failure=index is None)
+    if index is not None:
+        _, restaurant_link, rating = restaurants[index]
+        return (rating, restaurant_link), True
 
     print("⚠️️ Cannot find matched restaurant on Tabelog! "
           "restaurant_search_name: ", restaurant_search_name,
           "search url: ", url)
-    return None
+    return None, bool(restaurants)
+
+
+def find_best_matching_restaurant_name_index(search_name, candidate_names, threshold=90):
+    """
+    Find the candidate that best matches search_name after normalization.
+    An exact match wins, then the closest of the names containing the other (highest
+    token_set_ratio, then nearest in length), then the best fuzzy match (token_set_ratio)
+    scoring at least threshold.
+    :return: the index of the best candidate, or None if none matches
+    """
+    normalized_search_name = normalize_string(search_name)
+    normalized_candidate_names = [normalize_string(name) for name in candidate_names]
+
+    if normalized_search_name in normalized_candidate_names:
+        return normalized_candidate_names.index(normalized_search_name)
+
+    if normalized_search_name:
+        substring_match_indexes = [
+            index
+            for index, normalized_candidate_name in enumerate(normalized_candidate_names)
+            if normalized_candidate_name and (
+                normalized_candidate_name in normalized_search_name
+                or normalized_search_name in normalized_candidate_name
+            )
+        ]
+        if substring_match_indexes:
+            # Search results list branches and similarly named restaurants too,
+            # so the first hit in page order is not necessarily the closest
+            return min(
+                substring_match_indexes,
+                key=lambda index: (
+                    -fuzz.token_set_ratio(normalized_search_name, normalized_candidate_names[index]),
+                    abs(len(normalized_candidate_names[index]) - len(normalized_search_name)),
+                    index,
+                ),
+            )
+
+    # Score all candidates in one call
+    best_match = process.extractOne(
+        normalized_search_name,
+        normalized_candidate_names,
+        scorer=fuzz.token_set_ratio,
+        processor=None,
+        score_cutoff=threshold,
+    )
+    return best_match[2] if best_match else None
 
 
 def are_restaurant_names_matching(name_1, name_2, threshold=90):
@@ -84,18 +191,12 @@ def are_restaurant_names_matching(name_1, name_2, threshold=90):
     Compare two strings after normalization to determine if they match.
     Uses exact matching and fuzzy matching based on a similarity threshold.
     """
-    normalized_name_1 = normalize_string(name_1)
-    normalized_name_2 = normalize_string(name_2)
-
-    # Exact match
-    if normalized_name_1 in normalized_name_1 or normalized_name_2 in normalized_name_1:
-        return True
-
-    # Fuzzy match using token_set_ratio
-    similarity = fuzz.token_set_ratio(normalized_name_1, normalized_name_2)
-    return similarity >= threshold
+    return find_best_matching_restaurant_name_index(name_1, [name_2], threshold) is not None
 
 
+# Search names repeat across lookups and Tabelog results repeat across searches,
+# and transliterating with pykakasi is the slow part
+@functools.lru_cache(maxsize=NAME_NORMALIZATION_CACHE_SIZE)
 def normalize_string(s):
     # Transliterate Japanese scripts to Romaji using pykakasi
     s = converter.do(s)
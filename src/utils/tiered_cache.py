@@ -0,0 +1,150 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from config import *
+from utils.redis_client import redis_client
+
+# Returned by the get functions when a key is in neither tier, since None is a valid cached value
+CACHE_MISS = object()
+
+
+class TTLLRUCache:
+    """
+    A bounded in-process cache. Entries expire after their own TTL, and the least
+    recently used entry is evicted when the cache is full. Safe to use from many threads.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl_seconds):
+        if ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# L1 in front of Redis for ratings and calendars. Values are stored JSON decoded; don't mutate them.
+local_cache = TTLLRUCache(LOCAL_CACHE_MAX_ENTRIES)
+
+
+def get_local_cache_ttl_seconds(redis_ttl_seconds):
+    """
+    A local entry never outlives the Redis entry, and never lags a change in Redis
+    by more than LOCAL_CACHE_MAX_STALENESS_SECONDS.
+    """
+    return min(redis_ttl_seconds, LOCAL_CACHE_MAX_STALENESS_SECONDS)
+
+
+def tiered_cache_get(cache_key):
+    """
+    :return: the JSON decoded value cached under cache_key, or CACHE_MISS
+    """
+    value = local_cache.get(cache_key, CACHE_MISS)
+    if value is not CACHE_MISS:
+        return value
+    return get_many_from_redis([cache_key]).get(cache_key, CACHE_MISS)
+
+
+async def tiered_cache_get_async(cache_key):
+    value = local_cache.get(cache_key, CACHE_MISS)
+    if value is not CACHE_MISS:
+        return value
+    # The Redis client is blocking, keep it off the event loop
+    cached_values = await asyncio.to_thread(get_many_from_redis, [cache_key])
+    return cached_values.get(cache_key, CACHE_MISS)
+
+
+def tiered_cache_get_many(cache_keys):
+    """
+    Look up many keys, reading the ones missing locally from Redis in one round trip.
+    :return: a dict of cache key -> JSON decoded value, only for keys found
+    """
+    results = {}
+    redis_keys = []
+    for cache_key in cache_keys:
+        value = local_cache.get(cache_key, CACHE_MISS)
+        if value is CACHE_MISS:
+            redis_keys.append(cache_key)
+        else:
+            results[cache_key] = value
+    if redis_keys:
+        results.update(get_many_from_redis(redis_keys))
+    return results
+
+
+def get_many_from_redis(redis_keys):
+    """
+    Read keys from Redis in one round trip, and keep the values found in the local cache.
+    :return: a dict of cache key -> JSON decoded value, only for keys found
+    """
+    results = {}
+    # Read the remaining TTLs along with the values, so local entries expire with Redis
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.mget(redis_keys)
+    for cache_key in redis_keys:
+        pipeline.pttl(cache_key)
+    cached_values, *ttls_in_milliseconds = pipeline.execute()
+
+    for cache_key, cached_value, ttl_in_milliseconds in zip(redis_keys, cached_values, ttls_in_milliseconds):
+        if cached_value is None:
+            continue
+        value = json.loads(cached_value)
+        results[cache_key] = value
+        # PTTL is -1 for a key without an expiry, and -2 if the key expired since the MGET
+        if ttl_in_milliseconds == -1:
+            local_cache.set(cache_key, value, LOCAL_CACHE_MAX_STALENESS_SECONDS)
+        elif ttl_in_milliseconds > 0:
+            local_cache.set(cache_key, value, get_local_cache_ttl_seconds(ttl_in_milliseconds / 1000))
+    return results
+
+
+def tiered_cache_set(cache_key, value, ttl_seconds):
+    redis_client.set(cache_key, json.dumps(value), ex=ttl_seconds)
+    local_cache.set(cache_key, value, get_local_cache_ttl_seconds(ttl_seconds))
+
+
+async def tiered_cache_set_async(cache_key, value, ttl_seconds):
+    # The Redis client is blocking, keep it off the event loop
+    await asyncio.to_thread(redis_client.set, cache_key, json.dumps(value), ex=ttl_seconds)
+    local_cache.set(cache_key, value, get_local_cache_ttl_seconds(ttl_seconds))
@@ -0,0 +1,178 @@
+"""
+Cache warming job: runs the searches users are likely to make before they do, so the Redis
+caches of search pages, calendars and Tabelog/Google ratings are already filled.
+
+Walks the region × cuisine × sort option combinations of config.py (CACHE_WARMING_*), the
+most popular and least recently filled first, until the upstream request budget is spent.
+Meant to run on a schedule, e.g. from cron, see README.md:
+    python src/warm_cache.py [--budget N] [--regions ...] [--food-types ...] [--sort-options ...] [--dry-run]
+"""
+import argparse
+import time
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+
+from config import *
+from utils.cache_utils import (
+    CATEGORY_CODE_MAPPING_FILE_NAME,
+    TOKYO_REGION_CODE_MAPPING_FILE_NAME,
+    get_mapping_index,
+)
+from utils.cancellation import CancellationToken
+from utils.http_client import get_connection_reuse_stats
+from utils.index_search_utils import LIVE_SEARCH_SOURCE
+from utils.restaurant_filters import RestaurantFilters
+from utils.search_popularity import decay_search_popularity, get_search_popularity_and_last_filled
+from utils.search_stream_utils import DATE_FORMAT, search_restaurant_events
+from utils.sort_options import SORT_OPTIONS
+from utils.sse_utils import RESTAURANT_EVENT
+
+
+def get_warming_combinations(regions=None, food_types=None, sort_options=None):
+    """
+    :return: a list of (region, food type, sort option), for all regions/food types of the
+    mapping files if None
+    :raise ValueError: if a name is not in the mapping files or a sort option is unknown
+    """
+    regions = regions or list(get_mapping_index(TOKYO_REGION_CODE_MAPPING_FILE_NAME))
+    food_types = food_types or list(get_mapping_index(CATEGORY_CODE_MAPPING_FILE_NAME))
+    check_names_in_mapping(regions, TOKYO_REGION_CODE_MAPPING_FILE_NAME)
+    check_names_in_mapping(food_types, CATEGORY_CODE_MAPPING_FILE_NAME)
+    unknown_sort_options = [sort_option for sort_option in sort_options if sort_option not in SORT_OPTIONS]
+    if unknown_sort_options:
+        raise ValueError(f"Unknown sort options: {', '.join(unknown_sort_options)}")
+    return [
+        (region, food_type, sort_option)
+        for region in regions
+        for food_type in food_types
+        for sort_option in sort_options
+    ]
+
+
+def check_names_in_mapping(names, mapping_file_path):
+    index = get_mapping_index(mapping_file_path)
+    unknown_names = [name for name in names if name not in index]
+    if unknown_names:
+        raise ValueError(f"Not in {mapping_file_path}: {', '.join(unknown_names)}")
+
+
+def prioritize_combinations(combinations, now=None):
+    """
+    :return: a list of (priority, combination), highest priority first, without the
+    combinations filled less than CACHE_WARMING_MIN_AGE_SECONDS ago.
+    The priority grows with the popularity, and with the age up to RATINGS_CACHE_TTL_SECONDS.
+    """
+    now = now or time.time()
+    prioritized_combinations = []
+    for combination, (popularity, last_filled_time) in zip(
+        combinations, get_search_popularity_and_last_filled(combinations)
+    ):
+        age_seconds = RATINGS_CACHE_TTL_SECONDS if last_filled_time is None else now - last_filled_time
+        if age_seconds < CACHE_WARMING_MIN_AGE_SECONDS:
+            continue
+        priority = (1 + popularity) * min(age_seconds, RATINGS_CACHE_TTL_SECONDS) / RATINGS_CACHE_TTL_SECONDS
+        prioritized_combinations.append((priority, combination))
+    prioritized_combinations.sort(key=lambda item: item[0], reverse=True)
+    return prioritized_combinations
+
+
+def count_upstream_requests():
+    return sum(host_stats["requests"] for host_stats in get_connection_reuse_stats().values())
+
+
+def warm_combination(region, food_type, sort_option, request_budget):
+    """
+    Run the search of a combination, like the search stream does, filling its caches, and
+    marking them filled if it completes. Stops once request_budget upstream requests were made.
+    The search has no limit, so it completes only once all results are warmed.
+    :return: (number of restaurants found, True if the search completed)
+    """
+    start_date = date.today()
+    end_date = start_date + relativedelta(months=1)
+    cancellation_token = CancellationToken()
+    initial_request_count = count_upstream_requests()
+    events = search_restaurant_events(
+        [food_type],
+        [region],
+        sort_option,
+        start_date.strftime(DATE_FORMAT),
+        end_date.strftime(DATE_FORMAT),
+        CACHE_WARMING_NUM_PEOPLE,
+        1,
+        0,
+        None,
+        RestaurantFilters(),
+        LIVE_SEARCH_SOURCE,
+        cancellation_token,
+    )
+    restaurant_count = 0
+    try:
+        for event_type, _ in events:
+            if event_type == RESTAURANT_EVENT:
+                restaurant_count += 1
+            if count_upstream_requests() - initial_request_count >= request_budget:
+                # Requests already sent still complete and fill the caches
+                cancellation_token.cancel()
+    finally:
+        events.close()
+    return restaurant_count, not cancellation_token.is_cancelled
+
+
+def warm_caches(combinations, request_budget):
+    """
+    Warm the caches of the combinations by priority until request_budget is spent.
+    :return: the number of upstream requests made
+    """
+    initial_request_count = count_upstream_requests()
+    prioritized_combinations = prioritize_combinations(combinations)
+    print(f"🔥 Warming caches: {len(prioritized_combinations)} of {len(combinations)} combinations are due, "
+          f"budget of {request_budget} upstream requests")
+    for priority, (region, food_type, sort_option) in prioritized_combinations:
+        request_budget_left = request_budget - (count_upstream_requests() - initial_request_count)
+        if request_budget_left <= 0:
+            break
+        try:
+            restaurant_count, is_complete = warm_combination(region, food_type, sort_option, request_budget_left)
+        except Exception as error:
+            print(f"❌ Error in warming {region} × {food_type} ({sort_option}): ", error)
+            continue
+        print(f"✅ Warmed {region} × {food_type} ({sort_option}), priority {priority:.2f}: "
+              f"{restaurant_count} restaurants{'' if is_complete else ', stopped by the budget'}")
+    return count_upstream_requests() - initial_request_count
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prefill the search caches of popular searches.")
+    parser.add_argument("--budget", type=int, default=CACHE_WARMING_REQUEST_BUDGET,
+                        help="most upstream requests to make")
+    parser.add_argument("--regions", nargs="+", default=CACHE_WARMING_REGIONS,
+                        help="Japanese names of tokyo_region_code_mapping.json, all by default")
+    parser.add_argument("--food-types", nargs="+", default=CACHE_WARMING_FOOD_TYPES,
+                        help="Japanese names of category_code_mapping.json, all by default")
+    parser.add_argument("--sort-options", nargs="+", default=CACHE_WARMING_SORT_OPTIONS,
+                        help=f"any of {', '.join(SORT_OPTIONS)}")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only print the combinations due, by priority")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        combinations = get_warming_combinations(args.regions, args.food_types, args.sort_options)
+    except ValueError as error:
+        raise SystemExit(f"❌ {error}")
+
+    if args.dry_run:
+        for priority, combination in prioritize_combinations(combinations):
+            print(f"{priority:.2f}", *combination)
+        return
+
+    request_count = warm_caches(combinations, args.budget)
+    decay_search_popularity()
+    print(f"🔥 Cache warming done with {request_count} upstream requests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import pytest
+
+from utils import debug_capture
+
+
+@pytest.fixture
+def captured_urls(monkeypatch):
+    captured_urls = []
+    monkeypatch.setattr(debug_capture, "start_writer_thread", lambda: None)
+    monkeypatch.setattr(
+        debug_capture._capture_queue, "put_nowait", lambda capture: captured_urls.append(capture[2])
+    )
+    return captured_urls
+
+
+def test_nothing_is_captured_by_default(monkeypatch, captured_urls):
+    monkeypatch.setattr(debug_capture, "DEBUG_CAPTURE_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(debug_capture, "DEBUG_CAPTURE_PARSE_FAILURES", False)
+
+    debug_capture.capture_response("<html></html>", "ikyu_search", "https://example.com/1")
+    debug_capture.capture_response("<html></html>", "ikyu_search", "https://example.com/2", is_parse_failure=True)
+
+    assert captured_urls == []
+
+
+def test_parse_failures_are_captured_when_enabled(monkeypatch, captured_urls):
+    monkeypatch.setattr(debug_capture, "DEBUG_CAPTURE_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(debug_capture, "DEBUG_CAPTURE_PARSE_FAILURES", True)
+
+    debug_capture.capture_response("<html></html>", "ikyu_search", "https://example.com/1")
+    debug_capture.capture_response("<html></html>", "ikyu_search", "https://example.com/2", is_parse_failure=True)
+
+    assert captured_urls == ["https://example.com/2"]
+
+
+def test_sampled_responses_are_captured(monkeypatch, captured_urls):
+    monkeypatch.setattr(debug_capture, "DEBUG_CAPTURE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(debug_capture, "DEBUG_CAPTURE_PARSE_FAILURES", False)
+
+    debug_capture.capture_response("<html></html>", "ikyu_search", "https://example.com/1")
+
+    assert captured_urls == ["https://example.com/1"]
@@ -0,0 +1,42 @@
+import pytest
+import requests
+
+from config import RATINGS_NOT_FOUND_CACHE_TTL_SECONDS
+from utils import google_search_utils
+
+
+def make_response(status_code, content):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.url = "https://places.googleapis.com/v1/places:searchText"
+    return response
+
+
+@pytest.fixture
+def cached_values(monkeypatch):
+    cached_values = {}
+    monkeypatch.setattr(
+        google_search_utils, "tiered_cache_set",
+        lambda cache_key, value, ttl_seconds: cached_values.__setitem__(cache_key, (value, ttl_seconds)),
+    )
+    return cached_values
+
+
+def fake_places_response(monkeypatch, response):
+    monkeypatch.setattr(google_search_utils, "get_response_from_google_place_text_search_api", lambda text_query: response)
+
+
+def test_error_status_raises_without_caching(monkeypatch, cached_values):
+    fake_places_response(monkeypatch, make_response(503, b"<html>Service Unavailable</html>"))
+
+    with pytest.raises(requests.HTTPError):
+        google_search_utils.fetch_google_data("key", "鮨 はしもと")
+    assert cached_values == {}
+
+
+def test_not_found_is_cached(monkeypatch, cached_values):
+    fake_places_response(monkeypatch, make_response(200, b"{}"))
+
+    assert google_search_utils.fetch_google_data("key", "鮨 はしもと") is None
+    assert cached_values == {"key": (None, RATINGS_NOT_FOUND_CACHE_TTL_SECONDS)}
@@ -0,0 +1,61 @@
+
+import os
+
+import pytest
+
+from utils.constants import *
+from utils.file_utils import read_content_from_file
+from utils.html_parsers import PAGE_EXTRACTORS, BeautifulSoupHtmlParser, SelectolaxHtmlParser
+
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(__file__), "fixtures")
+# Page type -> saved page
+FIXTURE_PAGES = {
+    "ikyu": os.path.join(FIXTURES_DIRECTORY, "ikyu_search_page.html"),
+    "tabelog": os.path.join(FIXTURES_DIRECTORY, "tabelog_search_page.html"),
+}
+
+
+def read_fixture_page(page_type):
+    return read_content_from_file(FIXTURE_PAGES[page_type])
+
+
+@pytest.mark.parametrize("page_type", sorted(PAGE_EXTRACTORS))
+def test_backends_extract_the_same_data(page_type):
+    html = read_fixture_page(page_type)
+    extract = PAGE_EXTRACTORS[page_type]
+
+    beautifulsoup_result = extract(BeautifulSoupHtmlParser(), html)
+
+    assert beautifulsoup_result
+    assert extract(SelectolaxHtmlParser(), html) == beautifulsoup_result
+
+
+def test_ikyu_search_cards():
+    cards = PAGE_EXTRACTORS["ikyu"](SelectolaxHtmlParser(), read_fixture_page("ikyu"))
+
+    assert [href for href, _ in cards] == [
+        "/108103?visitorsCount=2&pndt=1",
+        "/100212?visitorsCount=2&pndt=1",
+        "/117845?visitorsCount=2&pndt=1",
+        "/105512?visitorsCount=2&pndt=1&plan=1",
+        "/109656?visitorsCount=2&pndt=1",
+    ]
+    assert cards[0][1] == {
+        RESTAURANT_NAME: "鮨 はしもと",
+        FOOD_TYPE: "寿司",
+        RATING: "4.68",
+        COVER_IMAGE_URL: "https://img.ikyu.com/rsDatas/rsData108103/r108103_1.jpg",
+    }
+    # Not rated, image without src, description without food type
+    assert cards[2][1] == {RESTAURANT_NAME: "鮨 一心 & 酒", FOOD_TYPE: "Unknown", RATING: None, COVER_IMAGE_URL: None}
+
+
+def test_tabelog_restaurants():
+    restaurants = PAGE_EXTRACTORS["tabelog"](SelectolaxHtmlParser(), read_fixture_page("tabelog"))
+
+    assert restaurants == [
+        ("鮨 はしもと", "https://tabelog.com/tokyo/A1301/A130101/13123456/", "4.12"),
+        ("鮨 はしもと 別館", "https://tabelog.com/tokyo/A1301/A130101/13012345/", "3.58"),
+        ("はしもと鮨店", "https://tabelog.com/tokyo/A1301/A130103/13298765/", None),
+        ("すし処 はし本", "https://tabelog.com/tokyo/A1301/A130102/13055555/", None),
+    ]
@@ -0,0 +1,105 @@
+import asyncio
+
+import aiohttp
+import pytest
+import requests
+
+from config import HTTP_MAX_RETRIES
+from utils import async_network, http_client
+
+
+def make_response(status_code, content=b"<html></html>"):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.url = "https://restaurant.ikyu.com/search"
+    return response
+
+
+class FakeSession:
+    """
+    Returns the responses of status_codes in turn, for both http clients.
+    """
+
+    def __init__(self, status_codes):
+        self.status_codes = list(status_codes)
+        self.request_count = 0
+
+    def next_status_code(self):
+        self.request_count += 1
+        return self.status_codes.pop(0)
+
+    def get(self, url, headers=None, timeout=None):
+        return make_response(self.next_status_code())
+
+
+class FakeAsyncResponse:
+    def __init__(self, status):
+        self.status = status
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(None, (), status=self.status)
+
+    async def read(self):
+        return b"<html></html>"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeAsyncSession(FakeSession):
+    def get(self, url, headers=None):
+        return FakeAsyncResponse(self.next_status_code())
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(http_client, "get_retry_backoff_seconds", lambda attempt: 0)
+    monkeypatch.setattr(async_network, "get_retry_backoff_seconds", lambda attempt: 0)
+
+
+def test_http_get_retries_throttled_responses(monkeypatch):
+    session = FakeSession([429, 503, 200])
+    monkeypatch.setattr(http_client, "get_session_for_url", lambda url: session)
+
+    assert http_client.http_get("https://restaurant.ikyu.com/search").status_code == 200
+    assert session.request_count == 3
+
+
+def test_http_get_raises_on_the_last_throttled_response(monkeypatch):
+    session = FakeSession([429] * (HTTP_MAX_RETRIES + 1))
+    monkeypatch.setattr(http_client, "get_session_for_url", lambda url: session)
+
+    with pytest.raises(requests.HTTPError):
+        http_client.http_get("https://restaurant.ikyu.com/search")
+    assert session.request_count == HTTP_MAX_RETRIES + 1
+
+
+def test_http_get_raises_on_other_error_statuses_without_retrying(monkeypatch):
+    session = FakeSession([403])
+    monkeypatch.setattr(http_client, "get_session_for_url", lambda url: session)
+
+    with pytest.raises(requests.HTTPError):
+        http_client.http_get("https://restaurant.ikyu.com/search")
+    assert session.request_count == 1
+
+
+def test_http_get_content_async_retries_throttled_responses(monkeypatch):
+    session = FakeAsyncSession([502, 200])
+    monkeypatch.setattr(async_network, "get_async_session", lambda: session)
+
+    assert asyncio.run(async_network.http_get_content_async("https://restaurant.ikyu.com/search")) == b"<html></html>"
+    assert session.request_count == 2
+
+
+def test_http_get_content_async_raises_on_the_last_throttled_response(monkeypatch):
+    session = FakeAsyncSession([429] * (HTTP_MAX_RETRIES + 1))
+    monkeypatch.setattr(async_network, "get_async_session", lambda: session)
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(async_network.http_get_content_async("https://restaurant.ikyu.com/search"))
+    assert session.request_count == HTTP_MAX_RETRIES + 1
@@ -0,0 +1,86 @@
+import datetime
+
+from utils.ikyu_availability_utils import NO_PRICE, MealAvailability, date_string_to_ordinal
+
+AVAILABILITY_JSON = {
+    "2025-03-10": 30000,
+    "2025-03-01": 25000,
+    "2025-03-05": None,
+    "2025-03-20": 18000,
+}
+
+
+def test_from_dict_sorts_dates_and_keeps_missing_prices():
+    availability = MealAvailability.from_dict(AVAILABILITY_JSON)
+
+    assert availability.to_dict() == {
+        "2025-03-01": 25000,
+        "2025-03-05": None,
+        "2025-03-10": 30000,
+        "2025-03-20": 18000,
+    }
+    assert availability.prices[1] == NO_PRICE
+
+
+def test_from_items_stores_prices_as_integers():
+    availability = MealAvailability.from_items([(date_string_to_ordinal("2025-03-01"), 25000.0)])
+
+    assert availability.to_dict() == {"2025-03-01": 25000}
+
+
+def test_json_round_trip():
+    availability = MealAvailability.from_dict(AVAILABILITY_JSON)
+
+    assert MealAvailability.from_json(availability.to_json()) == availability
+    assert MealAvailability.from_json(MealAvailability().to_json()) == MealAvailability()
+
+
+def test_filter_range_includes_both_boundaries():
+    availability = MealAvailability.from_dict(AVAILABILITY_JSON)
+
+    assert availability.filter_range("2025-03-05", "2025-03-10").to_dict() == {
+        "2025-03-05": None,
+        "2025-03-10": 30000,
+    }
+    assert availability.filter_range("2025-03-02", "2025-03-04").to_dict() == {}
+    assert availability.filter_range("2025-03-21", "2025-04-30").to_dict() == {}
+    assert MealAvailability().filter_range("2025-03-01", "2025-03-31").to_dict() == {}
+
+
+def test_latest_date():
+    assert MealAvailability.from_dict(AVAILABILITY_JSON).latest_date() == "2025-03-20"
+    assert MealAvailability().latest_date() is None
+
+
+def test_has_available_dates_after():
+    availability = MealAvailability.from_dict(AVAILABILITY_JSON)
+
+    assert availability.has_available_dates_after("2025-03-19")
+    assert not availability.has_available_dates_after("2025-03-20")
+    assert not MealAvailability().has_available_dates_after("2025-03-01")
+
+
+def test_count_available_in_next_days():
+    availability = MealAvailability.from_dict(AVAILABILITY_JSON)
+    today = datetime.date(2025, 3, 5)
+
+    # 2025-03-05 to 2025-03-10
+    assert availability.count_available_in_next_days(6, today) == 2
+    assert availability.count_available_in_next_days(5, today) == 1
+    assert availability.count_available_in_next_days(0, today) == 0
+    assert MealAvailability().count_available_in_next_days(30, today) == 0
+
+
+def test_first_price():
+    assert MealAvailability.from_dict(AVAILABILITY_JSON).first_price() == 25000
+    assert MealAvailability.from_dict({"2025-03-01": None, "2025-03-02": 10000}).first_price() is None
+    assert MealAvailability().first_price() is None
+
+
+def test_min_price_skips_missing_prices():
+    availability = MealAvailability.from_dict(AVAILABILITY_JSON)
+
+    assert availability.min_price() == 18000
+    assert availability.min_price("2025-03-01", "2025-03-10") == 25000
+    assert availability.min_price("2025-03-05", "2025-03-05") is None
+    assert MealAvailability().min_price() is None
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from config import SEARCH_PAGE_CACHE_TTL_SECONDS, SEARCH_PAGE_EMPTY_CACHE_TTL_SECONDS
+from utils import ikyu_search_utils
+from utils.constants import *
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.ttl_seconds = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+        self.ttl_seconds[key] = ex
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(ikyu_search_utils, "redis_client", fake_redis)
+    return fake_redis
+
+
+def fake_search_pages(monkeypatch, restaurants):
+    async def get_response_html_from_url_with_headers_async(url):
+        return "<html></html>"
+
+    monkeypatch.setattr(ikyu_search_utils, "get_response_html_from_url_with_headers", lambda url: "<html></html>")
+    monkeypatch.setattr(
+        ikyu_search_utils, "get_response_html_from_url_with_headers_async", get_response_html_from_url_with_headers_async
+    )
+    monkeypatch.setattr(ikyu_search_utils, "parse_search_page_cards", lambda response, url: restaurants)
+
+
+@pytest.mark.parametrize("restaurants, ttl_seconds", [
+    ([{IKYU_ID: "108103"}], SEARCH_PAGE_CACHE_TTL_SECONDS),
+    ([], SEARCH_PAGE_EMPTY_CACHE_TTL_SECONDS),
+])
+def test_search_page_cache_ttl(monkeypatch, fake_redis, restaurants, ttl_seconds):
+    fake_search_pages(monkeypatch, restaurants)
+
+    assert ikyu_search_utils.load_search_page_cards("https://restaurant.ikyu.com/search", "key") == restaurants
+    assert fake_redis.ttl_seconds == {"key": ttl_seconds}
+
+
+@pytest.mark.parametrize("restaurants, ttl_seconds", [
+    ([{IKYU_ID: "108103"}], SEARCH_PAGE_CACHE_TTL_SECONDS),
+    ([], SEARCH_PAGE_EMPTY_CACHE_TTL_SECONDS),
+])
+def test_search_page_cache_ttl_async(monkeypatch, fake_redis, restaurants, ttl_seconds):
+    fake_search_pages(monkeypatch, restaurants)
+
+    assert asyncio.run(
+        ikyu_search_utils.load_search_page_cards_async("https://restaurant.ikyu.com/search", "key")
+    ) == restaurants
+    assert fake_redis.ttl_seconds == {"key": ttl_seconds}
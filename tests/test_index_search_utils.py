@@ -0,0 +1,120 @@
+import pytest
+
+from config import IKYU_SEARCH_CARDS_PER_PAGE
+from utils import index_search_utils
+from utils.constants import *
+from utils.index_search_utils import INDEX_SEARCH_SOURCE, find_indexed_restaurants
+from utils.restaurant_filters import RestaurantFilters
+from utils.restaurant_index import RestaurantIndex
+
+from test_restaurant_index import make_indexed_restaurant
+
+START_DATE = "2024-05-01"
+END_DATE = "2024-05-31"
+SEARCH = ("top-picks", 2)
+RESTAURANT_COUNT = 40
+
+
+@pytest.fixture
+def restaurant_index(tmp_path, monkeypatch):
+    restaurant_index = RestaurantIndex(str(tmp_path / "index.sqlite3"))
+    monkeypatch.setattr(index_search_utils, "restaurant_index", restaurant_index)
+    # Region and cuisine names are their own codes
+    monkeypatch.setattr(index_search_utils, "convert_tokyo_sub_regions_in_japanese_to_location_code", list)
+    monkeypatch.setattr(index_search_utils, "convert_food_types_in_japanese_to_code", list)
+    return restaurant_index
+
+
+@pytest.fixture
+def scheduled_refreshes(monkeypatch):
+    scheduled_refreshes = []
+    monkeypatch.setattr(
+        index_search_utils, "schedule_coverage_refresh", lambda *args: scheduled_refreshes.append(args)
+    )
+    monkeypatch.setattr(
+        index_search_utils, "schedule_calendars_refresh", lambda ikyu_ids: scheduled_refreshes.append(ikyu_ids)
+    )
+    return scheduled_refreshes
+
+
+def index_restaurants(restaurant_index, has_more):
+    """
+    Index RESTAURANT_COUNT restaurants with ikyu ids "0" to "39", the even ones available in May.
+    """
+    restaurant_index.replace_coverage(
+        "A001", "C01", *SEARCH,
+        [
+            make_indexed_restaurant(str(rank), ["2024-05-10"] if rank % 2 == 0 else [])
+            for rank in range(RESTAURANT_COUNT)
+        ],
+        has_more=has_more,
+    )
+
+
+def find(start_page=1, start_card=0, limit=None, restaurant_filters=None):
+    return find_indexed_restaurants(
+        ["A001"], ["C01"], "top-picks", START_DATE, END_DATE, 2,
+        start_page, start_card, limit, restaurant_filters or RestaurantFilters(),
+    )
+
+
+def get_ikyu_ids(restaurants):
+    return [restaurant[IKYU_ID] for restaurant in restaurants]
+
+
+def test_search_not_indexed_falls_back_to_ikyu(restaurant_index, scheduled_refreshes):
+    assert find(limit=10) is None
+    assert scheduled_refreshes == [("A001", "C01", *SEARCH)]
+
+
+def test_search_not_indexed_anymore_ends_mid_pagination(restaurant_index, scheduled_refreshes):
+    assert find(start_page=2, start_card=3, limit=10) == ([], 0, {})
+
+
+def test_slices_follow_each_other(restaurant_index, scheduled_refreshes):
+    index_restaurants(restaurant_index, has_more=False)
+
+    restaurants, skipped_count, next_position = find(limit=20)
+    assert get_ikyu_ids(restaurants) == [str(rank) for rank in range(20)]
+    assert skipped_count == 0
+    assert next_position == {"source": INDEX_SEARCH_SOURCE, "page": 2, "card": 20 - IKYU_SEARCH_CARDS_PER_PAGE}
+
+    restaurants, _, next_position = find(next_position["page"], next_position["card"], limit=20)
+    assert get_ikyu_ids(restaurants) == [str(rank) for rank in range(20, RESTAURANT_COUNT)]
+    assert next_position == {}
+    assert scheduled_refreshes == []
+
+
+def test_restaurants_have_their_availability(restaurant_index, scheduled_refreshes):
+    index_restaurants(restaurant_index, has_more=False)
+
+    restaurant = find(limit=1)[0][0]
+
+    assert restaurant[AVAILABILITY][DINNER].to_dict() == {"2024-05-10": 30000}
+    assert DINNER_PRICE in restaurant and LUNCH_PRICE in restaurant
+
+
+def test_first_slice_past_the_indexed_results_falls_back_to_ikyu(restaurant_index, scheduled_refreshes):
+    index_restaurants(restaurant_index, has_more=True)
+
+    assert find(limit=RESTAURANT_COUNT + 1) is None
+    assert find(limit=RESTAURANT_COUNT) is not None
+
+
+def test_later_slice_past_the_indexed_results_ends_with_them(restaurant_index, scheduled_refreshes):
+    index_restaurants(restaurant_index, has_more=True)
+
+    restaurants, _, next_position = find(start_page=3, start_card=0, limit=10)
+
+    assert get_ikyu_ids(restaurants) == [str(rank) for rank in range(2 * IKYU_SEARCH_CARDS_PER_PAGE, RESTAURANT_COUNT)]
+    assert next_position == {}
+
+
+def test_has_availability_leaves_out_restaurants_in_the_index(restaurant_index, scheduled_refreshes):
+    index_restaurants(restaurant_index, has_more=False)
+
+    restaurants, skipped_count, next_position = find(limit=5, restaurant_filters=RestaurantFilters(has_availability=True))
+
+    assert get_ikyu_ids(restaurants) == ["0", "2", "4", "6", "8"]
+    assert skipped_count == RESTAURANT_COUNT // 2
+    assert next_position == {"source": INDEX_SEARCH_SOURCE, "page": 1, "card": 5}
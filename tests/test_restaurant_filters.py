@@ -0,0 +1,73 @@
+import pytest
+
+from utils.constants import *
+from utils.ikyu_availability_utils import MealAvailability
+from utils.restaurant_filters import RestaurantFilters, parse_restaurant_filters_from_args
+
+START_DATE = "2024-05-01"
+END_DATE = "2024-05-31"
+
+
+def make_restaurant(lunch=None, dinner=None, hard_to_reserve=False):
+    """
+    :param lunch: {"YYYY-MM-DD": price} of the available lunches, None if the restaurant has no lunch
+    """
+    availability = {
+        meal: MealAvailability.from_dict(meal_availability)
+        for meal, meal_availability in [(LUNCH, lunch), (DINNER, dinner)]
+        if meal_availability is not None
+    }
+    availability[HARD_TO_RESERVE] = hard_to_reserve
+    return {AVAILABILITY: availability}
+
+
+def test_no_filters_match_fully_booked_restaurants():
+    restaurant_filters = RestaurantFilters()
+
+    assert restaurant_filters.matches(make_restaurant(lunch={}, dinner={}), START_DATE, END_DATE)
+    assert restaurant_filters.matches(make_restaurant(), START_DATE, END_DATE)
+
+
+def test_has_availability_needs_an_available_date_between_the_dates():
+    restaurant_filters = RestaurantFilters(has_availability=True)
+
+    assert restaurant_filters.matches(make_restaurant(dinner={"2024-05-10": 30000}), START_DATE, END_DATE)
+    assert not restaurant_filters.matches(make_restaurant(dinner={"2024-06-10": 30000}), START_DATE, END_DATE)
+    assert not restaurant_filters.matches(make_restaurant(lunch={}, dinner={}), START_DATE, END_DATE)
+
+
+def test_meal_type_needs_the_meal():
+    restaurant_filters = RestaurantFilters(meal_type=LUNCH)
+
+    assert restaurant_filters.matches(make_restaurant(lunch={"2024-05-10": 8000}), START_DATE, END_DATE)
+    assert not restaurant_filters.matches(make_restaurant(dinner={"2024-05-10": 30000}), START_DATE, END_DATE)
+
+
+def test_max_price_is_checked_on_its_meal_between_the_dates():
+    restaurant_filters = RestaurantFilters(max_dinner_price=20000)
+    restaurant = make_restaurant(lunch={"2024-05-10": 8000}, dinner={"2024-05-10": 30000, "2024-06-10": 15000})
+
+    assert not restaurant_filters.matches(restaurant, START_DATE, END_DATE)
+    assert restaurant_filters.matches(restaurant, START_DATE, "2024-06-30")
+
+
+def test_hard_to_reserve_applies_without_meal_filters():
+    restaurant_filters = RestaurantFilters(hard_to_reserve=True)
+
+    assert restaurant_filters.matches(make_restaurant(lunch={}, hard_to_reserve=True), START_DATE, END_DATE)
+    assert not restaurant_filters.matches(make_restaurant(lunch={}, hard_to_reserve=False), START_DATE, END_DATE)
+
+
+def test_parse_restaurant_filters_from_args():
+    restaurant_filters = parse_restaurant_filters_from_args(
+        {"hasAvailability": "true", "mealType": DINNER, "maxDinnerPrice": "20000", "hardToReserve": "0"}
+    )
+
+    assert restaurant_filters.to_key() == [True, DINNER, None, 20000, False]
+    assert parse_restaurant_filters_from_args({}).to_key() == RestaurantFilters().to_key()
+
+
+@pytest.mark.parametrize("args", [{"mealType": "brunch"}, {"maxLunchPrice": "-1"}, {"hasAvailability": "maybe"}])
+def test_parse_restaurant_filters_from_args_rejects_invalid_filters(args):
+    with pytest.raises(ValueError):
+        parse_restaurant_filters_from_args(args)
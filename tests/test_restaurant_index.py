@@ -0,0 +1,82 @@
+from utils.constants import *
+from utils.ikyu_availability_utils import MealAvailability, date_string_to_ordinal
+from utils.ikyu_parse_utils import build_calendar_summary
+from utils.restaurant_index import RestaurantIndex
+
+SEARCH = ("top-picks", 2)
+
+
+def make_indexed_restaurant(ikyu_id, available_dates=()):
+    """
+    :return: (ikyu_id, restaurant info, calendar summary) with dinner on available_dates
+    """
+    calendar_summary = build_calendar_summary(
+        {DINNER: MealAvailability.from_dict({date: 30000 for date in available_dates})}
+    )
+    return ikyu_id, {IKYU_ID: ikyu_id, RESTAURANT_NAME: f"Restaurant {ikyu_id}"}, calendar_summary
+
+
+def get_ikyu_ids(rows):
+    return [ikyu_id for ikyu_id, _, _, _ in rows]
+
+
+def test_replace_coverage_replaces_the_results_of_the_search(tmp_path):
+    restaurant_index = RestaurantIndex(str(tmp_path / "index.sqlite3"))
+    restaurant_index.replace_coverage(
+        "A001", "C01", *SEARCH, [make_indexed_restaurant(ikyu_id) for ikyu_id in ["1", "2", "3"]], has_more=True
+    )
+    restaurant_index.replace_coverage(
+        "A001", "C01", *SEARCH, [make_indexed_restaurant(ikyu_id) for ikyu_id in ["3", "4"]], has_more=False
+    )
+
+    rows = restaurant_index.find_restaurants(["A001"], ["C01"], *SEARCH)
+    assert get_ikyu_ids(rows) == ["3", "4"]
+    assert rows[0][1] == {IKYU_ID: "3", RESTAURANT_NAME: "Restaurant 3"}
+    assert restaurant_index.count_restaurants(["A001"], ["C01"], *SEARCH) == 2
+    (refreshed_at, has_more), = restaurant_index.get_coverages(["A001"], ["C01"], *SEARCH).values()
+    assert has_more is False
+    # Other sort options and numbers of people are other searches
+    assert restaurant_index.find_restaurants(["A001"], ["C01"], "top-picks", 4) == []
+    assert restaurant_index.get_coverages(["A001"], ["C01"], "top-picks", 4) == {}
+
+
+def test_find_restaurants_orders_by_best_rank_across_combinations(tmp_path):
+    restaurant_index = RestaurantIndex(str(tmp_path / "index.sqlite3"))
+    restaurant_index.replace_coverage(
+        "A001", "C01", *SEARCH, [make_indexed_restaurant(ikyu_id) for ikyu_id in ["30", "20", "10"]], has_more=False
+    )
+    restaurant_index.replace_coverage(
+        "A002", "C01", *SEARCH, [make_indexed_restaurant(ikyu_id) for ikyu_id in ["25", "10"]], has_more=False
+    )
+    restaurant_index.replace_coverage(
+        "A003", "C01", *SEARCH, [make_indexed_restaurant("99")], has_more=False
+    )
+
+    rows = restaurant_index.find_restaurants(["A001", "A002"], ["C01"], *SEARCH)
+
+    # Rank 0: 25 and 30, by ikyu id; rank 1: 10 (ranked 2 in A001) and 20
+    assert get_ikyu_ids(rows) == ["25", "30", "10", "20"]
+    assert restaurant_index.count_restaurants(["A001", "A002"], ["C01"], *SEARCH) == 4
+
+
+def test_find_restaurants_available_between(tmp_path):
+    restaurant_index = RestaurantIndex(str(tmp_path / "index.sqlite3"))
+    restaurant_index.replace_coverage(
+        "A001", "C01", *SEARCH,
+        [
+            make_indexed_restaurant("1", ["2024-05-10"]),
+            make_indexed_restaurant("2", ["2024-06-10"]),
+            make_indexed_restaurant("3", []),
+        ],
+        has_more=False,
+    )
+    may = (date_string_to_ordinal("2024-05-01"), date_string_to_ordinal("2024-05-31"))
+
+    assert get_ikyu_ids(restaurant_index.find_restaurants(["A001"], ["C01"], *SEARCH, available_between=may)) == ["1"]
+
+    _, _, calendar_summary = make_indexed_restaurant("3", ["2024-05-20"])
+    restaurant_index.update_calendar_summaries([("3", calendar_summary)])
+
+    assert get_ikyu_ids(
+        restaurant_index.find_restaurants(["A001"], ["C01"], *SEARCH, available_between=may)
+    ) == ["1", "3"]
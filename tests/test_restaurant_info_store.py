@@ -0,0 +1,83 @@
+import sqlite3
+import time
+
+from utils.restaurant_info_store import RestaurantInfoStore
+
+
+def read_ikyu_ids_on_disk(db_path):
+    connection = sqlite3.connect(db_path)
+    try:
+        return [ikyu_id for ikyu_id, in connection.execute("SELECT ikyu_id FROM restaurant_info ORDER BY ikyu_id")]
+    finally:
+        connection.close()
+
+
+class ReadingConnection:
+    """
+    A connection that reads the store while flushing, before the write is committed.
+    """
+
+    def __init__(self, connection, store, ikyu_ids):
+        self.connection = connection
+        self.store = store
+        self.ikyu_ids = ikyu_ids
+        self.read_while_flushing = None
+
+    def executemany(self, *args):
+        self.read_while_flushing = self.store.get_many(self.ikyu_ids)
+        return self.connection.executemany(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def __enter__(self):
+        return self.connection.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.connection.__exit__(*exc_info)
+
+
+def test_writes_are_readable_before_and_after_flushing(tmp_path):
+    db_path = str(tmp_path / "restaurant_info.sqlite3")
+    store = RestaurantInfoStore(db_path, ttl_seconds=60, batch_size=2, flush_interval_seconds=60)
+
+    store.put("1", {"name": "鮨 はしもと"})
+    assert store.get("1") == {"name": "鮨 はしもと"}
+    assert read_ikyu_ids_on_disk(db_path) == []
+
+    store.put("2", {"name": "銀座 久兵衛"})
+    assert read_ikyu_ids_on_disk(db_path) == ["1", "2"]
+    assert store.get_many(["1", "2", "3"]) == {"1": {"name": "鮨 はしもと"}, "2": {"name": "銀座 久兵衛"}}
+
+
+def test_writes_stay_readable_while_flushing(tmp_path, monkeypatch):
+    store = RestaurantInfoStore(str(tmp_path / "restaurant_info.sqlite3"), ttl_seconds=60, flush_interval_seconds=60)
+    store.put("1", {"name": "鮨 はしもと"})
+    connection = ReadingConnection(store._get_connection(), store, ["1"])
+    monkeypatch.setattr(store, "_get_connection", lambda: connection)
+
+    store.flush()
+
+    assert connection.read_while_flushing == {"1": {"name": "鮨 はしもと"}}
+
+
+def test_writes_are_flushed_after_the_interval_without_another_put(tmp_path):
+    db_path = str(tmp_path / "restaurant_info.sqlite3")
+    store = RestaurantInfoStore(db_path, ttl_seconds=60, flush_interval_seconds=0.05)
+    assert store.get("1") == {}
+
+    store.put("1", {"name": "鮨 はしもと"})
+
+    deadline = time.monotonic() + 5
+    while read_ikyu_ids_on_disk(db_path) != ["1"]:
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+def test_expired_entries_are_not_returned(tmp_path):
+    store = RestaurantInfoStore(str(tmp_path / "restaurant_info.sqlite3"), ttl_seconds=60)
+    store.put("1", {"name": "鮨 はしもと"}, ttl_seconds=-1)
+
+    assert store.get("1") == {}
+    store.flush()
+    assert store.get("1") == {}
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from utils.index_search_utils import INDEX_SEARCH_SOURCE, LIVE_SEARCH_SOURCE
+from utils.search_cursor import decode_search_cursor, encode_search_cursor
+from utils.search_stream_utils import parse_search_stream_args
+
+
+def test_cursor_round_trip():
+    assert decode_search_cursor(encode_search_cursor({"page": 3, "card": 7})) == {
+        "source": LIVE_SEARCH_SOURCE, "page": 3, "card": 7,
+    }
+    assert decode_search_cursor(encode_search_cursor({"source": INDEX_SEARCH_SOURCE, "page": 2, "card": 0})) == {
+        "source": INDEX_SEARCH_SOURCE, "page": 2, "card": 0,
+    }
+
+
+def test_cursor_without_source_is_an_ikyu_position():
+    assert decode_search_cursor("WzIsNV0") == {"source": LIVE_SEARCH_SOURCE, "page": 2, "card": 5}
+
+
+@pytest.mark.parametrize("cursor", ["", "!!", "WzAsMF0", "WyJ4IiwxLDBd", "bnVsbA"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_search_cursor(cursor)
+
+
+def parse_args_with_cursor(source, position):
+    return parse_search_stream_args({
+        "locationsAndFoodTypes": json.dumps({"locations": ["銀座"], "foodTypes": ["寿司"]}),
+        "startDate": "2024-05-01",
+        "endDate": "2024-05-31",
+        "source": source,
+        "cursor": encode_search_cursor(position),
+    })
+
+
+def test_index_cursor_is_rejected_for_a_live_search():
+    search, error = parse_args_with_cursor(LIVE_SEARCH_SOURCE, {"source": INDEX_SEARCH_SOURCE, "page": 1, "card": 5})
+
+    assert search is None
+    assert error == "Invalid cursor for source=live."
+
+
+def test_ikyu_cursor_continues_an_index_search_on_ikyu():
+    search, error = parse_args_with_cursor(INDEX_SEARCH_SOURCE, {"page": 6, "card": 0})
+
+    assert error is None
+    assert (search["source"], search["start_page"], search["start_card"]) == (LIVE_SEARCH_SOURCE, 6, 0)
+
+
+def test_index_cursor_continues_an_index_search_in_the_index():
+    search, error = parse_args_with_cursor(INDEX_SEARCH_SOURCE, {"source": INDEX_SEARCH_SOURCE, "page": 1, "card": 5})
+
+    assert error is None
+    assert (search["source"], search["start_page"], search["start_card"]) == (INDEX_SEARCH_SOURCE, 1, 5)
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+import warm_cache
+from utils import search_popularity, search_stream_utils
+from utils.index_search_utils import INDEX_SEARCH_SOURCE, LIVE_SEARCH_SOURCE
+from utils.restaurant_filters import RestaurantFilters
+from utils.search_popularity import SEARCH_LAST_FILLED_KEY, SEARCH_POPULARITY_KEY, get_search_combination_member
+
+
+class FakeRedis:
+    def __init__(self):
+        self.sorted_sets = {}
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        return []
+
+    def zincrby(self, key, amount, member):
+        sorted_set = self.sorted_sets.setdefault(key, {})
+        sorted_set[member] = sorted_set.get(member, 0) + amount
+
+    def zadd(self, key, mapping):
+        self.sorted_sets.setdefault(key, {}).update(mapping)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(search_popularity, "redis_client", fake_redis)
+    return fake_redis
+
+
+def test_record_search_counts_popularity_only(fake_redis):
+    search_popularity.record_search(["銀座", "新橋"], ["寿司"], "top-picks")
+
+    assert fake_redis.sorted_sets == {
+        SEARCH_POPULARITY_KEY: {
+            get_search_combination_member("銀座", "寿司", "top-picks"): 1,
+            get_search_combination_member("新橋", "寿司", "top-picks"): 1,
+        },
+    }
+
+
+@pytest.mark.parametrize("locations, food_types, start_page, start_card, limit, source, is_cache_filling", [
+    (["銀座"], ["寿司"], 1, 0, None, LIVE_SEARCH_SOURCE, True),
+    (["銀座", "新橋"], ["寿司"], 1, 0, None, LIVE_SEARCH_SOURCE, False),
+    (["銀座"], ["寿司", "天ぷら"], 1, 0, None, LIVE_SEARCH_SOURCE, False),
+    (["銀座"], ["寿司"], 2, 0, None, LIVE_SEARCH_SOURCE, False),
+    (["銀座"], ["寿司"], 1, 0, 10, LIVE_SEARCH_SOURCE, False),
+    (["銀座"], ["寿司"], 1, 0, None, INDEX_SEARCH_SOURCE, False),
+])
+def test_is_cache_filling_search(locations, food_types, start_page, start_card, limit, source, is_cache_filling):
+    assert search_stream_utils.is_cache_filling_search(
+        locations, food_types, start_page, start_card, limit, source
+    ) is is_cache_filling
+
+
+def run_search_events_async(monkeypatch, search_error=None, limit=None):
+    async def search_restaurants_async_yield(*args):
+        if search_error is not None:
+            raise search_error
+        return
+        yield
+
+    monkeypatch.setattr(search_stream_utils, "search_restaurants_async_yield", search_restaurants_async_yield)
+
+    async def main():
+        return [
+            event
+            async for event in search_stream_utils.search_restaurant_events_async(
+                ["寿司"], ["銀座"], "top-picks", "2024-05-01", "2024-05-31", 2, 1, 0, limit,
+                RestaurantFilters(), LIVE_SEARCH_SOURCE,
+            )
+        ]
+
+    return asyncio.run(main())
+
+
+def test_complete_search_is_marked_filled(monkeypatch, fake_redis):
+    run_search_events_async(monkeypatch)
+
+    assert list(fake_redis.sorted_sets[SEARCH_LAST_FILLED_KEY]) == [
+        get_search_combination_member("銀座", "寿司", "top-picks")
+    ]
+
+
+def test_limited_search_is_not_marked_filled(monkeypatch, fake_redis):
+    run_search_events_async(monkeypatch, limit=10)
+
+    assert SEARCH_LAST_FILLED_KEY not in fake_redis.sorted_sets
+
+
+def test_failed_search_is_not_marked_filled(monkeypatch, fake_redis):
+    with pytest.raises(ValueError):
+        run_search_events_async(monkeypatch, ValueError("upstream error"))
+
+    assert SEARCH_LAST_FILLED_KEY not in fake_redis.sorted_sets
+
+
+def test_warm_combination_searches_without_limit(monkeypatch):
+    searches = []
+
+    def search_restaurant_events(*args):
+        searches.append(args)
+        yield from []
+
+    monkeypatch.setattr(warm_cache, "search_restaurant_events", search_restaurant_events)
+
+    assert warm_cache.warm_combination("銀座", "寿司", "top-picks", 30) == (0, True)
+    limit = searches[0][8]
+    assert limit is None
@@ -0,0 +1,216 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils import search_stream_hub as hub_module
+from utils.cancellation import get_cancellation_stats
+from utils.search_stream_hub import AsyncSearchStreamHub, SearchStreamHub
+from utils.single_flight import SingleFlight
+from utils.tiered_cache import CACHE_MISS
+
+
+@pytest.fixture
+def recorded_streams(monkeypatch):
+    """
+    Record search streams in a dict instead of the tiered cache.
+    """
+    recorded_streams = {}
+
+    async def tiered_cache_get_async(cache_key):
+        return recorded_streams.get(cache_key, CACHE_MISS)
+
+    async def tiered_cache_set_async(cache_key, value, ttl_seconds):
+        recorded_streams[cache_key] = list(value)
+
+    monkeypatch.setattr(hub_module, "SEARCH_STREAM_REPLAY_ENABLED", True)
+    monkeypatch.setattr(hub_module, "tiered_cache_get", lambda cache_key: recorded_streams.get(cache_key, CACHE_MISS))
+    monkeypatch.setattr(
+        hub_module, "tiered_cache_set",
+        lambda cache_key, value, ttl_seconds: recorded_streams.__setitem__(cache_key, list(value)),
+    )
+    monkeypatch.setattr(hub_module, "tiered_cache_get_async", tiered_cache_get_async)
+    monkeypatch.setattr(hub_module, "tiered_cache_set_async", tiered_cache_set_async)
+    return recorded_streams
+
+
+def wait_until(condition, timeout_seconds=5):
+    deadline = time.monotonic() + timeout_seconds
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+class GatedEvents:
+    """
+    Searches yielding the events 0, 1, 2, each once the test releases it.
+    """
+
+    def __init__(self):
+        self.gate = threading.Semaphore(0)
+        self.cancellation_tokens = []
+
+    def __call__(self, cancellation_token):
+        self.cancellation_tokens.append(cancellation_token)
+        for event in range(3):
+            self.gate.acquire(timeout=5)
+            if cancellation_token.is_cancelled:
+                return
+            yield event
+
+    def release(self, count=1):
+        for _ in range(count):
+            self.gate.release()
+
+
+def test_search_keeps_running_while_a_subscriber_is_left(recorded_streams):
+    hub = SearchStreamHub()
+    create_events = GatedEvents()
+    first = hub.subscribe("key", create_events)
+    second = hub.subscribe("key", create_events)
+    create_events.release()
+    assert next(first) == 0
+    assert next(second) == 0
+
+    first.close()
+    create_events.release(2)
+
+    assert list(second) == [1, 2]
+    assert len(create_events.cancellation_tokens) == 1
+    assert not create_events.cancellation_tokens[0].is_cancelled
+    assert recorded_streams == {"key": [0, 1, 2]}
+
+
+def test_search_is_cancelled_once_no_subscriber_is_left(recorded_streams):
+    hub = SearchStreamHub()
+    create_events = GatedEvents()
+    cancelled_search_count = get_cancellation_stats()["searches"]
+    first = hub.subscribe("key", create_events)
+    second = hub.subscribe("key", create_events)
+    create_events.release()
+    next(first)
+    next(second)
+
+    first.close()
+    second.close()
+    cancellation_token, = create_events.cancellation_tokens
+    assert cancellation_token.is_cancelled
+    assert hub.get_live_stream("key") is None
+
+    create_events.release()
+    wait_until(lambda: "key" not in hub._live_streams)
+    assert get_cancellation_stats()["searches"] == cancelled_search_count + 1
+    assert recorded_streams == {}
+
+
+def test_new_subscriber_replays_the_recorded_search(recorded_streams):
+    hub = SearchStreamHub()
+    create_events = GatedEvents()
+    create_events.release(3)
+    assert list(hub.subscribe("key", create_events)) == [0, 1, 2]
+
+    assert list(hub.subscribe("key", create_events)) == [0, 1, 2]
+    assert len(create_events.cancellation_tokens) == 1
+
+
+class AsyncGatedEvents:
+    """
+    Async equivalent of GatedEvents, created on the event loop of the test.
+    """
+
+    def __init__(self):
+        self.gate = asyncio.Semaphore(0)
+        self.search_count = 0
+
+    async def __call__(self):
+        self.search_count += 1
+        for event in range(3):
+            await self.gate.acquire()
+            yield event
+
+    def release(self, count=1):
+        for _ in range(count):
+            self.gate.release()
+
+
+def test_async_search_keeps_running_while_a_subscriber_is_left(recorded_streams):
+    async def main():
+        hub = AsyncSearchStreamHub()
+        create_events = AsyncGatedEvents()
+        first = hub.subscribe("key", create_events)
+        second = hub.subscribe("key", create_events)
+        create_events.release()
+        assert await anext(first) == 0
+        assert await anext(second) == 0
+
+        await first.aclose()
+        live_stream = hub.get_live_stream("key")
+        create_events.release(2)
+
+        assert [event async for event in second] == [1, 2]
+        assert not live_stream.is_cancelled
+        assert create_events.search_count == 1
+
+    asyncio.run(main())
+    assert recorded_streams == {"key": [0, 1, 2]}
+
+
+def test_async_search_is_cancelled_once_no_subscriber_is_left(recorded_streams):
+    async def main():
+        hub = AsyncSearchStreamHub()
+        create_events = AsyncGatedEvents()
+        first = hub.subscribe("key", create_events)
+        second = hub.subscribe("key", create_events)
+        create_events.release()
+        await anext(first)
+        await anext(second)
+        live_stream = hub.get_live_stream("key")
+
+        await first.aclose()
+        assert not live_stream.search_task.cancelled()
+        await second.aclose()
+
+        assert live_stream.is_cancelled
+        assert hub.get_live_stream("key") is None
+        with pytest.raises(asyncio.CancelledError):
+            await live_stream.search_task
+        assert "key" not in hub._live_streams
+
+    cancelled_search_count = get_cancellation_stats()["searches"]
+    asyncio.run(main())
+    assert get_cancellation_stats()["searches"] == cancelled_search_count + 1
+    assert recorded_streams == {}
+
+
+def test_cancelled_async_search_does_not_fail_a_search_sharing_its_lookup(recorded_streams):
+    async def main():
+        hub = AsyncSearchStreamHub()
+        single_flight = SingleFlight()
+        lookup_started = asyncio.Event()
+        lookup_gate = asyncio.Event()
+
+        async def look_up():
+            lookup_started.set()
+            await lookup_gate.wait()
+            return "rating"
+
+        async def create_events():
+            yield "restaurant"
+            yield await single_flight.do_async("lookup", look_up)
+
+        # Two queries sharing a lookup; the first one to reach it leads it
+        abandoned = hub.subscribe("abandoned", create_events)
+        followed = hub.subscribe("followed", create_events)
+        assert await anext(abandoned) == "restaurant"
+        await lookup_started.wait()
+        assert await anext(followed) == "restaurant"
+        followed_event = asyncio.ensure_future(anext(followed))
+        await asyncio.sleep(0)
+
+        await abandoned.aclose()
+        lookup_gate.set()
+        assert await asyncio.wait_for(followed_event, 5) == "rating"
+
+    asyncio.run(main())
+    assert recorded_streams == {"followed": ["restaurant", "rating"]}
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.single_flight import SingleFlight
+
+
+def test_do_coalesces_concurrent_calls():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(single_flight.do("key", fetch)))
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(single_flight.do("key", fetch)))
+    waiter.start()
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+
+    assert results == ["value", "value"]
+
+
+def test_do_async_waiters_get_the_leader_result():
+    async def main():
+        single_flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "value"
+
+        results = await asyncio.gather(*(single_flight.do_async("key", fetch) for _ in range(3)))
+        return results, calls
+
+    results, calls = asyncio.run(main())
+    assert results == ["value"] * 3
+    assert len(calls) == 1
+
+
+def test_do_async_waiters_get_the_leader_exception():
+    async def main():
+        single_flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream error")
+
+        return await asyncio.gather(
+            *(single_flight.do_async("key", fetch) for _ in range(2)), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_do_async_waiter_gets_the_result_when_the_leader_is_cancelled():
+    async def main():
+        single_flight = SingleFlight()
+        started = asyncio.Event()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            started.set()
+            await asyncio.sleep(0.01)
+            return "value"
+
+        leader = asyncio.ensure_future(single_flight.do_async("key", fetch))
+        await started.wait()
+        waiter = asyncio.ensure_future(single_flight.do_async("key", fetch))
+        # Let the waiter join the leader's call before cancelling it
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.wait_for(waiter, 5), calls
+
+    result, calls = asyncio.run(main())
+    assert result == "value"
+    # The waiter ran the call again in place of the cancelled leader
+    assert len(calls) == 2
+
+
+def test_do_async_cancelled_waiter_does_not_cancel_the_call():
+    async def main():
+        single_flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def fetch():
+            started.set()
+            await asyncio.sleep(0.01)
+            return "value"
+
+        leader = asyncio.ensure_future(single_flight.do_async("key", fetch))
+        await started.wait()
+        waiter = asyncio.ensure_future(single_flight.do_async("key", fetch))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        return await leader
+
+    assert asyncio.run(main()) == "value"
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from config import RATINGS_CACHE_TTL_SECONDS, RATINGS_NOT_FOUND_CACHE_TTL_SECONDS
+from utils import tabelog_search_utils
+
+TABELOG_SEARCH_PAGE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "tabelog_search_page.html")
+
+
+@pytest.fixture
+def cached_values(monkeypatch):
+    cached_values = {}
+    monkeypatch.setattr(
+        tabelog_search_utils, "tiered_cache_set",
+        lambda cache_key, value, ttl_seconds: cached_values.__setitem__(cache_key, (value, ttl_seconds)),
+    )
+    return cached_values
+
+
+def fake_tabelog_page(monkeypatch, html):
+    monkeypatch.setattr(tabelog_search_utils, "get_response_html_from_url_with_headers", lambda url: html)
+
+
+def read_tabelog_search_page():
+    with open(TABELOG_SEARCH_PAGE_PATH, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_found_restaurant_is_cached(monkeypatch, cached_values):
+    fake_tabelog_page(monkeypatch, read_tabelog_search_page())
+
+    tabelog_data = tabelog_search_utils.fetch_tabelog_data("key", "鮨 はしもと 別館")
+
+    assert tabelog_data == ("3.58", "https://tabelog.com/tokyo/A1301/A130101/13012345/")
+    assert cached_values == {"key": (tabelog_data, RATINGS_CACHE_TTL_SECONDS)}
+
+
+def test_not_found_in_a_result_list_is_cached(monkeypatch, cached_values):
+    fake_tabelog_page(monkeypatch, read_tabelog_search_page())
+
+    assert tabelog_search_utils.fetch_tabelog_data("key", "Sushi Saito") is None
+    assert cached_values == {"key": (None, RATINGS_NOT_FOUND_CACHE_TTL_SECONDS)}
+
+
+def test_page_without_results_is_not_cached(monkeypatch, cached_values):
+    fake_tabelog_page(monkeypatch, "<html><body>Access denied</body></html>")
+
+    assert tabelog_search_utils.fetch_tabelog_data("key", "鮨 はしもと") is None
+    assert cached_values == {}
+
+
+# Restaurant names in tabelog_search_page.html, in page order
+SEARCH_PAGE_NAMES = ["鮨 はしもと", "鮨 はしもと 別館", "はしもと鮨店", "すし処 はし本"]
+
+
+def test_exact_match_wins_over_earlier_partial_matches():
+    candidate_names = ["鮨 はしもと 別館", "はしもと鮨店", "鮨 はしもと"]
+
+    assert tabelog_search_utils.find_best_matching_restaurant_name_index("Sushi Hashimoto", candidate_names) == 2
+
+
+def test_closest_substring_match_wins_over_page_order():
+    candidate_names = ["鮨 はしもと 別館", "はしもと鮨店", "鮨 はしもと"]
+
+    assert tabelog_search_utils.find_best_matching_restaurant_name_index("はしもと", candidate_names) == 2
+    assert tabelog_search_utils.find_best_matching_restaurant_name_index("鮨 はしもと 別館 銀座", SEARCH_PAGE_NAMES) == 1
+
+
+def test_fuzzy_match_on_reordered_words():
+    assert tabelog_search_utils.find_best_matching_restaurant_name_index("Hashimoto Sushi", SEARCH_PAGE_NAMES) == 0
+
+
+def test_no_match():
+    assert tabelog_search_utils.find_best_matching_restaurant_name_index("Sushi Saito", SEARCH_PAGE_NAMES) is None
+    assert tabelog_search_utils.find_best_matching_restaurant_name_index("Sushi Saito", []) is None
+
+
+def test_are_restaurant_names_matching():
+    assert tabelog_search_utils.are_restaurant_names_matching("鮨 はしもと", "Sushi Hashimoto")
+    assert tabelog_search_utils.are_restaurant_names_matching("鮨 はしもと", "Hashimoto Sushi")
+    assert not tabelog_search_utils.are_restaurant_names_matching("鮨 はしもと", "すし処 はし本")